@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Load test for the task API across storage backends.
+
+Seeds each backend with N tasks (100 per user), then drives the app with a
+mix of board reads, creates, moves and deletes from concurrent clients and
+reports p50/p95/p99 latency per operation, throughput and resident memory.
+Two transports are measured:
+
+``asgi``  requests are passed straight to the ASGI app in-process, so the
+          numbers are routing + handler + storage cost only
+``http``  the app is served by uvicorn on a local port and driven over
+          keep-alive HTTP/1.1 connections
+
+Each (backend, size, transport) runs in a fresh subprocess so memory figures
+don't leak between runs. The Firestore backend uses the in-memory fake
+client, so the whole suite runs offline; the fake evaluates queries by
+scanning the collection, so its numbers above ~10k tasks mostly measure the
+fake itself. Results are written as JSON and ``--compare`` prints the change
+against an earlier results file.
+
+    python bench_api.py [--backends memory,sqlite,firestore] [--sizes 1000,100000]
+                        [--transports asgi,http] [--concurrency 32] [--requests 5000]
+                        [--mix list=60,create=15,move=20,delete=5] [--latency 0]
+                        [--output bench_results.json] [--compare old.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+TASKS_PER_USER = 100
+COLUMNS = ('Planning', 'In Progress', 'Done')
+OPERATIONS = ('list', 'create', 'move', 'delete')
+
+
+def rss_mb():
+    """Current resident set size of this process in MiB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return None
+    index = max(0, min(len(samples) - 1, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+def seed_tasks(total):
+    for task_id in range(1, total + 1):
+        yield {
+            'id': task_id,
+            'text': f'Task {task_id}',
+            'column': COLUMNS[task_id % len(COLUMNS)],
+            'userId': f'user-{(task_id - 1) // TASKS_PER_USER}',
+            'version': task_id,
+            'updatedAt': task_id,
+        }
+
+
+async def seed(backend, total):
+    """Load ``total`` tasks straight into the backend's storage"""
+    if backend.name == 'memory':
+        await backend.start()
+        tasks = list(seed_tasks(total))
+        backend.task_log.compact(tasks, total + 1, version=total, background=False)
+        await backend.stop()
+    elif backend.name == 'sqlite':
+        import sqlite_backend
+        await backend.start()
+        with backend._write() as conn:
+            conn.executemany(
+                'INSERT INTO tasks (id, text, "column", userId, version, updatedAt) VALUES (?, ?, ?, ?, ?, ?)',
+                ((t['id'], t['text'], t['column'], t['userId'], t['version'], t['updatedAt'])
+                 for t in seed_tasks(total)),
+            )
+            conn.executemany(
+                sqlite_backend.SET_BOARD_VERSION,
+                ((f'user-{user}', min((user + 1) * TASKS_PER_USER, total))
+                 for user in range((total + TASKS_PER_USER - 1) // TASKS_PER_USER)),
+            )
+            conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (total,))
+        await backend.stop()
+    elif backend.name == 'firestore':
+        docs = backend.db._docs('kanban-tasks')
+        for task in seed_tasks(total):
+            docs[str(task['id'])] = task
+        # Lease the first id block now so the collection scan isn't timed
+        backend.id_allocator.next_id()
+
+
+# --- transports ---------------------------------------------------------
+
+class AsgiClient:
+    """Calls the ASGI app directly, without sockets"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method, path, body=None, headers=()):
+        path, _, query = path.partition('?')
+        payload = json.dumps(body).encode() if body is not None else b''
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'root_path': '',
+            'query_string': query.encode(),
+            'headers': [(b'host', b'bench'), (b'content-type', b'application/json'),
+                        (b'content-length', str(len(payload)).encode()),
+                        *((name.lower().encode(), value.encode()) for name, value in headers)],
+            'client': ('127.0.0.1', 0),
+            'server': ('bench', 80),
+        }
+        received = False
+        status = None
+        chunks = []
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {'type': 'http.request', 'body': payload, 'more_body': False}
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+
+        await self.app(scope, receive, send)
+        return status, b''.join(chunks)
+
+    async def close(self):
+        pass
+
+
+class HttpClient:
+    """One keep-alive HTTP/1.1 connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = json.dumps(body).encode() if body is not None else b''
+        head = (
+            f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n'
+        )
+        self.writer.write(head.encode() + payload)
+        status_line = await self.reader.readline()
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                chunks.append(await self.reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            return status, b''.join(chunk[:-2] for chunk in chunks)
+        return status, await self.reader.readexactly(int(headers.get('content-length', 0)))
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_in_thread(app, port):
+    """Start uvicorn for ``app`` on a background thread and wait until it listens"""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(
+        app, host='127.0.0.1', port=port, log_level='warning', access_log=False,
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError('uvicorn failed to start')
+        time.sleep(0.01)
+    return server, thread
+
+
+# --- workload -----------------------------------------------------------
+
+async def drive(make_client, total, args, mix):
+    """Run ``args.requests`` mixed operations from ``args.concurrency`` clients"""
+    rng = random.Random(args.seed)
+    users = max(1, total // TASKS_PER_USER)
+    live = list(range(1, total + 1))
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = {name: [] for name in names}
+    counts = {'errors': 0, 'not_found': 0}
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        client = make_client()
+        try:
+            while remaining > 0:
+                remaining -= 1
+                op = rng.choices(names, weights)[0]
+                user = f'user-{rng.randrange(users)}'
+                if op in ('move', 'delete') and not live:
+                    op = 'create'
+                if op == 'list':
+                    method, path, body = 'GET', f'/tasks?userId={user}', None
+                elif op == 'create':
+                    method, path, body = 'POST', '/tasks', {'text': 'bench', 'userId': user}
+                elif op == 'move':
+                    task_id = live[rng.randrange(len(live))]
+                    method, path, body = 'PUT', f'/tasks/{task_id}', {'column': rng.choice(COLUMNS)}
+                else:
+                    index = rng.randrange(len(live))
+                    live[index], live[-1] = live[-1], live[index]
+                    task_id = live.pop()
+                    method, path, body = 'DELETE', f'/tasks/{task_id}', None
+
+                started = time.perf_counter()
+                status, payload = await client.request(method, path, body)
+                latencies[op].append(time.perf_counter() - started)
+
+                if status == 404:
+                    counts['not_found'] += 1
+                elif status >= 400:
+                    counts['errors'] += 1
+                elif op == 'create':
+                    live.append(json.loads(payload)['id'])
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ops = {}
+    for name, samples in latencies.items():
+        samples.sort()
+        ops[name] = {
+            'count': len(samples),
+            'p50_ms': round(percentile(samples, 50) * 1000, 3) if samples else None,
+            'p95_ms': round(percentile(samples, 95) * 1000, 3) if samples else None,
+            'p99_ms': round(percentile(samples, 99) * 1000, 3) if samples else None,
+        }
+    everything = sorted(sample for samples in latencies.values() for sample in samples)
+    return {
+        'requests': len(everything),
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(everything) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(everything, 50) * 1000, 3),
+        'p95_ms': round(percentile(everything, 95) * 1000, 3),
+        'p99_ms': round(percentile(everything, 99) * 1000, 3),
+        'operations': ops,
+        **counts,
+    }
+
+
+def run_child(config):
+    """One benchmark run; executed in its own process"""
+    args = argparse.Namespace(**config['args'])
+    backend_kind, total, transport = config['backend'], config['size'], config['transport']
+    os.chdir(tempfile.mkdtemp(prefix='bench-api-'))
+    os.environ['STORAGE_BACKEND'] = backend_kind
+    os.environ['SQLITE_PATH'] = 'bench.db'
+    # Seeding writes one snapshot; don't let the timed run compact it again
+    os.environ.setdefault('TASKS_COMPACT_EVERY', str(max(1000, total)))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import main as app_main
+    if backend_kind == 'firestore':
+        from fake_firestore import FakeFirestore, transactional
+        from firestore_backend import FirestoreBackend
+        from id_allocator import CounterBlockAllocator
+        db = FakeFirestore(latency=args.latency)
+        app_main.backend = FirestoreBackend(db, allocator=CounterBlockAllocator(db, transactional=transactional))
+
+    rss_start = rss_mb()
+    started = time.perf_counter()
+    asyncio.run(seed(app_main.backend, total))
+    seed_s = time.perf_counter() - started
+
+    result = {
+        'backend': backend_kind,
+        'size': total,
+        'transport': transport,
+        'concurrency': args.concurrency,
+        'seed_s': round(seed_s, 3),
+    }
+    mix = dict(config['mix'])
+
+    if transport == 'asgi':
+        async def run():
+            started = time.perf_counter()
+            await app_main.app.router.startup()
+            result['startup_ms'] = round((time.perf_counter() - started) * 1000, 1)
+            result['rss_mb_loaded'] = round(rss_mb(), 1)
+            try:
+                return await drive(lambda: AsgiClient(app_main.app), total, args, mix)
+            finally:
+                await app_main.app.router.shutdown()
+        result.update(asyncio.run(run()))
+    else:
+        port = free_port()
+        started = time.perf_counter()
+        server, thread = serve_in_thread(app_main.app, port)
+        result['startup_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        result['rss_mb_loaded'] = round(rss_mb(), 1)
+        try:
+            result.update(asyncio.run(drive(lambda: HttpClient('127.0.0.1', port), total, args, mix)))
+        finally:
+            server.should_exit = True
+            thread.join(timeout=30)
+
+    result['rss_mb_start'] = round(rss_start, 1)
+    result['rss_mb_end'] = round(rss_mb(), 1)
+    with open(config['output'], 'w') as f:
+        json.dump(result, f)
+
+
+# --- driver -------------------------------------------------------------
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise SystemExit(f'unknown operation in --mix: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_key(result):
+    return (result['backend'], result['size'], result['transport'])
+
+
+def print_result(result, baseline=None):
+    line = (f"{result['backend']:>9} {result['size']:>8} {result['transport']:>5} "
+            f"{result['throughput_rps']:>9.0f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+            f"{result['p99_ms']:>8.2f} {result['rss_mb_end']:>8.1f} {result['errors']:>6}")
+    if baseline:
+        throughput = result['throughput_rps'] / baseline['throughput_rps'] - 1
+        p95 = result['p95_ms'] / baseline['p95_ms'] - 1
+        line += f"   rps {throughput:+.0%} p95 {p95:+.0%}"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backends', default='memory,sqlite,firestore')
+    parser.add_argument('--sizes', default='1000,100000',
+                        help='comma-separated dataset sizes (tasks), e.g. 1000,100000,1000000')
+    parser.add_argument('--transports', default='asgi,http')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=5000, help='requests per run')
+    parser.add_argument('--mix', default='list=60,create=15,move=20,delete=5')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated seconds per fake Firestore round trip')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        with open(args.child) as f:
+            run_child(json.load(f))
+        return
+
+    mix = parse_mix(args.mix)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {run_key(result): result for result in json.load(f)['results']}
+
+    shared = {k: v for k, v in vars(args).items() if k in ('concurrency', 'requests', 'latency', 'seed')}
+    results = []
+    print(f"{'backend':>9} {'tasks':>8} {'via':>5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'RSS MiB':>8} {'errors':>6}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in args.backends.split(','):
+            for size in [int(s) for s in args.sizes.split(',')]:
+                for transport in args.transports.split(','):
+                    config_path = os.path.join(workdir, 'config.json')
+                    output_path = os.path.join(workdir, 'result.json')
+                    with open(config_path, 'w') as f:
+                        json.dump({
+                            'backend': backend, 'size': size, 'transport': transport,
+                            'mix': mix, 'args': shared, 'output': output_path,
+                        }, f)
+                    # The app logs every request; keep that out of the report
+                    proc = subprocess.run(
+                        [sys.executable, os.path.abspath(__file__), '--child', config_path],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                    )
+                    if proc.returncode != 0:
+                        print(f"{backend:>9} {size:>8} {transport:>5} failed:\n{proc.stderr}")
+                        continue
+                    with open(output_path) as f:
+                        result = json.load(f)
+                    results.append(result)
+                    print_result(result, baseline.get(run_key(result)))
+
+    report = {
+        'commit': git_commit(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'mix': mix,
+        'settings': shared,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Cold-start report: import time of main.py and time to first response.
+
+Two measurements per storage backend, each in a fresh interpreter:
+
+* ``import main`` - wall-clock import time, plus the modules with the most
+  self time from ``python -X importtime`` (the Firebase connection thread
+  imports concurrently, so its modules show up there too)
+* ``uvicorn main:app`` started from scratch - time until the port accepts
+  connections, until ``GET /health`` answers and until the first
+  ``GET /tasks`` is answered (median of ``--runs``)
+
+Run it from a directory with the deployment's credentials (or with
+``FIREBASE_CREDENTIALS=application-default``) to include Firebase; without
+them the backends start without Firestore.
+
+    python bench_coldstart.py [--backends memory,sqlite,firestore] [--runs 3] [--top 10]
+"""
+
+import argparse
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def child_env(backend):
+    env = dict(os.environ, STORAGE_BACKEND=backend, LOG_LEVEL="WARNING")
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def workdir():
+    """Fresh working directory holding the credentials file if there is one"""
+    path = tempfile.mkdtemp()
+    for name in ("firebase-service-account.json",):
+        for source in (os.path.join(os.getcwd(), name), os.path.join(BACKEND_DIR, name)):
+            if os.path.exists(source):
+                shutil.copy(source, path)
+                break
+    return path
+
+
+# Marked: log lines (e.g. from the Firebase thread) share stdout
+IMPORT_MAIN = ("import sys, time; started = time.perf_counter(); import main; "
+               "sys.stdout.write(f'import-seconds {time.perf_counter() - started}\\n')")
+
+
+def import_times(backend):
+    """``(seconds, [(self_us, module)])`` for ``import main``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_MAIN],
+        cwd=workdir(), env=child_env(backend), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        modules.append((int(self_us), name.strip()))
+    return float(re.search(r"import-seconds (\S+)\n", result.stdout).group(1)), modules
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(check, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            if check():
+                return time.perf_counter()
+        except OSError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError("server did not come up")
+
+
+def http_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=60) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def serve_times(backend):
+    """Seconds from process start until bound, healthy and answering /tasks, and that answer's status"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=workdir(), env=child_env(backend), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = started + 120
+        bound = wait_for(lambda: socket.create_connection(("127.0.0.1", port), timeout=1).close() or True, deadline)
+        healthy = wait_for(lambda: http_status(base + "/health") == 200, deadline)
+        status = http_status(base + "/tasks?userId=coldstart")
+        return bound - started, healthy - started, time.perf_counter() - started, status
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backends', default='memory,sqlite,firestore')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    for backend in args.backends.split(','):
+        seconds, modules = import_times(backend)
+        print(f"== {backend}: import main {seconds * 1000:.0f} ms")
+        print(f"   {'self ms':>9}  module")
+        for us, name in sorted(modules, reverse=True)[:args.top]:
+            print(f"   {us / 1000:>9.1f}  {name}")
+
+        runs = [serve_times(backend) for _ in range(args.runs)]
+        bound, healthy, answered = (statistics.median(run[i] for run in runs) for i in range(3))
+        print(f"   port bound {bound * 1000:.0f} ms, /health {healthy * 1000:.0f} ms, "
+              f"first GET /tasks {answered * 1000:.0f} ms (status {runs[-1][3]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Serialization micro-benchmark for the GET /tasks list body.
+
+Measures CPU time to turn one board of stored tasks into response bytes:
+
+* ``pydantic``   - the previous path: ``Task(**task)`` per row, then FastAPI's
+  ``response_model`` validation/serialisation and ``JSONResponse``
+* ``json``       - task dicts encoded with the standard library (fast_json
+  fallback when orjson is not installed)
+* ``orjson``     - task dicts encoded with orjson (sqlite/firestore backends)
+* ``blobs``      - memory backend: each record's cached encoding joined
+* ``+gzip`` / ``+br`` - compressing the body on top
+
+Results are CPU milliseconds per 10k tasks (median of ``--repeat`` runs).
+
+    python bench_serialize.py [--sizes 1000,10000,100000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def make_tasks(total):
+    columns = ('Planning', 'In Progress', 'Done')
+    return [
+        {
+            'id': task_id,
+            'text': f'Task {task_id}: write the quarterly report draft',
+            'column': columns[task_id % 3],
+            'userId': 'user-1',
+            'version': task_id,
+            'updatedAt': 1700000000000 + task_id,
+        }
+        for task_id in range(1, total + 1)
+    ]
+
+
+def cpu_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.process_time()
+        fn()
+        samples.append((time.process_time() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fast_json
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from main import Task, app
+    from task_store import TaskRecord
+
+    route = next(r for r in app.routes if getattr(r, 'path', None) == '/tasks' and 'GET' in r.methods)
+    stdlib = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def pydantic_path(tasks):
+        content = asyncio.run(serialize_response(
+            field=route.response_field,
+            response_content=[Task(**task) for task in tasks],
+        ))
+        return JSONResponse(content).body
+
+    print(f"orjson: {'yes' if fast_json.orjson else 'no'}  brotli: {'yes' if fast_json.brotli else 'no'}")
+    print(f"{'tasks':>8} {'path':>10} {'ms/10k':>9} {'bytes':>10}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        tasks = make_tasks(size)
+        records = [TaskRecord.from_dict(task) for task in tasks]
+        for record in records:
+            record.to_json()
+
+        paths = [
+            ('pydantic', lambda: pydantic_path(tasks)),
+            ('json', lambda: stdlib.encode(tasks).encode('utf-8')),
+        ]
+        if fast_json.orjson is not None:
+            paths.append(('orjson', lambda: fast_json.orjson.dumps(tasks)))
+        paths.append(('blobs', lambda: fast_json.join_array([record.to_json() for record in records])))
+
+        body = fast_json.join_array([record.to_json() for record in records])
+        paths.append(('+gzip', lambda: fast_json.compress(body, 'gzip')))
+        if fast_json.brotli is not None:
+            paths.append(('+br', lambda: fast_json.compress(body, 'br')))
+
+        for name, fn in paths:
+            output = fn()
+            per_10k = cpu_ms(fn, args.repeat) * 10000 / size
+            print(f"{size:>8} {name:>10} {per_10k:>9.2f} {len(output):>10}")
+
+
+if __name__ == "__main__":
+    main()
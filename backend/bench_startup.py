@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark: eager full-collection sync vs lazy per-user hydration.
+
+Runs the memory backend's startup against the in-memory fake Firestore
+client seeded with 10k and 100k tasks (100 tasks per user) and reports time
+until the service can answer, time for the first board request, and documents read.
+The fake evaluates queries by scanning the collection, so the lazy first
+request is slower here than against Firestore's indexes.
+
+    python bench_startup.py [--sizes 10000,100000] [--latency 0.02]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+TASKS_PER_USER = 100
+
+
+def seed(db, total):
+    docs = db._docs('kanban-tasks')
+    for task_id in range(1, total + 1):
+        docs[str(task_id)] = {
+            'id': task_id,
+            'text': f'Task {task_id}',
+            'column': 'Planning',
+            'userId': f'user-{task_id // TASKS_PER_USER}',
+        }
+
+
+async def run(main, db, mode):
+    import firebase_client
+    from memory_backend import MemoryBackend
+    firebase_client.use(db)
+    main.backend = MemoryBackend(hydration_mode=mode)
+    db.reads = 0
+
+    started = time.perf_counter()
+    await main.startup_event()
+    await main.storage_ready.wait()
+    ready = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tasks, _ = await main.backend.list_board('user-1')
+    first_request = time.perf_counter() - started
+
+    await main.shutdown_event()
+    for path in (main.backend.task_log.snapshot_path, main.backend.task_log.log_path):
+        if os.path.exists(path):
+            os.remove(path)
+    return {
+        'ready_ms': ready * 1000,
+        'first_request_ms': first_request * 1000,
+        'docs_read': db.reads,
+        'board_size': len(tasks),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10000,100000')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='simulated seconds per Firestore round trip')
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as app_main
+    from fake_firestore import FakeFirestore
+
+    print(f"{'tasks':>8} {'mode':>6} {'ready ms':>10} {'1st GET ms':>11} {'docs read':>10}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        db = FakeFirestore(latency=args.latency)
+        seed(db, size)
+        for mode in ('eager', 'lazy'):
+            result = asyncio.run(run(app_main, db, mode))
+            print(f"{size:>8} {mode:>6} {result['ready_ms']:>10.1f} "
+                  f"{result['first_request_ms']:>11.1f} {result['docs_read']:>10}")
+
+
+if __name__ == "__main__":
+    main()
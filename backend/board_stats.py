@@ -0,0 +1,278 @@
+"""
+Per-board analytics maintained from the change stream.
+
+``GET /boards/{userId}/stats`` reports cards per column, cards moved and
+completed per day and the cycle time from ``STATS_START_COLUMN`` (default
+``Planning``) to ``STATS_DONE_COLUMN`` (default ``Done``). Nothing is
+computed by scanning: every committed change main.py publishes (including
+other workers' changes, through the backend's change feed) is folded into
+counters here, and a request only reads them, so serving costs
+O(columns + days) whatever the board size.
+
+Column counts need to know every card's column, which a restarted process
+does not, so a board is seeded from one full listing on its first stats
+request, or as soon as a card it hasn't seen is updated (moves are only
+recognised against a known column). Changes seen while that read is in
+flight win over it; changes to a board seeding because of an update are held
+back and applied, in order, once the listing is in.
+The daily history (``STATS_HISTORY_DAYS`` buckets, default 90) and the
+time each open card entered the start column are written to ``STATS_FILE``
+periodically and at shutdown, so throughput survives restarts. At most
+``STATS_BOARDS`` boards are tracked, the least recently changed dropped
+first.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+STATS_START_COLUMN = os.getenv("STATS_START_COLUMN", "Planning")
+STATS_DONE_COLUMN = os.getenv("STATS_DONE_COLUMN", "Done")
+STATS_HISTORY_DAYS = int(os.getenv("STATS_HISTORY_DAYS", "90"))
+STATS_SAVE_INTERVAL = int(os.getenv("STATS_SAVE_INTERVAL", "300"))
+
+
+def day_of(ms):
+    """UTC day (``YYYY-MM-DD``) of a millisecond timestamp"""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).date().isoformat()
+
+
+class DayBucket:
+    __slots__ = ("moved", "completed", "cycled", "cycle_ms")
+
+    def __init__(self, moved=0, completed=0, cycled=0, cycle_ms=0):
+        self.moved = moved
+        self.completed = completed
+        # Completed cards with a known start, and the sum of their cycle times
+        self.cycled = cycled
+        self.cycle_ms = cycle_ms
+
+    def to_list(self):
+        return [self.moved, self.completed, self.cycled, self.cycle_ms]
+
+
+class BoardStats:
+    """Counters for one board"""
+
+    __slots__ = ("seeded", "columns", "counts", "started", "days", "pending", "_seeding_deleted")
+
+    def __init__(self):
+        self.seeded = False
+        # task id -> (column, version); only complete once seeded
+        self.columns = {}
+        self.counts = {}
+        # task id -> ms it entered the start column
+        self.started = {}
+        # day -> DayBucket, oldest first
+        self.days = OrderedDict()
+        # Changes held back while an update seeds the board, or None
+        self.pending = None
+        self._seeding_deleted = None
+
+    def _count(self, column, delta):
+        total = self.counts.get(column, 0) + delta
+        if total > 0:
+            self.counts[column] = total
+        else:
+            self.counts.pop(column, None)
+
+    def _bucket(self, ms):
+        day = day_of(ms)
+        bucket = self.days.get(day)
+        if bucket is None:
+            bucket = self.days[day] = DayBucket()
+            # Days normally arrive in order; keep the dict sorted anyway
+            if len(self.days) > 1 and next(reversed(self.days)) != max(self.days):
+                self.days = OrderedDict(sorted(self.days.items()))
+            while len(self.days) > STATS_HISTORY_DAYS:
+                self.days.popitem(last=False)
+        return bucket
+
+    def apply(self, event_type, task):
+        task_id = task["id"]
+        at = task.get("updatedAt") or int(time.time() * 1000)
+        previous = self.columns.get(task_id)
+        if event_type == "deleted":
+            if previous is not None:
+                del self.columns[task_id]
+                self._count(previous[0], -1)
+            self.started.pop(task_id, None)
+            if self._seeding_deleted is not None:
+                self._seeding_deleted.add(task_id)
+            return
+
+        if previous is not None and previous[1] > task.get("version", 0):
+            # Older than what the seeding listing already showed
+            return
+        column = task["column"]
+        self.columns[task_id] = (column, task.get("version", 0))
+        moved = previous is not None and previous[0] != column
+        if previous is None:
+            self._count(column, 1)
+        elif moved:
+            self._count(previous[0], -1)
+            self._count(column, 1)
+        if moved:
+            self._bucket(at).moved += 1
+        if event_type != "created" and not moved:
+            return
+        if column == STATS_START_COLUMN:
+            self.started[task_id] = at
+        elif column == STATS_DONE_COLUMN:
+            bucket = self._bucket(at)
+            bucket.completed += 1
+            started = self.started.pop(task_id, None)
+            # Cards whose start wasn't seen count as completed only
+            if started is not None:
+                bucket.cycled += 1
+                bucket.cycle_ms += at - started
+
+    def begin_seed(self):
+        self._seeding_deleted = set()
+
+    def seed(self, tasks):
+        """Merge a full listing of the board; changes seen since it was read win"""
+        deleted = self._seeding_deleted or set()
+        for task in tasks:
+            task_id = task["id"]
+            if task_id in deleted:
+                continue
+            known = self.columns.get(task_id)
+            if known is not None and known[1] >= task.get("version", 0):
+                continue
+            if known is not None:
+                self._count(known[0], -1)
+            self.columns[task_id] = (task["column"], task.get("version", 0))
+            self._count(task["column"], 1)
+        self._seeding_deleted = None
+        self.seeded = True
+
+    def history(self, days):
+        """``(day, DayBucket)`` for the last ``days`` UTC days, oldest first"""
+        today = datetime.now(timezone.utc).date()
+        return [
+            (day, self.days.get(day) or DayBucket())
+            for day in ((today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1))
+        ]
+
+    def history_state(self):
+        return {
+            "started": dict(self.started),
+            "days": {day: bucket.to_list() for day, bucket in self.days.items()},
+        }
+
+    @classmethod
+    def from_history_state(cls, state):
+        stats = cls()
+        stats.started = {int(task_id): at for task_id, at in state.get("started", {}).items()}
+        stats.days = OrderedDict(
+            (day, DayBucket(*values)) for day, values in sorted(state.get("days", {}).items())
+        )
+        return stats
+
+
+class BoardStatsRegistry:
+    """``BoardStats`` per board, least recently changed dropped beyond ``max_boards``"""
+
+    def __init__(self, path=None, max_boards=10000, load_board=None):
+        self.path = path
+        self.max_boards = max_boards
+        # ``await load_board(user_id)`` lists a board for seeding on updates
+        self.load_board = load_board
+        self._boards = OrderedDict()
+        # Concurrent first requests for a board share one seeding read
+        self._seeds = SingleFlight()
+        self._seeding = set()
+        self.events = 0
+
+    def board(self, user_id):
+        stats = self._boards.get(user_id)
+        if stats is None:
+            stats = self._boards[user_id] = BoardStats()
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+        else:
+            self._boards.move_to_end(user_id)
+        return stats
+
+    def observe(self, event_type, task):
+        """Fold one committed change into its board's counters"""
+        if event_type not in ("created", "updated", "deleted"):
+            return
+        self.events += 1
+        user_id = task["userId"]
+        stats = self.board(user_id)
+        if stats.pending is not None:
+            stats.pending.append((event_type, task))
+        elif (event_type == "updated" and not stats.seeded and task["id"] not in stats.columns
+              and self.load_board is not None):
+            stats.pending = [(event_type, task)]
+            seeding = asyncio.ensure_future(self._seed_then_apply(user_id, stats))
+            self._seeding.add(seeding)
+            seeding.add_done_callback(self._seeding.discard)
+        else:
+            stats.apply(event_type, task)
+
+    async def _seed_then_apply(self, user_id, stats):
+        try:
+            await self.get(user_id, lambda: self.load_board(user_id))
+        except Exception as e:
+            logger.error("Seeding stats for board %s failed: %s", user_id, e)
+        finally:
+            pending, stats.pending = stats.pending, None
+            for event_type, task in pending:
+                stats.apply(event_type, task)
+
+    async def get(self, user_id, load_board):
+        """The board's stats, seeded with ``await load_board()`` the first time"""
+        stats = self.board(user_id)
+        if not stats.seeded:
+            await self._seeds.do(user_id, lambda: self._seed(stats, load_board))
+        return stats
+
+    @staticmethod
+    async def _seed(stats, load_board):
+        stats.begin_seed()
+        try:
+            stats.seed(await load_board())
+        finally:
+            stats._seeding_deleted = None
+
+    def load(self):
+        """Restore the daily history written by ``save`` (blocking)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                boards = json.load(f)
+            for user_id, state in boards.items():
+                self._boards[user_id] = BoardStats.from_history_state(state)
+            logger.info("Loaded stats history for %d boards", len(boards))
+        except Exception as e:
+            logger.error("Loading board stats failed: %s", e)
+
+    def snapshot(self):
+        """Daily history of every board, copied so ``save`` can run in a thread"""
+        return {user_id: stats.history_state() for user_id, stats in self._boards.items()}
+
+    def save(self, snapshot):
+        """Write a ``snapshot()`` to ``path`` (temp file + atomic rename; blocking)"""
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def stats(self):
+        return {"boards": len(self._boards), "events": self.events}
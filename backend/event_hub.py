@@ -0,0 +1,172 @@
+"""
+Fan-out hub for real-time board updates.
+
+Handlers publish a delta (``created`` / ``updated`` / ``deleted``) for a
+user's board after the store commits. Each board has its own monotonically
+increasing sequence number and a short ring buffer of recent events, so a
+client reconnecting with the last sequence it saw (SSE ``Last-Event-ID`` or
+``?since=``) receives only what it missed. If the gap is no longer buffered
+the client gets a single ``reset`` event and should refetch the board.
+
+When the storage backend has a cross-process change feed, events are
+published from that feed with its ``seq`` instead (``start_at`` sets where
+it begins), so every worker process numbers a board's events the same way
+and a client can resume on any of them. Those numbers are increasing but not
+contiguous per board.
+
+Every subscriber has a bounded queue. Publishing never blocks: a subscriber
+whose queue is full is disconnected (it will resume from its last sequence
+when it reconnects) so one slow client cannot hold up the others.
+
+A board without subscribers keeps its buffer for ``idle_ttl`` seconds after
+its last subscriber left (or it was first published to), so clients that
+drop briefly can still resume, and at most ``idle_boards`` such boards are
+kept (least recently idle dropped first). A client resuming on a dropped
+board gets a ``reset``.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+
+class Subscription:
+    """One connected client's view of a board"""
+
+    CLOSED = object()
+
+    def __init__(self, user_id, queue_size):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    async def next_event(self, timeout=None):
+        """Next event dict, None on timeout, or CLOSED once disconnected"""
+        if self.closed and self.queue.empty():
+            return self.CLOSED
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.queue.put_nowait(self.CLOSED)
+        except asyncio.QueueFull:
+            # The consumer sees ``closed`` once it drains the queue
+            pass
+
+
+class _Board:
+    __slots__ = ("seq", "floor", "history", "subscribers")
+
+    def __init__(self, history_size, seq=0):
+        self.seq = seq
+        # Events up to ``floor`` are no longer (or were never) in ``history``
+        self.floor = seq
+        self.history = deque(maxlen=history_size)
+        self.subscribers = set()
+
+
+class BoardEventHub:
+    """Per-board sequence numbers, replay buffer and subscriber fan-out"""
+
+    def __init__(self, history_size=256, queue_size=256, idle_boards=1000, idle_ttl=600):
+        self.history_size = history_size
+        self.queue_size = queue_size
+        self.idle_boards = idle_boards
+        self.idle_ttl = idle_ttl
+        self._boards = {}
+        # user_id -> when the board was last left without subscribers, oldest first
+        self._idle = OrderedDict()
+        self._base_seq = 0
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def start_at(self, seq):
+        """Number events with an external feed's sequence, starting after ``seq``"""
+        self._base_seq = seq
+
+    def _board(self, user_id):
+        board = self._boards.get(user_id)
+        if board is None:
+            board = self._boards[user_id] = _Board(self.history_size, self._base_seq)
+            self._idle[user_id] = time.monotonic()
+            self._evict_idle()
+        return board
+
+    def _evict_idle(self):
+        """Drop idle boards beyond ``idle_boards`` or idle for longer than ``idle_ttl``"""
+        expired = time.monotonic() - self.idle_ttl
+        while self._idle:
+            user_id, idle_since = next(iter(self._idle.items()))
+            if len(self._idle) <= self.idle_boards and idle_since > expired:
+                break
+            del self._idle[user_id]
+            del self._boards[user_id]
+
+    def publish(self, user_id, event_type, payload, seq=None):
+        board = self._board(user_id)
+        board.seq = seq if seq is not None else board.seq + 1
+        event = {"seq": board.seq, "type": event_type, **payload}
+        if len(board.history) == board.history.maxlen:
+            board.floor = board.history[0]["seq"]
+        board.history.append(event)
+        self.published += 1
+
+        for subscription in list(board.subscribers):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                board.subscribers.discard(subscription)
+                subscription.close()
+                self.dropped_subscribers += 1
+                if not board.subscribers:
+                    self._idle[user_id] = time.monotonic()
+        return board.seq
+
+    def subscribe(self, user_id, since=None):
+        board = self._board(user_id)
+        subscription = Subscription(user_id, self.queue_size)
+
+        if since is not None and since != board.seq:
+            if since > board.seq or since < board.floor:
+                # Unknown sequence (e.g. server restart) or gap already evicted
+                subscription.queue.put_nowait({"seq": board.seq, "type": "reset"})
+            else:
+                missed = [event for event in board.history if event["seq"] > since]
+                if len(missed) >= self.queue_size:
+                    subscription.queue.put_nowait({"seq": board.seq, "type": "reset"})
+                else:
+                    for event in missed:
+                        subscription.queue.put_nowait(event)
+
+        board.subscribers.add(subscription)
+        self._idle.pop(user_id, None)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        board = self._boards.get(subscription.user_id)
+        if board is not None and subscription in board.subscribers:
+            board.subscribers.discard(subscription)
+            if not board.subscribers:
+                self._idle[subscription.user_id] = time.monotonic()
+                self._evict_idle()
+        subscription.close()
+
+    def close_all(self):
+        for board in self._boards.values():
+            for subscription in list(board.subscribers):
+                subscription.close()
+            board.subscribers.clear()
+
+    def stats(self):
+        return {
+            "boards": len(self._boards),
+            "subscribers": sum(len(board.subscribers) for board in self._boards.values()),
+            "published": self.published,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
@@ -0,0 +1,297 @@
+"""
+In-memory stand-in for the firebase_admin Firestore client.
+
+Implements the subset of the API the backend uses (collections, documents,
+queries, batched writes, transactions, snapshot listeners) so the Firestore code paths can be
+exercised offline and benchmarked without a real project. ``latency`` adds
+a blocking sleep to every round trip to mimic the network cost of the real
+client.
+"""
+
+import copy
+import enum
+import threading
+import time
+
+
+class ChangeType(enum.Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+
+class FakeDocumentChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class FakeWatch:
+    def __init__(self, client, collection, callback):
+        self._client = client
+        self._collection = collection
+        self._callback = callback
+
+    def unsubscribe(self):
+        listeners = self._client._listeners.get(self._collection, [])
+        if self._callback in listeners:
+            listeners.remove(self._callback)
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+
+class FakeDocumentReference:
+    def __init__(self, client, collection, doc_id):
+        self._client = client
+        self._collection = collection
+        self.id = doc_id
+
+    def get(self, transaction=None):
+        self._client._round_trip()
+        with self._client._lock:
+            self._client.reads += 1
+            data = self._client._docs(self._collection).get(self.id)
+            return FakeDocumentSnapshot(self.id, copy.deepcopy(data))
+
+    def set(self, data, merge=False):
+        self._client._round_trip()
+        self._client._apply("set", self._collection, self.id, data, merge)
+
+    def update(self, data):
+        self._client._round_trip()
+        self._client._apply("update", self._collection, self.id, data)
+
+    def delete(self):
+        self._client._round_trip()
+        self._client._apply("delete", self._collection, self.id)
+
+
+class FakeCollectionReference:
+    def __init__(self, client, name):
+        self._client = client
+        self.id = name
+
+    def document(self, doc_id):
+        return FakeDocumentReference(self._client, self.id, str(doc_id))
+
+    def where(self, field, op, value):
+        return FakeQuery(self).where(field, op, value)
+
+    def order_by(self, field, direction="ASCENDING"):
+        return FakeQuery(self).order_by(field, direction)
+
+    def limit(self, count):
+        return FakeQuery(self).limit(count)
+
+    def stream(self):
+        return FakeQuery(self).stream()
+
+    def on_snapshot(self, callback):
+        """Deliver every later change to ``callback`` (no initial snapshot)"""
+        self._client._listeners.setdefault(self.id, []).append(callback)
+        return FakeWatch(self._client, self.id, callback)
+
+
+_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+}
+
+
+class FakeQuery:
+    """Immutable query builder mirroring google.cloud.firestore.Query"""
+
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, collection, filters=(), orders=(), limit_count=None, cursor=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _copy(self, **changes):
+        state = {
+            "filters": self._filters,
+            "orders": self._orders,
+            "limit_count": self._limit,
+            "cursor": self._cursor,
+        }
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field, op, value):
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field, direction),))
+
+    def limit(self, count):
+        return self._copy(limit_count=count)
+
+    def start_after(self, values):
+        if isinstance(values, FakeDocumentSnapshot):
+            values = values.to_dict()
+        return self._copy(cursor=dict(values))
+
+    def stream(self):
+        client = self._collection._client
+        client._round_trip()
+        with client._lock:
+            items = list(client._docs(self._collection.id).items())
+
+        results = []
+        for doc_id, data in items:
+            if all(
+                field in data and _OPERATORS[op](data.get(field), value)
+                for field, op, value in self._filters
+            ):
+                results.append((doc_id, data))
+
+        for field, direction in reversed(self._orders):
+            results = [item for item in results if field in item[1]]
+            results.sort(key=lambda item: item[1][field], reverse=direction == self.DESCENDING)
+
+        if self._cursor is not None and self._orders:
+            fields = [field for field, _ in self._orders]
+            key = tuple(self._cursor[field] for field in fields)
+            if self._orders[0][1] == self.DESCENDING:
+                results = [item for item in results if tuple(item[1][f] for f in fields) < key]
+            else:
+                results = [item for item in results if tuple(item[1][f] for f in fields) > key]
+
+        if self._limit is not None:
+            results = results[:self._limit]
+
+        for doc_id, data in results:
+            client.reads += 1
+            yield FakeDocumentSnapshot(doc_id, copy.deepcopy(data))
+
+
+class FakeWriteBatch:
+    MAX_WRITES = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, ref, data, merge=False):
+        self._writes.append(("set", ref._collection, ref.id, data, merge))
+
+    def update(self, ref, data):
+        self._writes.append(("update", ref._collection, ref.id, data, False))
+
+    def delete(self, ref):
+        self._writes.append(("delete", ref._collection, ref.id, None, False))
+
+    def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise ValueError(f"Batch contains more than {self.MAX_WRITES} writes")
+        self._client._round_trip()
+        with self._client._lock:
+            # Validate first so a failing batch leaves no partial writes
+            for op, collection, doc_id, _, _ in self._writes:
+                if op == "update" and doc_id not in self._client._docs(collection):
+                    raise KeyError(f"No document to update: {collection}/{doc_id}")
+            for op, collection, doc_id, data, merge in self._writes:
+                self._client._apply(op, collection, doc_id, data, merge)
+        self._client.batch_commits += 1
+        return self._writes
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Buffered writes applied atomically when the transactional function returns"""
+
+
+def transactional(fn):
+    """Fake counterpart of ``firestore.transactional``
+
+    The whole function runs under the client lock, so concurrent
+    transactions are serialised instead of retried.
+    """
+    def wrapper(transaction, *args, **kwargs):
+        client = transaction._client
+        with client._lock:
+            result = fn(transaction, *args, **kwargs)
+            transaction.commit()
+        return result
+    return wrapper
+
+
+class FakeFirestore:
+    """Thread-safe in-memory Firestore client"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self.reads = 0
+        self.batch_commits = 0
+        self._collections = {}
+        self._listeners = {}
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return FakeCollectionReference(self, name)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    def _docs(self, collection):
+        return self._collections.setdefault(collection, {})
+
+    def _round_trip(self):
+        self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _apply(self, op, collection, doc_id, data=None, merge=False):
+        with self._lock:
+            docs = self._docs(collection)
+            existed = doc_id in docs
+            if op == "set":
+                if merge and existed:
+                    docs[doc_id].update(copy.deepcopy(data))
+                else:
+                    docs[doc_id] = copy.deepcopy(data)
+                change_type = ChangeType.MODIFIED if existed else ChangeType.ADDED
+                snapshot_data = docs[doc_id]
+            elif op == "update":
+                if not existed:
+                    raise KeyError(f"No document to update: {collection}/{doc_id}")
+                docs[doc_id].update(copy.deepcopy(data))
+                change_type = ChangeType.MODIFIED
+                snapshot_data = docs[doc_id]
+            elif op == "delete":
+                if not existed:
+                    return
+                snapshot_data = docs.pop(doc_id)
+                change_type = ChangeType.REMOVED
+            listeners = list(self._listeners.get(collection, []))
+        if listeners:
+            change = FakeDocumentChange(
+                change_type, FakeDocumentSnapshot(doc_id, copy.deepcopy(snapshot_data))
+            )
+            for callback in listeners:
+                callback([], [change], None)
@@ -0,0 +1,105 @@
+"""
+Fast JSON encoding and compression for the task list endpoints.
+
+``GET /tasks`` used to build a pydantic ``Task`` per row and then have
+FastAPI validate and re-serialise the list through ``response_model``,
+which dominated CPU time on large boards. Stored tasks were already
+validated when they were written, so list responses are encoded straight
+from the stored dicts (or from each record's cached encoding, see
+``TaskRecord.to_json``) into bytes and returned as-is. ``orjson`` is used
+when installed, otherwise the standard library encoder.
+
+Responses of at least ``COMPRESS_MIN_BYTES`` (default 1024) are compressed
+with brotli (when the ``brotli`` package is installed) or gzip, depending on
+the client's ``Accept-Encoding``. Push streams are never compressed, so
+events are not held back in a compressor buffer.
+"""
+
+import gzip
+import json
+import os
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Cheap levels: list responses are compressed on every request
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+
+if orjson is not None:
+    def dumps(obj):
+        """Encode ``obj`` as compact UTF-8 JSON bytes"""
+        return orjson.dumps(obj)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj):
+        """Encode ``obj`` as compact UTF-8 JSON bytes"""
+        return _encoder.encode(obj).encode("utf-8")
+
+
+def join_array(items):
+    """JSON array from already-encoded items"""
+    return b"[" + b",".join(items) + b"]"
+
+
+def encode_tasks(tasks):
+    """JSON array of task dicts"""
+    return dumps(tasks)
+
+
+def encode_delta(version, full, tasks, deleted):
+    """``TaskDelta`` body for ``GET /tasks?since=``"""
+    return dumps({"version": version, "full": full, "tasks": tasks, "deleted": deleted})
+
+
+def choose_encoding(accept_encoding):
+    """Best content coding we support from an ``Accept-Encoding`` header, or None"""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def json_response(request, body, headers=None, status_code=200):
+    """Response for pre-encoded JSON, compressed if the client accepts it"""
+    headers = dict(headers or {})
+    if len(body) >= COMPRESS_MIN_BYTES:
+        headers["Vary"] = "Accept-Encoding"
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            etag = headers.get("ETag")
+            if etag and not etag.startswith("W/"):
+                # The bytes differ per coding, so the validator becomes weak
+                headers["ETag"] = "W/" + etag
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
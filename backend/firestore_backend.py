@@ -0,0 +1,835 @@
+"""
+Firestore storage backend (``STORAGE_BACKEND=firestore``).
+
+Every task is a document in ``kanban-tasks`` keyed by its id, carrying
+``id``, ``userId``, ``version`` and ``updatedAt`` so boards can be queried,
+paged and diffed server-side. Deletes leave a tombstone document that is
+purged after ``TOMBSTONE_TTL_SECONDS``. Boards are served from a per-board
+read cache (task_cache.py) and ids come from id_allocator.py.
+
+Card positions (positions.py) are stored on each document; a column is
+ordered and paged from the loaded board rather than by a query, so no
+extra composite index is needed.
+
+Archived tasks (task_archive.py) move to ``kanban-archive`` as compressed
+JSON, written in the same batch as the tombstone they leave behind.
+
+Every change also writes a ``kanban-history`` document in the same batch
+(task_history.py). A board gets a checkpoint in
+``kanban-history-checkpoints`` on the first change this process makes to it
+(unless it has one) and after every ``HISTORY_CHECKPOINT_EVERY`` more (or
+as many as it has cards), taken in the background from a fresh board read.
+
+Firestore client calls block, so they run in worker threads. Writes to a
+board take that board's lock (one of ``BOARD_LOCK_STRIPES`` per process)
+around their read-check-commit, so concurrent moves see each other's
+positions and an ``expected_version`` check can't be overtaken. The locks
+only cover this process, not other instances writing to the same project.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from id_allocator import check_allocator_config, make_allocator
+from metrics import io_timer
+from positions import ColumnOrder, key_between, order_key, place, spaced_keys
+from storage import (BatchError, HistoryUnavailable, InvalidMove, StorageUnavailable, TaskBackend,
+                     batch_fields, check_version, validate_batch)
+from task_archive import ARCHIVE_COLLECTION, pack, unpack
+from task_history import (HISTORY_CHECKPOINT_COLLECTION, HISTORY_CHECKPOINT_EVERY, HISTORY_COLLECTION,
+                          history_event, replay)
+from task_cache import make_cache, watch_collection
+
+logger = logging.getLogger(__name__)
+
+FIREBASE_COLLECTION = 'kanban-tasks'
+# Deleted tasks are kept as tombstones this long so delta sync can report them
+TOMBSTONE_TTL_SECONDS = int(os.getenv("TOMBSTONE_TTL_SECONDS", str(7 * 24 * 3600)))
+TOMBSTONE_PURGE_INTERVAL = int(os.getenv("TOMBSTONE_PURGE_INTERVAL", "3600"))
+# Firestore documents are limited to 1 MiB
+MAX_CHECKPOINT_BYTES = 900 * 1024
+# Firestore rejects a WriteBatch with more than 500 writes
+MAX_BATCH_WRITES = 500
+# An archived card takes three: archive document, tombstone and history
+ARCHIVE_QUERY_LIMIT = MAX_BATCH_WRITES // 3
+# Boards hash onto this many write locks
+BOARD_LOCK_STRIPES = 64
+
+
+def board_of(task_data):
+    """Cache key of the board a task belongs to"""
+    return task_data.get('userId')
+
+
+def is_tombstone(task_data):
+    return task_data.get('deleted', False)
+
+
+def column_tasks(tasks, column):
+    return [task for task in tasks if task.get('column') == column]
+
+
+def page_tasks(tasks, column=None, limit=None, cursor=None):
+    """Filter and page a cached board like ``list_board``
+
+    A board is ordered by id with an id cursor; a column by position with a
+    ``(position, id)`` cursor.
+    """
+    if column is None:
+        key = lambda task: task['id']
+    else:
+        tasks = column_tasks(tasks, column)
+        key = order_key
+    tasks = sorted(tasks, key=key)
+    if cursor is not None:
+        tasks = [task for task in tasks if key(task) > cursor]
+    if limit is not None:
+        tasks = tasks[:limit]
+    return tasks
+
+
+class FirestoreBackend(TaskBackend):
+    name = "firestore"
+    uses_firebase = True
+    # Every operation also writes its history document into the same batch
+    max_batch_operations = MAX_BATCH_WRITES // 2
+
+    def __init__(self, db, allocator=None, cache=None):
+        self.db = db
+        if allocator is None and db is None:
+            # Firebase connects after startup; bad id settings must not wait for it
+            check_allocator_config()
+        self.id_allocator = allocator or (make_allocator(db) if db is not None else None)
+        # Per-board read cache; TASK_CACHE=none disables it
+        self.task_cache = cache or make_cache(
+            os.getenv("TASK_CACHE", "lru"),
+            max_boards=int(os.getenv("TASK_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("TASK_CACHE_TTL", "60")),
+        )
+        self.task_watch = None
+        self._purge_task = None
+        self._last_version = 0
+        self._version_lock = threading.Lock()
+        # Reentrant: a move may rebalance its column under the same lock
+        self._board_locks = [threading.RLock() for _ in range(BOARD_LOCK_STRIPES)]
+        # userId -> changes since this process last checkpointed the board
+        self._history_counts = {}
+        self._checkpointing = {}
+
+    @property
+    def collection(self):
+        return self.db.collection(FIREBASE_COLLECTION)
+
+    def _require(self):
+        if self.db is None:
+            raise StorageUnavailable("Firebase not connected")
+
+    async def start(self):
+        if self.db is not None:
+            self._start_watchers()
+
+    async def attach_firebase(self, db):
+        if self.db is not None:
+            return
+        self.db = db
+        self.id_allocator = self.id_allocator or make_allocator(db)
+        self._start_watchers()
+
+    def _start_watchers(self):
+        if os.getenv("TASK_CACHE_LISTEN") == "1":
+            # Apply writes made by other instances to cached boards
+            self.task_watch = watch_collection(self.task_cache, self.collection, board_of)
+        self._purge_task = asyncio.create_task(self.purge_tombstones_periodically())
+
+    async def stop(self):
+        if self._purge_task:
+            self._purge_task.cancel()
+        if self.task_watch:
+            self.task_watch.unsubscribe()
+
+    def next_version(self):
+        """Millisecond timestamp, strictly increasing within this process"""
+        with self._version_lock:
+            self._last_version = max(int(time.time() * 1000), self._last_version + 1)
+            return self._last_version
+
+    # Blocking helpers (run in a thread)
+
+    def board_query(self, user_id, column=None, limit=None, cursor=None):
+        """Firestore query for one user's board, filtered and paged server-side"""
+        query = self.collection.where('userId', '==', user_id)
+        if column is not None:
+            query = query.where('column', '==', column)
+        query = query.order_by('id')
+        if cursor is not None:
+            query = query.start_after({'id': cursor})
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    @staticmethod
+    def read_board(query):
+        """Stream a board query, returning (live tasks, docs read, last doc id)"""
+        tasks = []
+        read = 0
+        last_id = None
+        with io_timer("firestore", "stream"):
+            docs = list(query.stream())
+        for doc in docs:
+            read += 1
+            last_id = int(doc.id)
+            task_data = doc.to_dict()
+            if is_tombstone(task_data):
+                continue
+            task_data['id'] = last_id
+            tasks.append(task_data)
+        return tasks, read, last_id
+
+    def _read_live(self, task_id):
+        with io_timer("firestore", "get"):
+            doc = self.collection.document(str(task_id)).get()
+        if not doc.exists:
+            return None
+        task_data = doc.to_dict()
+        if is_tombstone(task_data):
+            return None
+        task_data['id'] = task_id
+        return task_data
+
+    def _board(self, user_id):
+        """Every live task of a board, from the cache when possible"""
+        tasks = self.task_cache.get(user_id)
+        if tasks is None:
+            tasks, _, _ = self.read_board(self.board_query(user_id))
+            self.task_cache.put(user_id, tasks)
+        return tasks
+
+    def _list_board(self, user_id, column, limit, cursor):
+        if column is not None:
+            # Columns are ordered by position, which the query can't do
+            tasks = page_tasks(self._board(user_id), column, limit, cursor)
+            next_cursor = order_key(tasks[-1]) if limit is not None and len(tasks) == limit else None
+            return tasks, next_cursor
+        cached = self.task_cache.get(user_id)
+        if cached is None and limit is None and cursor is None:
+            cached = self._board(user_id)
+        if cached is not None:
+            tasks = page_tasks(cached, column, limit, cursor)
+            read = len(tasks)
+            last_id = tasks[-1]['id'] if tasks else None
+        else:
+            # Tombstones count towards the page, so the cursor is the last
+            # document read rather than the last live task
+            tasks, read, last_id = self.read_board(self.board_query(user_id, column, limit, cursor))
+        next_cursor = last_id if limit is not None and read == limit else None
+        return tasks, next_cursor
+
+    def _board_lock(self, *user_ids):
+        """Hold the write locks of the given boards (taken in a fixed order)"""
+        stack = contextlib.ExitStack()
+        for stripe in sorted({hash(user_id) % BOARD_LOCK_STRIPES for user_id in user_ids}):
+            stack.enter_context(self._board_locks[stripe])
+        return stack
+
+    def _create(self, text, column, user_id):
+        with self._board_lock(user_id):
+            return self._create_locked(text, column, user_id)
+
+    def _create_locked(self, text, column, user_id):
+        # Ids come from a leased block, so no collection scan is needed
+        position = self._append_position(self._board(user_id), column)
+        task_id = self.id_allocator.next_id()
+        version = self.next_version()
+        new_task = {
+            "id": task_id,
+            "text": text,
+            "column": column,
+            "userId": user_id,
+            "position": position,
+            "version": version,
+            "updatedAt": version
+        }
+        batch = self.db.batch()
+        batch.set(self.collection.document(str(task_id)), new_task)
+        self._add_history(batch, "created", new_task)
+        with io_timer("firestore", "commit"):
+            batch.commit()
+        self.task_cache.upsert(board_of(new_task), new_task)
+        return new_task
+
+    def _update(self, task_id, text, column, after=None, before=None, expected_version=None):
+        task_data = self._read_live(task_id)
+        if task_data is None:
+            return None
+        with self._board_lock(task_data['userId']):
+            return self._update_locked(task_id, text, column, after, before, expected_version)
+
+    def _update_locked(self, task_id, text, column, after, before, expected_version):
+        # Read again: a write to the board may have landed before the lock
+        task_data = self._read_live(task_id)
+        if task_data is None:
+            return None
+        check_version(task_data, expected_version)
+        position = None
+        if after is not None or before is not None:
+            position = self._place(task_data, column or task_data['column'], after, before)
+        elif column is not None and column != task_data.get('column'):
+            position = self._append_position(self._board(task_data['userId']), column)
+        update_data = self._update_data(text, column, position)
+        if update_data:
+            task_data.update(update_data)
+            batch = self.db.batch()
+            batch.update(self.collection.document(str(task_id)), update_data)
+            self._add_history(batch, "updated", task_data)
+            with io_timer("firestore", "commit"):
+                batch.commit()
+        self.task_cache.upsert(board_of(task_data), task_data)
+        return task_data
+
+    def _delete(self, task_id, expected_version=None):
+        task_data = self._read_live(task_id)
+        if task_data is None:
+            return None
+        with self._board_lock(task_data['userId']):
+            return self._delete_locked(task_id, expected_version)
+
+    def _delete_locked(self, task_id, expected_version):
+        task_data = self._read_live(task_id)
+        if task_data is None:
+            return None
+        check_version(task_data, expected_version)
+        # Leave a tombstone so delta sync can report the delete; it is
+        # purged after TOMBSTONE_TTL_SECONDS
+        tombstone = self._tombstone(task_data)
+        deleted = {**task_data, "version": tombstone["version"], "updatedAt": tombstone["updatedAt"]}
+        batch = self.db.batch()
+        batch.set(self.collection.document(str(task_id)), tombstone)
+        self._add_history(batch, "deleted", deleted)
+        with io_timer("firestore", "commit"):
+            batch.commit()
+        self.task_cache.remove(board_of(task_data), task_id)
+        return deleted
+
+    def _batch(self, operations):
+        if len(operations) > self.max_batch_operations:
+            raise BatchError(self.max_batch_operations, 400,
+                             f"a batch holds at most {self.max_batch_operations} operations")
+        boards = {operation.userId for operation in operations if operation.op == "create"}
+        for operation in operations:
+            if operation.op != "create" and operation.id is not None:
+                task_data = self._read_live(operation.id)
+                if task_data is not None:
+                    boards.add(task_data['userId'])
+        with self._board_lock(*boards):
+            return self._batch_locked(operations)
+
+    def _batch_locked(self, operations):
+        current = {}
+        for operation in operations:
+            if operation.op != "create" and operation.id is not None and operation.id not in current:
+                current[operation.id] = self._read_live(operation.id)
+        error = validate_batch(operations, lambda task_id: current.get(task_id) is not None)
+        if error is not None:
+            raise BatchError(*error)
+
+        # Creates and moves append; the last position handed out per column
+        last_positions = {}
+
+        def append_position(user_id, column):
+            key = (user_id, column)
+            if key not in last_positions:
+                last_positions[key] = self._append_position(self._board(user_id), column)
+            else:
+                last_positions[key] = key_between(last_positions[key], None)
+            return last_positions[key]
+
+        # A single WriteBatch commits atomically
+        batch = self.db.batch()
+        results = []
+        for operation in operations:
+            if operation.op == "create":
+                column = operation.column or "Planning"
+                position = append_position(operation.userId, column)
+                task_id = self.id_allocator.next_id()
+                version = self.next_version()
+                task_data = {
+                    "id": task_id,
+                    "text": operation.text,
+                    "column": column,
+                    "userId": operation.userId,
+                    "position": position,
+                    "version": version,
+                    "updatedAt": version
+                }
+                batch.set(self.collection.document(str(task_id)), task_data)
+                current[task_id] = task_data
+                results.append(("created", dict(task_data)))
+            elif operation.op == "delete":
+                task_data = current.pop(operation.id)
+                tombstone = self._tombstone(task_data)
+                batch.set(self.collection.document(str(operation.id)), tombstone)
+                results.append(("deleted", {**task_data, "version": tombstone["version"],
+                                            "updatedAt": tombstone["updatedAt"]}))
+            else:
+                text, column = batch_fields(operation)
+                task_data = current[operation.id]
+                position = None
+                if column is not None and column != task_data.get('column'):
+                    position = append_position(task_data['userId'], column)
+                update_data = self._update_data(text, column, position)
+                if update_data:
+                    batch.update(self.collection.document(str(operation.id)), update_data)
+                    task_data.update(update_data)
+                results.append(("updated", dict(task_data)))
+        for event_type, task_data in results:
+            self._add_history(batch, event_type, task_data)
+        with io_timer("firestore", "commit"):
+            batch.commit()
+
+        for event_type, task_data in results:
+            if event_type == "deleted":
+                self.task_cache.remove(board_of(task_data), task_data['id'])
+            else:
+                self.task_cache.upsert(board_of(task_data), task_data)
+        return results
+
+    def _changes_since(self, user_id, since):
+        # Tombstones older than the TTL may be purged already, so a client
+        # that far behind gets the whole board instead
+        horizon = int(time.time() * 1000) - TOMBSTONE_TTL_SECONDS * 1000
+        if since < horizon:
+            tasks, _, _ = self.read_board(self.board_query(user_id))
+            version = max((task.get('version', 0) for task in tasks), default=since)
+            return tasks, [], version, True
+
+        query = (
+            self.collection
+            .where('userId', '==', user_id)
+            .where('version', '>', since)
+            .order_by('version')
+        )
+        changed = []
+        deleted = []
+        version = since
+        with io_timer("firestore", "stream"):
+            docs = list(query.stream())
+        for doc in docs:
+            task_data = doc.to_dict()
+            task_data['id'] = int(doc.id)
+            version = max(version, task_data.get('version', 0))
+            if is_tombstone(task_data):
+                deleted.append(task_data['id'])
+            else:
+                changed.append(task_data)
+        return changed, deleted, version, False
+
+    @staticmethod
+    def _append_position(tasks, column):
+        """Position after the last card of ``column`` in a loaded board"""
+        last = max((task.get('position') or "" for task in column_tasks(tasks, column)), default="")
+        return key_between(last or None, None)
+
+    def _place(self, task_data, column, after, before):
+        user_id = task_data['userId']
+        tasks = column_tasks(self._board(user_id), column)
+        if any(task.get('position') is None for task in tasks):
+            # Cards from before positions existed get theirs first
+            self._rebalance(user_id, column)
+            tasks = column_tasks(self._board(user_id), column)
+        order = ColumnOrder()
+        positions = {}
+        for task in tasks:
+            order.add(task.get('position'), task['id'])
+            positions[task['id']] = task.get('position')
+
+        def position_of(neighbour_id):
+            if neighbour_id == task_data['id'] or neighbour_id not in positions:
+                raise ValueError(f"Task {neighbour_id} is not in column {column!r}")
+            return positions[neighbour_id]
+
+        try:
+            return place(order, position_of, after, before, moving=task_data['id'])
+        except ValueError as e:
+            raise InvalidMove(str(e)) from None
+
+    def _rebalance(self, user_id, column):
+        """Rewrite a column's positions as short, evenly spaced keys (blocking)"""
+        with self._board_lock(user_id):
+            return self._rebalance_locked(user_id, column)
+
+    def _rebalance_locked(self, user_id, column):
+        tasks = sorted(column_tasks(self._board(user_id), column), key=order_key)
+        version = self.next_version()
+        updated = [
+            {**task, 'position': position, 'version': version, 'updatedAt': version}
+            for task, position in zip(tasks, spaced_keys(len(tasks)))
+        ]
+        # Two writes per card with its history
+        chunk = MAX_BATCH_WRITES // 2
+        for start in range(0, len(updated), chunk):
+            batch = self.db.batch()
+            for task_data in updated[start:start + chunk]:
+                batch.update(self.collection.document(str(task_data['id'])), {
+                    'position': task_data['position'],
+                    'version': version,
+                    'updatedAt': version,
+                })
+                self._add_history(batch, "updated", task_data)
+            with io_timer("firestore", "commit"):
+                batch.commit()
+        for task_data in updated:
+            self.task_cache.upsert(user_id, task_data)
+        return len(updated)
+
+    @property
+    def archive(self):
+        return self.db.collection(ARCHIVE_COLLECTION)
+
+    def _archive_done(self, column, updated_before):
+        """Move stale cards of ``column`` to the archive collection (blocking)
+
+        Tombstones have no column, so the query only finds live cards.
+        """
+        query = (
+            self.collection
+            .where('column', '==', column)
+            .where('updatedAt', '<', updated_before)
+            .limit(ARCHIVE_QUERY_LIMIT)
+        )
+        with io_timer("firestore", "stream"):
+            docs = list(query.stream())
+        if not docs:
+            return []
+        archived_at = int(time.time() * 1000)
+        # One WriteBatch: each task is archived and tombstoned together
+        batch = self.db.batch()
+        archived = []
+        for doc in docs:
+            task_data = doc.to_dict()
+            task_data['id'] = int(doc.id)
+            batch.set(self.archive.document(doc.id), {
+                "id": task_data['id'],
+                "userId": task_data.get('userId'),
+                "archivedAt": archived_at,
+                "data": pack(task_data),
+            })
+            tombstone = self._tombstone(task_data)
+            batch.set(self.collection.document(doc.id), tombstone)
+            archived.append({**task_data, "version": tombstone["version"], "updatedAt": tombstone["updatedAt"]})
+            self._add_history(batch, "deleted", archived[-1])
+        with io_timer("firestore", "commit"):
+            batch.commit()
+        for task_data in archived:
+            self.task_cache.remove(board_of(task_data), task_data['id'])
+        return archived
+
+    def _list_archive(self, user_id, limit, cursor):
+        query = (
+            self.archive
+            .where('userId', '==', user_id)
+            .order_by('archivedAt', 'DESCENDING')
+            .order_by('id', 'DESCENDING')
+        )
+        if cursor is not None:
+            query = query.start_after({'archivedAt': cursor[0], 'id': cursor[1]})
+        if limit is not None:
+            query = query.limit(limit)
+        with io_timer("firestore", "stream"):
+            docs = list(query.stream())
+        entries = [(doc.to_dict()['archivedAt'], unpack(doc.to_dict()['data'])) for doc in docs]
+        next_cursor = None
+        if limit is not None and len(entries) == limit:
+            next_cursor = (entries[-1][0], entries[-1][1]['id'])
+        return entries, next_cursor
+
+    def _restore(self, task_id):
+        with io_timer("firestore", "get"):
+            doc = self.archive.document(str(task_id)).get()
+        if not doc.exists:
+            return None
+        task_data = unpack(doc.to_dict()['data'])
+        with self._board_lock(task_data['userId']):
+            version = self.next_version()
+            task_data.update({
+                "position": self._append_position(self._board(task_data['userId']), task_data['column']),
+                "version": version,
+                "updatedAt": version,
+            })
+            batch = self.db.batch()
+            batch.set(self.collection.document(str(task_id)), task_data)
+            batch.delete(self.archive.document(str(task_id)))
+            self._add_history(batch, "created", task_data)
+            with io_timer("firestore", "commit"):
+                batch.commit()
+            self.task_cache.upsert(board_of(task_data), task_data)
+        return task_data
+
+    @property
+    def history(self):
+        return self.db.collection(HISTORY_COLLECTION)
+
+    @property
+    def history_checkpoints(self):
+        return self.db.collection(HISTORY_CHECKPOINT_COLLECTION)
+
+    def _add_history(self, batch, event_type, task_data):
+        """Add a change's history document to the batch that commits it"""
+        batch.set(self.history.document(f"{task_data['id']}-{task_data['version']}"), {
+            "taskId": task_data['id'],
+            "userId": task_data.get('userId'),
+            "version": task_data['version'],
+            "at": task_data['updatedAt'],
+            "type": event_type,
+            "data": pack(task_data),
+        })
+
+    def _checkpoint(self, user_id, force):
+        """Write a checkpoint of a board from a fresh read (blocking)
+
+        Without ``force`` only a board that has none gets one. The
+        checkpoint time is the newest version read, tombstones included, so
+        replay starts right after the changes the read saw. Returns how many
+        cards were read.
+        """
+        if not force:
+            query = self.history_checkpoints.where('userId', '==', user_id).limit(1)
+            with io_timer("firestore", "stream"):
+                if list(query.stream()):
+                    return 0
+        with io_timer("firestore", "stream"):
+            docs = list(self.board_query(user_id).stream())
+        tasks = []
+        at = 0
+        for doc in docs:
+            task_data = doc.to_dict()
+            at = max(at, task_data.get('version', 0))
+            if not is_tombstone(task_data):
+                task_data['id'] = int(doc.id)
+                tasks.append(task_data)
+        data = pack(sorted(tasks, key=lambda task: task['id']))
+        if len(data) > MAX_CHECKPOINT_BYTES:
+            logger.warning("Board too large for a history checkpoint", extra={"user_id": user_id})
+            return len(tasks)
+        board_key = hashlib.sha1(user_id.encode("utf-8")).hexdigest()[:16]
+        with io_timer("firestore", "set"):
+            self.history_checkpoints.document(f"{board_key}-{at}").set({"userId": user_id, "at": at, "data": data})
+        return len(tasks)
+
+    def _after_write(self, tasks):
+        """Count committed changes per board and checkpoint the boards that are due"""
+        for task in tasks:
+            user_id = task.get('userId')
+            count = self._history_counts.get(user_id)
+            self._history_counts[user_id] = (count or 0) + 1
+            if count is None or count + 1 >= HISTORY_CHECKPOINT_EVERY:
+                if user_id not in self._checkpointing:
+                    self._history_counts[user_id] = 0
+                    self._checkpointing[user_id] = asyncio.get_running_loop().create_task(
+                        self._run_checkpoint(user_id, force=count is not None))
+
+    async def _run_checkpoint(self, user_id, force):
+        try:
+            size = await asyncio.to_thread(self._checkpoint, user_id, force)
+            # A board larger than the interval waits for as many changes as it has cards
+            self._history_counts[user_id] = (
+                self._history_counts.get(user_id, 0) + min(0, HISTORY_CHECKPOINT_EVERY - size))
+        except Exception as e:
+            logger.error("History checkpoint failed: %s", e, extra={"user_id": user_id})
+        finally:
+            self._checkpointing.pop(user_id, None)
+
+    def _task_history(self, task_id, limit, cursor):
+        query = self.history.where('taskId', '==', task_id)
+        if cursor is not None:
+            query = query.where('version', '>', cursor)
+        query = query.order_by('version')
+        if limit is not None:
+            # One more than asked for tells whether there is a next page
+            query = query.limit(limit + 1)
+        with io_timer("firestore", "stream"):
+            docs = [doc.to_dict() for doc in query.stream()]
+        events = [history_event(doc['type'], unpack(doc['data']), doc['at']) for doc in docs]
+        next_cursor = None
+        if limit is not None and len(events) > limit:
+            events = events[:limit]
+            next_cursor = events[-1]['task']['version']
+        return events, next_cursor
+
+    def _board_as_of(self, user_id, at):
+        query = (
+            self.history_checkpoints
+            .where('userId', '==', user_id)
+            .where('at', '<=', at)
+            .order_by('at', 'DESCENDING')
+            .limit(1)
+        )
+        with io_timer("firestore", "stream"):
+            checkpoints = [doc.to_dict() for doc in query.stream()]
+        if not checkpoints:
+            return None
+        checkpoint = checkpoints[0]
+        query = (
+            self.history
+            .where('userId', '==', user_id)
+            .where('at', '>', checkpoint['at'])
+            .where('at', '<=', at)
+            .order_by('at')
+        )
+        with io_timer("firestore", "stream"):
+            docs = [doc.to_dict() for doc in query.stream()]
+        events = [history_event(doc['type'], unpack(doc['data']), doc['at']) for doc in docs]
+        return replay(unpack(checkpoint['data']), events, at)
+
+    def _update_data(self, text, column, position=None):
+        update_data = {}
+        if text is not None:
+            update_data['text'] = text
+        if column is not None:
+            update_data['column'] = column
+        if position is not None:
+            update_data['position'] = position
+        if update_data:
+            version = self.next_version()
+            update_data['version'] = version
+            update_data['updatedAt'] = version
+        return update_data
+
+    def _tombstone(self, task_data):
+        version = self.next_version()
+        return {
+            "id": task_data['id'],
+            "userId": task_data.get('userId'),
+            "deleted": True,
+            "version": version,
+            "updatedAt": version
+        }
+
+    def purge_tombstones(self):
+        """Delete tombstones older than TOMBSTONE_TTL_SECONDS (blocking)"""
+        horizon = int(time.time() * 1000) - TOMBSTONE_TTL_SECONDS * 1000
+        query = (
+            self.collection
+            .where('deleted', '==', True)
+            .where('version', '<', horizon)
+            .limit(500)
+        )
+        purged = 0
+        while True:
+            docs = list(query.stream())
+            if not docs:
+                return purged
+            batch = self.db.batch()
+            for doc in docs:
+                batch.delete(self.collection.document(doc.id))
+            batch.commit()
+            purged += len(docs)
+
+    async def purge_tombstones_periodically(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.purge_tombstones)
+                if purged:
+                    logger.info("Purged %d task tombstones", purged)
+            except Exception as e:
+                logger.error("Tombstone purge failed: %s", e)
+            await asyncio.sleep(TOMBSTONE_PURGE_INTERVAL)
+
+    # TaskBackend
+
+    async def create(self, text, column, user_id):
+        self._require()
+        task = await asyncio.to_thread(self._create, text, column, user_id)
+        self._after_write([task])
+        self.maybe_rebalance(task)
+        return task
+
+    async def get(self, task_id):
+        self._require()
+        return await asyncio.to_thread(self._read_live, task_id)
+
+    async def list_board(self, user_id, column=None, limit=None, cursor=None):
+        self._require()
+        return await asyncio.to_thread(self._list_board, user_id, column, limit, cursor)
+
+    async def update(self, task_id, text=None, column=None, after=None, before=None, expected_version=None):
+        self._require()
+        task = await asyncio.to_thread(self._update, task_id, text, column, after, before, expected_version)
+        if task is not None:
+            self._after_write([task])
+        self.maybe_rebalance(task)
+        return task
+
+    async def delete(self, task_id, expected_version=None):
+        self._require()
+        task = await asyncio.to_thread(self._delete, task_id, expected_version)
+        if task is not None:
+            self._after_write([task])
+        return task
+
+    async def batch(self, operations):
+        self._require()
+        results = await asyncio.to_thread(self._batch, operations)
+        self._after_write([task for _, task in results])
+        for event_type, task in results:
+            if event_type != "deleted":
+                self.maybe_rebalance(task)
+        return results
+
+    async def rebalance(self, user_id, column):
+        self._require()
+        count = await asyncio.to_thread(self._rebalance, user_id, column)
+        self._board_reset(user_id)
+        return count
+
+    async def archive_done(self, column, updated_before):
+        self._require()
+        archived = await asyncio.to_thread(self._archive_done, column, updated_before)
+        self._after_write(archived)
+        return archived
+
+    async def list_archive(self, user_id, limit=None, cursor=None):
+        self._require()
+        return await asyncio.to_thread(self._list_archive, user_id, limit, cursor)
+
+    async def restore(self, task_id):
+        self._require()
+        task = await asyncio.to_thread(self._restore, task_id)
+        if task is not None:
+            self._after_write([task])
+        return task
+
+    async def task_history(self, task_id, limit=None, cursor=None):
+        self._require()
+        return await asyncio.to_thread(self._task_history, task_id, limit, cursor)
+
+    async def board_as_of(self, user_id, at):
+        self._require()
+        tasks = await asyncio.to_thread(self._board_as_of, user_id, at)
+        if tasks is None:
+            raise HistoryUnavailable("as_of predates the board's history")
+        return tasks
+
+    async def changes_since(self, user_id, since):
+        self._require()
+        return await asyncio.to_thread(self._changes_since, user_id, since)
+
+    async def board_tag(self, user_id):
+        """Newest version plus task count of the cached board
+
+        Every create/update raises the newest version and every delete lowers
+        the count, so two different board states never share a validator.
+        Boards that aren't cached have no tag.
+        """
+        tasks = self.task_cache.peek(user_id)
+        if tasks is None:
+            return None
+        newest = max((task.get('version', 0) for task in tasks), default=0)
+        return f"{newest}:{len(tasks)}"
+
+    def stats(self):
+        return {"storage": "firebase", "cache": self.task_cache.stats()}
@@ -0,0 +1,211 @@
+"""
+Write-behind pipeline that moves Firestore writes off the event loop.
+
+Handlers enqueue a write once the local store has committed and return
+immediately. A background task coalesces pending writes per document (the
+latest state wins, partial updates are merged) and flushes them as batched
+writes of up to 500 operations, running the blocking firebase_admin commit
+in a worker thread. Failed batches are retried with exponential backoff.
+The queue is bounded: producers wait for room when it is full.
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+from metrics import io_timer
+
+logger = logging.getLogger(__name__)
+
+# Firestore rejects batched writes with more than 500 operations
+MAX_BATCH_SIZE = 500
+
+
+def coalesce(older, newer):
+    """Merge two pending writes for the same document into one"""
+    old_op, old_data = older
+    new_op, new_data = newer
+    if new_op in ("set", "delete"):
+        return newer
+    # newer is a partial update
+    if old_op == "set":
+        return ("set", {**old_data, **new_data})
+    if old_op == "update":
+        return ("update", {**old_data, **new_data})
+    # update after delete: the document is gone, keep the update so the
+    # failure surfaces rather than silently recreating a partial document
+    return newer
+
+
+class FirestoreWriteBehind:
+    """Coalescing, batching, bounded write-behind queue for one collection"""
+
+    def __init__(self, db, collection="kanban-tasks", max_pending=10000,
+                 batch_size=MAX_BATCH_SIZE, flush_interval=0.05,
+                 max_retries=5, base_backoff=0.2):
+        self.db = db
+        self.collection = collection
+        self.max_pending = max_pending
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+
+        self._pending = OrderedDict()
+        self._wakeup = None
+        self._room = None
+        self._task = None
+        self._stopping = False
+        self._in_flight = 0
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+
+    # --- lifecycle -----------------------------------------------------
+
+    async def start(self):
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._room = asyncio.Condition()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still pending and stop the worker"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    # --- producers -----------------------------------------------------
+
+    async def enqueue_set(self, doc_id, data):
+        await self._enqueue(str(doc_id), ("set", dict(data)))
+
+    async def enqueue_update(self, doc_id, data):
+        await self._enqueue(str(doc_id), ("update", dict(data)))
+
+    async def enqueue_delete(self, doc_id):
+        await self._enqueue(str(doc_id), ("delete", None))
+
+    async def enqueue_many(self, writes):
+        """Queue ``(op, doc_id, data)`` writes; they flush together when they fit in one batch"""
+        for op, doc_id, data in writes:
+            await self._enqueue(str(doc_id), (op, dict(data) if data is not None else None))
+
+    async def _enqueue(self, doc_id, write):
+        if doc_id not in self._pending and len(self._pending) >= self.max_pending:
+            async with self._room:
+                await self._room.wait_for(
+                    lambda: doc_id in self._pending or len(self._pending) < self.max_pending
+                )
+        self.enqueued += 1
+        if doc_id in self._pending:
+            self._pending[doc_id] = coalesce(self._pending[doc_id], write)
+            self.coalesced += 1
+        else:
+            self._pending[doc_id] = write
+        self._wakeup.set()
+
+    # --- consumer ------------------------------------------------------
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # Give bursts a moment to coalesce before flushing
+            if not self._stopping and len(self._pending) < self.batch_size:
+                await asyncio.sleep(self.flush_interval)
+            await self._flush_once()
+
+    async def _flush_once(self):
+        writes = []
+        while self._pending and len(writes) < self.batch_size:
+            writes.append(self._pending.popitem(last=False))
+        if not writes:
+            return
+        async with self._room:
+            self._room.notify_all()
+
+        self._in_flight = len(writes)
+        try:
+            await self._commit_with_retry(writes)
+        finally:
+            self._in_flight = 0
+
+    async def _commit_with_retry(self, writes):
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._commit, writes)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("Firestore batch failed after %d attempts: %s", attempt + 1, e)
+                    await self._commit_individually(writes)
+                    return
+                await asyncio.sleep(self.base_backoff * (2 ** attempt))
+                continue
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.last_flush_ms = elapsed_ms
+            self.total_flush_ms += elapsed_ms
+            self.flushed += len(writes)
+            self.batches += 1
+            return
+
+    async def _commit_individually(self, writes):
+        """Isolate a poison write so one bad document doesn't drop the batch"""
+        for write in writes:
+            try:
+                await asyncio.to_thread(self._commit, [write])
+                self.flushed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error("Firestore write-behind dropped write for %s: %s", write[0], e)
+
+    def _commit(self, writes):
+        batch = self.db.batch()
+        collection = self.db.collection(self.collection)
+        for doc_id, (op, data) in writes:
+            ref = collection.document(doc_id)
+            if op == "set":
+                batch.set(ref, data)
+            elif op == "update":
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+        with io_timer("firestore", "commit"):
+            batch.commit()
+
+    # --- observability -------------------------------------------------
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    def is_idle(self):
+        """True when every enqueued write has been committed (or dropped)"""
+        return not self._pending and not self._in_flight
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "enqueued": self.enqueued,
+            "coalesced": self.coalesced,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "batches": self.batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self.total_flush_ms / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,95 @@
+"""
+Lazy, per-user hydration of the in-memory store from Firestore.
+
+With ``HYDRATION_MODE=lazy`` the service no longer streams the whole
+``kanban-tasks`` collection at startup. A user's board is fetched with a
+``userId`` query the first time it is needed, kept resident while the user
+is active, and dropped from memory once idle for ``HYDRATION_IDLE_TTL``
+seconds or when more than ``HYDRATION_MAX_USERS`` boards are resident
+(least recently used first).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+from task_store import TaskRecord
+
+
+class BoardHydrator:
+    """Loads boards on first access and evicts idle ones"""
+
+    def __init__(self, store, fetch_board, fetch_owner, max_users=10000,
+                 idle_ttl=900.0, can_evict=None, on_load=None):
+        self.store = store
+        self.fetch_board = fetch_board
+        self.fetch_owner = fetch_owner
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        # Evicting is only safe once the user's writes have reached Firestore
+        self.can_evict = can_evict or (lambda: True)
+        self.on_load = on_load
+        self._resident = OrderedDict()
+        self._loading = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def is_resident(self, user_id):
+        return user_id in self._resident
+
+    async def ensure(self, user_id):
+        """Make sure ``user_id``'s board is in the store"""
+        if user_id in self._resident:
+            self._touch(user_id)
+            return
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = asyncio.ensure_future(self._load(user_id))
+            self._loading[user_id] = loading
+            loading.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        await asyncio.shield(loading)
+
+    async def ensure_task(self, task_id):
+        """Hydrate the board owning ``task_id`` before it is mutated"""
+        record = self.store.get(task_id)
+        if record is not None:
+            owner = record.userId
+        else:
+            owner = await asyncio.to_thread(self.fetch_owner, task_id)
+        if owner is not None:
+            await self.ensure(owner)
+
+    async def _load(self, user_id):
+        tasks = await asyncio.to_thread(self.fetch_board, user_id)
+        for task_data in tasks:
+            # Local records are newer than Firestore while writes are queued
+            if task_data["id"] not in self.store:
+                self.store.add(TaskRecord.from_dict(task_data), track=False)
+        if self.on_load:
+            self.on_load(tasks)
+        self.loads += 1
+        self._touch(user_id)
+        self.evict_idle()
+
+    def _touch(self, user_id):
+        self._resident[user_id] = time.monotonic()
+        self._resident.move_to_end(user_id)
+
+    def evict_idle(self):
+        if not self._resident or not self.can_evict():
+            return
+        cutoff = time.monotonic() - self.idle_ttl
+        while self._resident:
+            user_id, last_used = next(iter(self._resident.items()))
+            if len(self._resident) <= self.max_users and last_used > cutoff:
+                break
+            del self._resident[user_id]
+            self.store.remove_user(user_id)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "resident_users": len(self._resident),
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,160 @@
+"""
+Task id allocation for the Firestore backend.
+
+Two interchangeable allocators are provided, selected with ``ID_ALLOCATOR``:
+
+``counter`` (default)
+    A counter document updated in a Firestore transaction. Each process
+    leases a block of ids (``ID_BLOCK_SIZE``, default 1000) per transaction
+    and hands them out locally, so creates cost one write and ids are never
+    duplicated across workers. Ids stay small and mostly sequential; a
+    restarted worker abandons the rest of its block.
+
+``snowflake``
+    Time/worker based ids that need no coordination at all:
+    41 bits of milliseconds since ``EPOCH_MS``, 6 bits of worker id
+    (``WORKER_ID``) and 6 bits of per-millisecond sequence. The layout fits
+    in 53 bits so ids stay exact as JavaScript numbers in the frontend.
+    ``WORKER_ID`` must be set, and differ between every process writing to
+    the same collection; startup fails without it.
+"""
+
+import os
+import threading
+import time
+
+COUNTER_COLLECTION = "kanban-meta"
+COUNTER_DOCUMENT = "task-counter"
+
+
+class CounterBlockAllocator:
+    """Lease blocks of ids from a transactional counter document"""
+
+    def __init__(self, db, block_size=1000, collection=COUNTER_COLLECTION,
+                 document=COUNTER_DOCUMENT, tasks_collection="kanban-tasks",
+                 transactional=None):
+        if transactional is None:
+            from firebase_admin import firestore
+            transactional = firestore.transactional
+        self.db = db
+        self.block_size = block_size
+        self.tasks_collection = tasks_collection
+        self._counter_ref = db.collection(collection).document(document)
+        self._transactional = transactional
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+        self.leases = 0
+
+    def next_id(self):
+        with self._lock:
+            if self._next >= self._limit:
+                self._next, self._limit = self._lease()
+            task_id = self._next
+            self._next += 1
+            return task_id
+
+    def _lease(self):
+        seed = None
+        if not self._counter_ref.get().exists:
+            # One-time migration: start the counter after the existing ids
+            seed = self._scan_max_id() + 1
+
+        block_size = self.block_size
+        counter_ref = self._counter_ref
+
+        @self._transactional
+        def reserve(transaction):
+            snapshot = counter_ref.get(transaction=transaction)
+            if snapshot.exists:
+                start = snapshot.to_dict().get("next", 1)
+            else:
+                start = seed or 1
+            transaction.set(counter_ref, {"next": start + block_size})
+            return start
+
+        start = reserve(self.db.transaction())
+        self.leases += 1
+        return start, start + block_size
+
+    def _scan_max_id(self):
+        docs = self.db.collection(self.tasks_collection).stream()
+        return max((int(doc.id) for doc in docs if doc.id.isdigit()), default=0)
+
+
+class SnowflakeAllocator:
+    """Coordination-free ids from timestamp, worker id and sequence"""
+
+    EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+    WORKER_BITS = 6
+    SEQUENCE_BITS = 6
+    MAX_WORKER = (1 << WORKER_BITS) - 1
+    MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+    def __init__(self, worker_id=0):
+        if not 0 <= worker_id <= self.MAX_WORKER:
+            raise ValueError(f"worker_id must be between 0 and {self.MAX_WORKER}")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            now = self._now_ms()
+            if now < self._last_ms:
+                # Clock went backwards; keep issuing from the last timestamp
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & self.MAX_SEQUENCE
+                if self._sequence == 0:
+                    while now <= self._last_ms:
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (
+                (now << (self.WORKER_BITS + self.SEQUENCE_BITS))
+                | (self.worker_id << self.SEQUENCE_BITS)
+                | self._sequence
+            )
+
+    def _now_ms(self):
+        return int(time.time() * 1000) - self.EPOCH_MS
+
+
+def snowflake_worker_id():
+    """``WORKER_ID`` as an int; raises ValueError if it is missing or out of range
+
+    There is no default: derived values such as the pid repeat across
+    containers (every one runs as pid 1), and two workers sharing an id
+    hand out the same ids.
+    """
+    value = os.getenv("WORKER_ID")
+    if not value:
+        raise ValueError("ID_ALLOCATOR=snowflake needs WORKER_ID, unique per process")
+    worker_id = int(value)
+    if not 0 <= worker_id <= SnowflakeAllocator.MAX_WORKER:
+        raise ValueError(f"WORKER_ID must be between 0 and {SnowflakeAllocator.MAX_WORKER}")
+    return worker_id
+
+
+def check_allocator_config(kind=None):
+    """Raise ValueError now for settings ``make_allocator`` would reject later"""
+    kind = kind or os.getenv("ID_ALLOCATOR", "counter")
+    if kind == "snowflake":
+        snowflake_worker_id()
+    elif kind != "counter":
+        raise ValueError(f"Unknown ID_ALLOCATOR: {kind}")
+
+
+def make_allocator(db, kind=None, **kwargs):
+    """Build the allocator named by ``kind`` or the ``ID_ALLOCATOR`` variable"""
+    kind = kind or os.getenv("ID_ALLOCATOR", "counter")
+    if kind == "snowflake":
+        worker_id = kwargs["worker_id"] if "worker_id" in kwargs else snowflake_worker_id()
+        return SnowflakeAllocator(worker_id=worker_id)
+    if kind == "counter":
+        kwargs.setdefault("block_size", int(os.getenv("ID_BLOCK_SIZE", "1000")))
+        return CounterBlockAllocator(db, **kwargs)
+    raise ValueError(f"Unknown ID_ALLOCATOR: {kind}")
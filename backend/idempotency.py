@@ -0,0 +1,449 @@
+"""
+Idempotency keys for task mutations.
+
+A POST / PUT / PATCH / DELETE under ``/tasks`` that carries an
+``Idempotency-Key`` header runs once. Its response is stored under the key,
+and a retry with the same key gets the stored response back (marked
+``Idempotent-Replayed: true``) without running again, so a client can retry
+a create on a flaky network without making a second card. A retry that
+arrives at the same process while the first attempt is still running waits
+for it. Reusing a
+key for a different request (method, path, query or body) is answered 422.
+
+Only final answers are stored: successes and client errors. 5xx responses
+and 429 are not, so a retry runs again. Keys expire after
+``IDEMPOTENCY_TTL`` seconds (default 24 hours), and at most
+``IDEMPOTENCY_MAX_KEYS`` (default 10000) are kept, the oldest dropped first.
+
+Stored responses are kept alongside the tasks, and a response is only sent
+once it is stored, so a client never sees a result whose key a crash could
+lose. With ``sqlite`` they go to a table in the same database, shared by
+every worker. Otherwise each one is appended to ``IDEMPOTENCY_FILE.log``
+and fsynced; the whole set is saved to ``IDEMPOTENCY_FILE`` (default
+``tasks_idempotency.json``) every ``IDEMPOTENCY_SAVE_INTERVAL`` seconds
+(default 10) and at shutdown, which empties the log. Those files belong to
+one process, like the memory backend's backup.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_SAVE_INTERVAL = int(os.getenv("IDEMPOTENCY_SAVE_INTERVAL", "10"))
+MAX_KEY_LENGTH = 255
+# Response headers recomputed (or stale) on a replay
+SKIPPED_HEADERS = (b"content-length", b"date", b"server")
+
+REPLAYED = REGISTRY.counter("kanban_idempotent_replays_total", "Mutations answered from a stored response")
+
+
+def request_fingerprint(scope, body):
+    """Digest of what a key was first used for"""
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body):
+        digest.update(part)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def is_final(status):
+    """Whether a retry should get this response back rather than run again"""
+    return status < 500 and status != 429
+
+
+class StoredResponse:
+    __slots__ = ("fingerprint", "status", "headers", "body", "expires")
+
+    def __init__(self, fingerprint, status, headers, body, expires):
+        self.fingerprint = fingerprint
+        self.status = status
+        # [(name, value)] as bytes, without content-length
+        self.headers = headers
+        self.body = body
+        self.expires = expires
+
+    def to_list(self):
+        return [
+            self.fingerprint,
+            self.status,
+            [[name.decode("latin-1"), value.decode("latin-1")] for name, value in self.headers],
+            base64.b64encode(self.body).decode("ascii"),
+            self.expires,
+        ]
+
+    @classmethod
+    def from_list(cls, values):
+        fingerprint, status, headers, body, expires = values
+        return cls(
+            fingerprint,
+            status,
+            [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+            base64.b64decode(body),
+            expires,
+        )
+
+
+class ResponseCache:
+    """Stored responses in memory, oldest first; ``path`` persists them as JSON
+    plus a log of the responses stored since"""
+
+    def __init__(self, path=None, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS):
+        self.path = path
+        self.journal_path = f"{path}.log" if path else None
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        # Log bytes ever written, and how many of them saves have dropped
+        self._journal_size = 0
+        self._journal_base = 0
+        self.replayed = 0
+
+    async def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= time.time():
+            del self._entries[key]
+            return None
+        return entry
+
+    async def put(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        self._evict(time.time())
+        if self.journal_path:
+            await asyncio.to_thread(self._append_journal, key, entry)
+
+    def _append_journal(self, key, entry):
+        line = (json.dumps([key, entry.to_list()], separators=(",", ":")) + "\n").encode()
+        with self._journal_lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, "ab")
+            self._journal.write(line)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._journal_size += len(line)
+
+    def _evict(self, now):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires > now and len(self._entries) <= self.max_keys:
+                break
+            del self._entries[key]
+
+    def load(self):
+        """Restore the responses written by ``save`` and logged since (blocking)"""
+        if not self.path:
+            return
+        try:
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    entries = json.load(f)
+                for key, values in entries:
+                    self._entries[key] = StoredResponse.from_list(values)
+            if os.path.exists(self.journal_path):
+                self._load_journal()
+            self._evict(time.time())
+            logger.info("Loaded %d idempotency keys", len(self._entries))
+        except Exception as e:
+            logger.error("Loading idempotency keys failed: %s", e)
+
+    def _load_journal(self):
+        valid_length = 0
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    key, values = json.loads(line)
+                except ValueError:
+                    # Torn final write from a crash; that response was never sent
+                    break
+                valid_length += len(line)
+                self._entries.pop(key, None)
+                self._entries[key] = StoredResponse.from_list(values)
+        if valid_length < os.path.getsize(self.journal_path):
+            with open(self.journal_path, "r+b") as f:
+                f.truncate(valid_length)
+                os.fsync(f.fileno())
+        self._journal_size = valid_length
+        self._journal_base = 0
+
+    def snapshot(self):
+        """Unexpired entries, copied so ``save`` can run in a thread, and how
+        much of the log they cover"""
+        self._evict(time.time())
+        with self._journal_lock:
+            logged = self._journal_size
+        return logged, [[key, entry.to_list()] for key, entry in self._entries.items()]
+
+    def save(self, snapshot):
+        """Write a ``snapshot()`` to ``path`` (temp file + atomic rename) and drop
+        the log records it covers (blocking)"""
+        if not self.path:
+            return
+        logged, entries = snapshot
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(entries, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._trim_journal(logged)
+
+    def _trim_journal(self, logged):
+        with self._journal_lock:
+            # A save that finished first may already have dropped these
+            covered = logged - self._journal_base
+            if covered <= 0:
+                return
+            with open(self.journal_path, "rb") as f:
+                f.seek(covered)
+                rest = f.read()
+            tmp = f"{self.journal_path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(rest)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.journal_path)
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._journal_base = logged
+
+    def close(self):
+        with self._journal_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def stats(self):
+        return {"keys": len(self._entries), "replayed": self.replayed}
+
+
+IDEMPOTENCY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    expiresAt REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_expires ON idempotency (expiresAt);
+"""
+SELECT_RESPONSE = 'SELECT fingerprint, status, headers, body, expiresAt FROM idempotency WHERE key = ? AND expiresAt > ?'
+UPSERT_RESPONSE = 'INSERT OR REPLACE INTO idempotency (key, fingerprint, status, headers, body, expiresAt) VALUES (?, ?, ?, ?, ?, ?)'
+PURGE_EXPIRED = 'DELETE FROM idempotency WHERE expiresAt <= ?'
+TRIM_RESPONSES = (
+    'DELETE FROM idempotency WHERE key IN '
+    '(SELECT key FROM idempotency ORDER BY expiresAt LIMIT MAX(0, (SELECT COUNT(*) FROM idempotency) - ?))'
+)
+# Expired and surplus rows are purged once per this many stored responses
+PURGE_EVERY = 100
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Stored responses in the SQLite task database, shared by every worker"""
+
+    def __init__(self, path, ttl=IDEMPOTENCY_TTL, max_keys=IDEMPOTENCY_MAX_KEYS):
+        super().__init__(None, ttl, max_keys)
+        self.db_path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    def _connection(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.executescript(IDEMPOTENCY_SCHEMA)
+        return self._conn
+
+    def _get(self, key):
+        with self._lock:
+            row = self._connection().execute(SELECT_RESPONSE, (key, time.time())).fetchone()
+        if row is None:
+            return None
+        fingerprint, status, headers, body, expires = row
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in json.loads(headers)]
+        return StoredResponse(fingerprint, status, headers, body, expires)
+
+    def _put(self, key, entry):
+        headers = json.dumps([[name.decode("latin-1"), value.decode("latin-1")] for name, value in entry.headers])
+        with self._lock:
+            conn = self._connection()
+            conn.execute(UPSERT_RESPONSE, (key, entry.fingerprint, entry.status, headers, entry.body, entry.expires))
+            self._puts += 1
+            if self._puts % PURGE_EVERY == 0:
+                conn.execute(PURGE_EXPIRED, (time.time(),))
+                conn.execute(TRIM_RESPONSES, (self.max_keys,))
+
+    async def get(self, key):
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key, entry):
+        await asyncio.to_thread(self._put, key, entry)
+
+    def snapshot(self):
+        return None
+
+    def save(self, snapshot):
+        pass
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        return {"replayed": self.replayed}
+
+
+def make_response_cache(storage):
+    """The response cache kept alongside the ``storage`` backend"""
+    if storage == "sqlite":
+        return SQLiteResponseCache(os.getenv("SQLITE_PATH", "tasks.db"))
+    return ResponseCache(os.getenv("IDEMPOTENCY_FILE", "tasks_idempotency.json"))
+
+
+class IdempotencyMiddleware:
+    """Plain ASGI middleware answering retried ``prefix`` mutations from ``cache``"""
+
+    def __init__(self, app, cache, prefix="/tasks", skip=("/tasks/import",)):
+        self.app = app
+        self.cache = cache
+        self.prefix = prefix
+        # Streamed uploads, which would have to be buffered to be fingerprinted
+        self.skip = skip
+        # key -> Event set when its first attempt has finished
+        self._running = {}
+
+    @staticmethod
+    def _key(scope):
+        for name, value in scope.get("headers", ()):
+            if name == b"idempotency-key":
+                return value.decode("latin-1")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS")
+                or not scope["path"].startswith(self.prefix) or scope["path"] in self.skip):
+            await self.app(scope, receive, send)
+            return
+        key = self._key(scope)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            await send_json(send, 400, {"detail": f"Idempotency-Key must be 1-{MAX_KEY_LENGTH} characters"})
+            return
+
+        body = await read_body(receive)
+        fingerprint = request_fingerprint(scope, body)
+        while True:
+            running = self._running.get(key)
+            if running is not None:
+                await running.wait()
+                continue
+            stored = await self.cache.get(key)
+            # Another attempt may have started during the lookup
+            if stored is not None or key not in self._running:
+                break
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                await send_json(send, 422, {"detail": "Idempotency-Key was already used for a different request"})
+                return
+            REPLAYED.inc()
+            self.cache.replayed += 1
+            await send_stored(send, stored)
+            return
+
+        done = self._running[key] = asyncio.Event()
+        try:
+            response, messages = await self._run(scope, body, receive)
+            if response is not None and is_final(response[0]):
+                status, headers, chunks = response
+                # Stored before it is sent: a retry after a crash must not run again
+                await self.cache.put(key, StoredResponse(
+                    fingerprint, status, headers, b"".join(chunks), time.time() + self.cache.ttl))
+            for message in messages:
+                await send(message)
+        finally:
+            del self._running[key]
+            done.set()
+
+    async def _run(self, scope, body, receive):
+        """Run the app on the buffered request, returning ``(status, headers,
+        body chunks)`` and the response messages, held back for the caller"""
+        delivered = False
+        response = None
+        messages = []
+
+        async def replay_receive():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        async def capture_send(message):
+            nonlocal response
+            if message["type"] == "http.response.start":
+                headers = [(name, value) for name, value in message.get("headers", ())
+                           if name.lower() not in SKIPPED_HEADERS]
+                response = (message["status"], headers, [])
+            elif message["type"] == "http.response.body" and response is not None:
+                response[2].append(message.get("body", b""))
+            messages.append(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        return response, messages
+
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_stored(send, stored):
+    await send({
+        "type": "http.response.start",
+        "status": stored.status,
+        "headers": [
+            *stored.headers,
+            (b"content-length", str(len(stored.body)).encode()),
+            (b"idempotent-replayed", b"true"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": stored.body})
+
+
+async def send_json(send, status, payload):
+    body = json.dumps(payload).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
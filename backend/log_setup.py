@@ -0,0 +1,76 @@
+"""
+Structured, non-blocking logging for the backend.
+
+Handlers and storage code log through the standard ``logging`` module.
+Records go onto a queue (``QueueHandler``) and a background
+``QueueListener`` thread formats and writes them to stdout, so a request
+never waits on the terminal or the log collector.
+
+``LOG_LEVEL`` (default ``INFO``) gates what is emitted; per-task mutation
+logs are ``DEBUG``. ``LOG_FORMAT=json`` (default) writes one JSON object per
+line with any ``extra=`` fields as keys, ``LOG_FORMAT=text`` writes plain
+lines for local development.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# Attributes every LogRecord has; anything else came in through ``extra=``
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        extra = {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRS}
+        if extra:
+            line += " " + " ".join(f"{key}={value}" for key, value in extra.items())
+        return line
+
+
+def setup_logging(level=None, fmt=None):
+    """Route the root logger through a queue to stdout (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("LOG_FORMAT", "json")
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(level)
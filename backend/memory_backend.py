@@ -0,0 +1,489 @@
+"""
+In-memory storage backend (``STORAGE_BACKEND=memory``).
+
+Tasks live in an indexed ``TaskStore`` made durable by ``TaskLog`` (snapshot
+file plus append-only mutation log). When Firestore is connected every write
+is mirrored through the write-behind queue, and boards are either loaded at
+startup (``HYDRATION_MODE=eager``) or on first access (``lazy``).
+Archived tasks go to segment files under ``ARCHIVE_DIR`` (task_archive.py),
+mirrored to their own Firestore collection, and every change is kept in the
+history log under ``HISTORY_DIR`` (task_history.py).
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from fast_json import join_array
+from firestore_writer import FirestoreWriteBehind
+from hydration import BoardHydrator
+from storage import (BatchError, HistoryUnavailable, InvalidMove, TaskBackend, VersionConflict, batch_fields,
+                     validate_batch)
+from task_archive import ARCHIVE_BATCH, ARCHIVE_COLLECTION, SegmentArchive, pack
+from task_history import HistoryLog, page_events
+from task_log import TaskLog
+from task_store import TaskRecord, TaskStore
+
+FIREBASE_COLLECTION = 'kanban-tasks'
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend(TaskBackend):
+    name = "memory"
+    uses_firebase = True
+
+    def __init__(self, firebase_db=None, tasks_file="tasks_backup.json",
+                 log_file="tasks_backup.log", hydration_mode=None, archive_dir=None, history_dir=None):
+        self.firebase_db = firebase_db
+        # In-memory storage, indexed by id, userId and (userId, column)
+        self.store = TaskStore(search_boards=int(os.getenv("SEARCH_INDEX_BOARDS", "1000")))
+        self.next_id = 1
+        self.task_log = TaskLog(
+            tasks_file,
+            log_file,
+            fsync_interval=float(os.getenv("TASKS_FSYNC_INTERVAL", "0.05")),
+            compact_every=int(os.getenv("TASKS_COMPACT_EVERY", "1000")),
+        )
+        # "eager" streams the whole collection at startup, "lazy" loads each
+        # user's board from Firestore on first access
+        self.hydration_mode = hydration_mode or os.getenv("HYDRATION_MODE", "eager")
+        self.hydrator = None
+        self.writer = None
+        self.archive = SegmentArchive(archive_dir or os.getenv("ARCHIVE_DIR", "tasks_archive"))
+        self.archive_writer = None
+        self.history = HistoryLog(history_dir or os.getenv("HISTORY_DIR", "tasks_history"))
+
+    async def start(self):
+        self.task_log.acquire()
+        self.load_tasks()
+        self.history.open(self.store.to_dicts())
+        if self.firebase_db is not None:
+            await self.attach_firebase(self.firebase_db)
+
+    async def attach_firebase(self, db):
+        """Mirror writes to Firestore and hydrate from it"""
+        if self.writer is not None:
+            return
+        self.firebase_db = db
+        self.writer = FirestoreWriteBehind(
+            self.firebase_db,
+            FIREBASE_COLLECTION,
+            max_pending=int(os.getenv("FIRESTORE_MAX_PENDING", "10000")),
+        )
+        await self.writer.start()
+        self.archive_writer = FirestoreWriteBehind(self.firebase_db, ARCHIVE_COLLECTION)
+        await self.archive_writer.start()
+        if self.hydration_mode == "lazy":
+            self.hydrator = BoardHydrator(
+                self.store,
+                self.fetch_user_tasks,
+                self.fetch_task_owner,
+                max_users=int(os.getenv("HYDRATION_MAX_USERS", "10000")),
+                idle_ttl=float(os.getenv("HYDRATION_IDLE_TTL", "900")),
+                can_evict=self.writer.is_idle,
+                on_load=self.reserve_loaded_ids,
+            )
+        else:
+            await self.sync_with_firebase()
+
+    async def stop(self):
+        """Drain pending Firestore writes and flush the mutation log"""
+        if self.writer:
+            await self.writer.stop()
+        if self.archive_writer:
+            await self.archive_writer.stop()
+        self.task_log.close()
+        self.history.close()
+
+    # Durable storage: snapshot file plus an append-only mutation log
+
+    def load_tasks(self):
+        try:
+            tasks, self.next_id = self.task_log.load()
+            self.store.load(tasks, version=self.task_log.version)
+            if tasks:
+                logger.info("Loaded %d tasks from backup", len(self.store))
+        except Exception as e:
+            logger.error("Error loading tasks: %s", e)
+            self.store.clear()
+            self.next_id = 1
+        self.task_log.open()
+
+    def log_task_put(self, record):
+        """Append the current state of a task to the mutation log"""
+        try:
+            self.task_log.append_put(record.to_dict(), self.next_id)
+            self.maybe_compact()
+        except Exception as e:
+            logger.error("Error saving tasks: %s", e)
+
+    def log_task_batch(self, entries):
+        """Append the records of one batch to the mutation log in a single write"""
+        try:
+            self.task_log.append_batch(entries, self.next_id)
+            self.maybe_compact()
+        except Exception as e:
+            logger.error("Error saving tasks: %s", e)
+
+    def log_task_delete(self, record):
+        """Append a task deletion (tombstone version included) to the mutation log"""
+        try:
+            self.task_log.append_delete(record.id, record.version)
+            self.maybe_compact()
+        except Exception as e:
+            logger.error("Error saving tasks: %s", e)
+
+    def record_history(self, changes):
+        """Add ``(event_type, task)`` changes to the history log"""
+        for event_type, task in changes:
+            self.history.record(event_type, task)
+        if self.history.should_rotate():
+            self.history.rotate()
+
+    def maybe_compact(self):
+        """Snapshot the store in the background once enough records have accumulated"""
+        if self.task_log.should_compact():
+            records = self.store.records()
+            self.task_log.compact(lambda: [record.to_dict() for record in records],
+                                  self.next_id, self.store.version)
+
+    # Position rebalancing
+
+    async def rebalance(self, user_id, column):
+        records = self.store.rebalance(user_id, column)
+        self.log_task_batch([("put", record.to_dict()) for record in records])
+        self.record_history([("updated", record.to_dict()) for record in records])
+        if self.writer:
+            await self.writer.enqueue_many([
+                ("update", record.id, {
+                    'position': record.position,
+                    'version': record.version,
+                    'updatedAt': record.updatedAt,
+                })
+                for record in records
+            ])
+        self._board_reset(user_id)
+        return len(records)
+
+    # Archive
+
+    async def archive_done(self, column, updated_before):
+        records = self.store.stale(column, updated_before, limit=ARCHIVE_BATCH)
+        if not records:
+            return []
+        archived_at = int(time.time() * 1000)
+        tasks = [record.to_dict() for record in records]
+        # The archive is written (and fsynced) before the tasks leave the
+        # store, so a crash in between leaves a duplicate, never a loss
+        await asyncio.to_thread(self.archive.append, [{"archivedAt": archived_at, "task": task} for task in tasks])
+        # Cards changed while the archive was written stay active
+        changed = {task["id"] for task in tasks
+                   if getattr(self.store.get(task["id"]), "version", None) != task["version"]}
+        if changed:
+            await asyncio.to_thread(self.archive.append, [
+                {"restoredAt": archived_at, "id": task_id} for task_id in changed
+            ])
+            tasks = [task for task in tasks if task["id"] not in changed]
+        removed = [self.store.remove(task["id"]) for task in tasks]
+        self.log_task_batch([("delete", record.to_dict()) for record in removed])
+        self.record_history([("deleted", record.to_dict()) for record in removed])
+        if self.writer:
+            await self.writer.enqueue_many([("delete", record.id, None) for record in removed])
+            await self.archive_writer.enqueue_many([
+                ("set", task["id"], self._archive_doc(archived_at, task)) for task in tasks
+            ])
+        return [record.to_dict() for record in removed]
+
+    async def list_archive(self, user_id, limit=None, cursor=None):
+        return await asyncio.to_thread(self.archive.page, user_id, limit, cursor)
+
+    async def restore(self, task_id):
+        task = await asyncio.to_thread(self.archive.get, task_id)
+        if task is None:
+            return None
+        await self.ensure_board(task["userId"])
+        if task_id in self.store:
+            # Restored before, but a crash kept it from leaving the archive
+            await asyncio.to_thread(self.archive.mark_restored, task_id)
+            return None
+        # No position: the card goes to the end of its column
+        record = self.store.add(TaskRecord.from_dict({**task, "position": None}))
+        self.next_id = max(self.next_id, record.id + 1)
+        self.log_task_put(record)
+        task = record.to_dict()
+        self.record_history([("created", task)])
+        # Only now that the card is back in the store does it leave the archive
+        await asyncio.to_thread(self.archive.mark_restored, task_id)
+        if self.writer:
+            await self.writer.enqueue_set(record.id, task)
+            await self.archive_writer.enqueue_delete(record.id)
+        return task
+
+    # History
+
+    async def task_history(self, task_id, limit=None, cursor=None):
+        events = await asyncio.to_thread(self.history.task_history, task_id)
+        return page_events(events, limit, cursor)
+
+    async def board_as_of(self, user_id, at):
+        tasks = await asyncio.to_thread(self.history.board_as_of, user_id, at)
+        if tasks is None:
+            raise HistoryUnavailable("as_of predates the task history")
+        return tasks
+
+    @staticmethod
+    def _archive_doc(archived_at, task):
+        return {"id": task["id"], "userId": task["userId"], "archivedAt": archived_at, "data": pack(task)}
+
+    # Firestore hydration
+
+    def reserve_loaded_ids(self, tasks):
+        """Keep next_id ahead of ids hydrated from Firebase"""
+        if tasks:
+            self.next_id = max(self.next_id, max(task['id'] for task in tasks) + 1)
+
+    async def ensure_board(self, user_id):
+        """Load a user's board from Firestore if it isn't in memory yet"""
+        if self.hydrator:
+            await self.hydrator.ensure(user_id)
+
+    async def ensure_task_board(self, task_id):
+        """Load the board owning a task if it isn't in memory yet"""
+        if self.hydrator:
+            await self.hydrator.ensure_task(task_id)
+
+    async def sync_with_firebase(self):
+        """Sync local tasks with Firebase"""
+        try:
+            docs = self.firebase_db.collection(FIREBASE_COLLECTION).stream()
+            firebase_tasks = []
+            for doc in docs:
+                task_data = doc.to_dict()
+                task_data['id'] = int(doc.id)
+                firebase_tasks.append(task_data)
+
+            if firebase_tasks:
+                self.store.load(firebase_tasks, version=self.store.version)
+                self.reserve_loaded_ids(firebase_tasks)
+                logger.info("Synced %d tasks from Firebase", len(firebase_tasks))
+        except Exception as e:
+            logger.error("Firebase sync failed: %s", e)
+
+    def fetch_user_tasks(self, user_id):
+        """Read one user's board from Firebase (blocking; run in a thread)"""
+        docs = self.firebase_db.collection(FIREBASE_COLLECTION).where('userId', '==', user_id).stream()
+        tasks = []
+        for doc in docs:
+            task_data = doc.to_dict()
+            task_data['id'] = int(doc.id)
+            tasks.append(task_data)
+        return tasks
+
+    def fetch_task_owner(self, task_id):
+        """Look up which user a task belongs to (blocking; run in a thread)"""
+        doc = self.firebase_db.collection(FIREBASE_COLLECTION).document(str(task_id)).get()
+        if not doc.exists:
+            return None
+        return doc.to_dict().get('userId')
+
+    # TaskBackend
+
+    async def create(self, text, column, user_id):
+        await self.ensure_board(user_id)
+        record = self.store.add(TaskRecord(
+            id=self.next_id,
+            text=text,
+            column=column,
+            userId=user_id
+        ))
+        self.next_id += 1
+        if self.writer:
+            await self.writer.enqueue_set(record.id, record.to_dict())
+        self.log_task_put(record)
+        task = record.to_dict()
+        self.record_history([("created", task)])
+        self.maybe_rebalance(task)
+        return task
+
+    async def get(self, task_id):
+        await self.ensure_task_board(task_id)
+        record = self.store.get(task_id)
+        return record.to_dict() if record else None
+
+    async def list_board(self, user_id, column=None, limit=None, cursor=None):
+        await self.ensure_board(user_id)
+        records = self.store.page(user_id, column=column, limit=limit, cursor=cursor)
+        return [record.to_dict() for record in records], self._next_cursor(records, column, limit)
+
+    async def list_board_json(self, user_id, column=None, limit=None, cursor=None):
+        await self.ensure_board(user_id)
+        records = self.store.page(user_id, column=column, limit=limit, cursor=cursor)
+        return join_array([record.to_json() for record in records]), self._next_cursor(records, column, limit)
+
+    async def export_board(self, user_id, column=None, page_size=1000):
+        if column is not None:
+            async for tasks in super().export_board(user_id, column, page_size):
+                yield tasks
+            return
+        await self.ensure_board(user_id)
+        # Sort the ids once rather than scanning the board for every page
+        ids = sorted(record.id for record in self.store.list_user(user_id))
+        for start in range(0, len(ids), page_size):
+            records = (self.store.get(task_id) for task_id in ids[start:start + page_size])
+            yield [record.to_dict() for record in records if record is not None]
+
+    @staticmethod
+    def _next_cursor(records, column, limit):
+        if limit is None or len(records) < limit:
+            return None
+        last = records[-1]
+        return last.id if column is None else (last.position, last.id)
+
+    async def search(self, user_id, query, limit):
+        await self.ensure_board(user_id)
+        return [(record.to_dict(), score) for record, score in self.store.search(user_id, query, limit)]
+
+    async def update(self, task_id, text=None, column=None, after=None, before=None, expected_version=None):
+        await self.ensure_task_board(task_id)
+        # Nothing awaits from the version check until the store is updated,
+        # so the check and the write are atomic on the event loop
+        record = self.store.get(task_id)
+        if record is None:
+            return None
+        self._check_version(record, expected_version)
+        position = None
+        if after is not None or before is not None:
+            try:
+                position = self.store.place(record.userId, column or record.column, after, before, moving=task_id)
+            except ValueError as e:
+                raise InvalidMove(str(e))
+        position_before = record.position
+        # Update the task in place; the store keeps its indexes in sync
+        record = self.store.update(task_id, text=text, column=column, position=position)
+        update_data = self._update_data(record, text, column, position_before)
+        if self.writer and update_data:
+            await self.writer.enqueue_update(task_id, update_data)
+        self.log_task_put(record)
+        task = record.to_dict()
+        self.record_history([("updated", task)])
+        self.maybe_rebalance(task)
+        return task
+
+    async def delete(self, task_id, expected_version=None):
+        await self.ensure_task_board(task_id)
+        record = self.store.get(task_id)
+        if record is None:
+            return None
+        self._check_version(record, expected_version)
+        # Remove the task and drop it from every index
+        record = self.store.remove(task_id)
+        if self.writer:
+            await self.writer.enqueue_delete(task_id)
+        self.log_task_delete(record)
+        task = record.to_dict()
+        self.record_history([("deleted", task)])
+        return task
+
+    @staticmethod
+    def _check_version(record, expected_version):
+        if expected_version is not None and record.version != expected_version:
+            raise VersionConflict(record.to_dict())
+
+    async def batch(self, operations):
+        for operation in operations:
+            if operation.op == "create":
+                await self.ensure_board(operation.userId)
+            elif operation.id is not None:
+                await self.ensure_task_board(operation.id)
+
+        # Validate everything first; nothing below awaits until the batch
+        # is in the store, so other requests can't interleave
+        error = validate_batch(operations, self.store.__contains__)
+        if error is not None:
+            raise BatchError(*error)
+
+        results = []
+        log_entries = []
+        firebase_writes = []
+        for operation in operations:
+            if operation.op == "create":
+                record = self.store.add(TaskRecord(
+                    id=self.next_id,
+                    text=operation.text,
+                    column=operation.column or "Planning",
+                    userId=operation.userId
+                ))
+                self.next_id += 1
+                firebase_writes.append(("set", record.id, record.to_dict()))
+                log_entries.append(("put", record.to_dict()))
+                results.append(("created", record.to_dict()))
+            elif operation.op == "delete":
+                record = self.store.remove(operation.id)
+                firebase_writes.append(("delete", record.id, None))
+                log_entries.append(("delete", record.to_dict()))
+                results.append(("deleted", record.to_dict()))
+            else:
+                text, column = batch_fields(operation)
+                position_before = self.store.get(operation.id).position
+                record = self.store.update(operation.id, text=text, column=column)
+                update_data = self._update_data(record, text, column, position_before)
+                if update_data:
+                    firebase_writes.append(("update", record.id, update_data))
+                log_entries.append(("put", record.to_dict()))
+                results.append(("updated", record.to_dict()))
+
+        self.log_task_batch(log_entries)
+        self.record_history(results)
+        if self.writer:
+            await self.writer.enqueue_many(firebase_writes)
+        for event_type, task in results:
+            if event_type != "deleted":
+                self.maybe_rebalance(task)
+        return results
+
+    async def changes_since(self, user_id, since):
+        await self.ensure_board(user_id)
+        delta = self.store.changes_since(user_id, since)
+        version = self.store.board_version(user_id)
+        if delta is None:
+            records = self.store.list_user(user_id)
+            return [record.to_dict() for record in records], [], version, True
+        changed, deleted = delta
+        return [record.to_dict() for record in changed], deleted, version, False
+
+    async def board_tag(self, user_id):
+        await self.ensure_board(user_id)
+        return str(self.store.board_version(user_id))
+
+    def count(self):
+        return len(self.store)
+
+    def column_counts(self):
+        return self.store.column_totals()
+
+    def stats(self):
+        return {
+            "storage": "firebase" if self.writer else "file_backup",
+            "firestore_writes": self.writer.stats() if self.writer else None,
+            "hydration": self.hydrator.stats() if self.hydrator else {"mode": self.hydration_mode},
+            "search": self.store.search_index.stats(),
+            "archive": self.archive.stats(),
+            "history": self.history.stats(),
+        }
+
+    @staticmethod
+    def _update_data(record, text, column, position_before):
+        """Fields to mirror to Firestore for an update"""
+        update_data = {}
+        if text is not None:
+            update_data['text'] = text
+        if column is not None:
+            update_data['column'] = column
+        if record.position != position_before:
+            update_data['position'] = record.position
+        if update_data:
+            update_data['version'] = record.version
+            update_data['updatedAt'] = record.updatedAt
+        return update_data
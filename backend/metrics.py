@@ -0,0 +1,248 @@
+"""
+Prometheus metrics and per-request timing for the Kanban API.
+
+A small in-process registry of counters, gauges and histograms (with
+labels) rendered in the Prometheus text format by ``GET /metrics``. Values
+that already live elsewhere (cache counters, queue depths, task counts) are
+read at scrape time through collectors instead of being mirrored on every
+write.
+
+``MetricsMiddleware`` is a plain ASGI middleware that records latency and
+status per route, tracks in-flight requests and adds a ``Server-Timing``
+header. Storage code reports into the same header through ``backend_timer``
+and ``io_timer``, which also feed the storage histograms; the per-request
+timings travel in a context variable, so work done in ``asyncio.to_thread``
+is attributed to the request that started it.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels, key, [("le", _format_value(float(bound)))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels, key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {total}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register ``collect()`` returning metrics built fresh for each scrape"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for metric in collect():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "kanban_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+HTTP_SECONDS = REGISTRY.histogram(
+    "kanban_http_request_duration_seconds", "Time until the response starts, by route", ("method", "route"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "kanban_http_requests_in_flight", "Requests (including open streams) being served")
+BACKEND_SECONDS = REGISTRY.histogram(
+    "kanban_backend_operation_seconds", "Storage backend calls made by the API", ("backend", "operation"))
+IO_SECONDS = REGISTRY.histogram(
+    "kanban_storage_io_seconds", "Low-level storage I/O (file log, Firestore)", ("target", "operation"))
+
+
+@contextmanager
+def _timed(histogram, timing, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        histogram.observe(elapsed, **labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[timing] = timings.get(timing, 0.0) + elapsed
+
+
+def backend_timer(backend, operation):
+    """Time a storage backend call (histogram + Server-Timing ``storage``)"""
+    return _timed(BACKEND_SECONDS, "storage", backend=backend, operation=operation)
+
+
+def io_timer(target, operation):
+    """Time a low-level storage operation, e.g. ``io_timer("firestore", "set")``"""
+    return _timed(IO_SECONDS, f"{target}-{operation}", target=target, operation=operation)
+
+
+def server_timing(timings, total):
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    parts.append(f"app;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """Per-route latency/status metrics and a ``Server-Timing`` header"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = {}
+        token = _request_timings.set(timings)
+        status = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed = time.perf_counter() - started
+                HTTP_SECONDS.observe(elapsed, method=scope["method"], route=route_of(scope))
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings, elapsed).encode()))
+                headers.append((b"timing-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            HTTP_REQUESTS.inc(method=scope["method"], route=route_of(scope), status=status)
+            _request_timings.reset(token)
+
+
+def route_of(scope):
+    """Route template (``/tasks/{task_id}``) so labels stay low-cardinality"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
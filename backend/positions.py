@@ -0,0 +1,233 @@
+"""
+Card order within a column using fractional indexing.
+
+Every task has a ``position``: a string key that sorts (byte-wise) into the
+card's place in its column. Moving a card only rewrites that card's key, to
+one generated between its new neighbours', so a drag-and-drop is a
+single-record write however long the column is.
+
+Keys follow the "fractional indexing" scheme: a variable-length integer
+part (its head character encodes the length, so appending at the end grows
+keys logarithmically) followed by a base-62 fraction that grows by about a
+character every six inserts at the same spot. Once a key gets longer than
+``POSITION_REBALANCE_LENGTH`` the backend rewrites the whole column with
+short, evenly spaced keys in the background.
+
+Tasks created before positions existed have none; they sort before every
+keyed card, in id order, until a backend assigns them one.
+"""
+
+import bisect
+import os
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_ZERO = DIGITS[0]
+_SMALLEST_INTEGER = "A" + _ZERO * 26
+FIRST_KEY = "a" + _ZERO
+
+REBALANCE_LENGTH = int(os.getenv("POSITION_REBALANCE_LENGTH", "24"))
+
+
+def _midpoint(a, b):
+    """Fraction strictly between ``a`` and ``b`` (``b`` None means the end)"""
+    if b is not None:
+        # Skip the common prefix ("" counts as zeros)
+        n = 0
+        while (a[n] if n < len(a) else _ZERO) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[round((digit_a + digit_b) / 2)]
+    if b is not None and len(b) > 1:
+        return b[:1]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _integer_length(head):
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"invalid position head: {head!r}")
+
+
+def _split(key):
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"invalid position: {key!r}")
+    return key[:length], key[length:]
+
+
+def _increment(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) + 1
+        if value < len(DIGITS):
+            digits[i] = DIGITS[value]
+            return head + "".join(digits)
+        digits[i] = _ZERO
+    if head == "Z":
+        return "a" + _ZERO
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(_ZERO)
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement(integer):
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        value = DIGITS.index(digits[i]) - 1
+        if value >= 0:
+            digits[i] = DIGITS[value]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def validate_key(key):
+    """Raise ValueError unless ``key`` is a well-formed position"""
+    if not key or key == _SMALLEST_INTEGER:
+        raise ValueError(f"invalid position: {key!r}")
+    _, fraction = _split(key)
+    if fraction.endswith(_ZERO) or any(char not in DIGITS for char in key[1:]):
+        raise ValueError(f"invalid position: {key!r}")
+
+
+def key_between(a, b):
+    """Position strictly between ``a`` and ``b``; None means the start / end"""
+    if a is not None and b is not None and a >= b:
+        raise ValueError(f"positions out of order: {a!r} >= {b!r}")
+    if a is None:
+        if b is None:
+            return FIRST_KEY
+        integer, fraction = _split(b)
+        if integer == _SMALLEST_INTEGER:
+            return integer + _midpoint("", fraction)
+        if integer < b:
+            return integer
+        return _decrement(integer)
+    integer, fraction = _split(a)
+    if b is None:
+        following = _increment(integer)
+        return following if following is not None else integer + _midpoint(fraction, None)
+    integer_b, fraction_b = _split(b)
+    if integer == integer_b:
+        return integer + _midpoint(fraction, fraction_b)
+    following = _increment(integer)
+    if following is not None and following < b:
+        return following
+    return integer + _midpoint(fraction, None)
+
+
+def spaced_keys(count):
+    """``count`` short increasing keys for a rebalanced column"""
+    key = None
+    for _ in range(count):
+        key = key_between(key, None)
+        yield key
+
+
+def place(order, position_of, after=None, before=None, moving=None):
+    """Position for a card going between the cards ``after`` and ``before``
+
+    ``order`` is the target column's ``ColumnOrder`` and ``position_of(id)``
+    returns a neighbour's position (raising ValueError if it is not a card
+    of that column). Either neighbour may be omitted: the other side is then
+    that neighbour's current neighbour, skipping the card being ``moving``.
+    With neither, the card goes to the end of the column.
+    """
+    low = high = None
+    if after is not None:
+        low = position_of(after)
+        if before is None:
+            high = order.neighbour(low, after, skip=moving)
+    if before is not None:
+        high = position_of(before)
+        if after is None:
+            low = order.neighbour(high, before, skip=moving, before=True)
+    if after is None and before is None:
+        low = order.last_position()
+    return key_between(low, high)
+
+
+def needs_rebalance(position):
+    return position is not None and len(position) > REBALANCE_LENGTH
+
+
+def order_key(task):
+    """Sort key of a task dict within its column"""
+    return task.get("position") or "", task["id"]
+
+
+def format_cursor(position, task_id):
+    """Cursor for the next page of a position-ordered column listing"""
+    return f"{position or ''}:{task_id}"
+
+
+def parse_cursor(cursor):
+    """``(position, id)`` from ``format_cursor`` output; ValueError if malformed"""
+    position, _, task_id = cursor.rpartition(":")
+    return position, int(task_id)
+
+
+class ColumnOrder:
+    """Tasks of one column sorted by ``(position, id)``
+
+    Legacy tasks without a position sort first (as ``""``).
+    """
+
+    __slots__ = ("keys",)
+
+    def __init__(self):
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, position, task_id):
+        bisect.insort(self.keys, (position or "", task_id))
+
+    def remove(self, position, task_id):
+        key = (position or "", task_id)
+        index = bisect.bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def last_position(self):
+        return self.keys[-1][0] or None if self.keys else None
+
+    def ids(self, after=None, limit=None):
+        """Task ids in order, starting after the ``(position, id)`` key ``after``"""
+        start = bisect.bisect_right(self.keys, after) if after is not None else 0
+        end = len(self.keys) if limit is None else start + limit
+        return [task_id for _, task_id in self.keys[start:end]]
+
+    def neighbour(self, position, task_id, skip=None, before=False):
+        """Position of the card right after (or before) the given one, or None"""
+        key = (position or "", task_id)
+        if before:
+            index = bisect.bisect_left(self.keys, key) - 1
+            while index >= 0 and self.keys[index][1] == skip:
+                index -= 1
+            return self.keys[index][0] or None if index >= 0 else None
+        index = bisect.bisect_right(self.keys, key)
+        while index < len(self.keys) and self.keys[index][1] == skip:
+            index += 1
+        return self.keys[index][0] or None if index < len(self.keys) else None
@@ -0,0 +1,144 @@
+"""
+Per-client rate limiting for the ``/tasks`` endpoints.
+
+Each client gets a token bucket for reads (GET) and one for writes (every
+other method): a request takes one token, tokens refill at ``rate`` per
+second up to ``burst``, and a request finding the bucket empty is answered
+``429 Too Many Requests`` with a ``Retry-After`` header. A client is its
+address: the peer IP, or behind ``RATE_LIMIT_TRUST_PROXY=<n>`` proxies the
+address the outermost of them saw (the ``n``-th ``X-Forwarded-For`` entry
+from the right; entries further left are client-supplied and can be
+forged). A request naming a board (``userId``) also draws from the bucket
+of that address and board. ``userId`` is not authenticated, so a board never
+has a bucket shared between addresses: otherwise any client could exhaust
+someone else's board by naming it. Switching boards does not reset a
+client's address bucket.
+
+Limits come from ``RATE_LIMIT_READ_RATE`` / ``RATE_LIMIT_READ_BURST``
+(default 20/s, burst 60) and ``RATE_LIMIT_WRITE_RATE`` /
+``RATE_LIMIT_WRITE_BURST`` (default 10/s, burst 30); a rate of 0 turns that
+limit off. Buckets live in this process only, so with several workers each
+enforces its own share.
+"""
+
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from metrics import REGISTRY
+
+RATE_LIMITED = REGISTRY.counter(
+    "kanban_rate_limited_total", "Requests rejected with 429, by kind", ("kind",))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+class RateLimiter:
+    """Token buckets per client key, the least recently seen dropped beyond ``max_clients``"""
+
+    def __init__(self, rate, burst, max_clients=10000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    def acquire(self, key, now=None):
+        """Take a token; returns 0 if allowed, else seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.burst, now)
+            while len(self._buckets) > self.max_clients:
+                # A dropped client just starts again with a full bucket
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return 0
+        return (1 - bucket.tokens) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def limiter_from_env(kind, rate, burst):
+    rate = float(os.getenv(f"RATE_LIMIT_{kind}_RATE", rate))
+    if rate <= 0:
+        return None
+    return RateLimiter(rate, float(os.getenv(f"RATE_LIMIT_{kind}_BURST", burst)))
+
+
+class RateLimitMiddleware:
+    """Plain ASGI middleware applying the read/write limiters to ``/tasks`` requests"""
+
+    def __init__(self, app, read=None, write=None, trust_proxy=None):
+        self.app = app
+        self.limiters = {
+            "read": read if read is not None else limiter_from_env("READ", 20, 60),
+            "write": write if write is not None else limiter_from_env("WRITE", 10, 30),
+        }
+        if trust_proxy is None:
+            trust_proxy = int(os.getenv("RATE_LIMIT_TRUST_PROXY", "0") or "0")
+        # Number of proxies in front of the app that append to X-Forwarded-For
+        self.trust_proxy = int(trust_proxy)
+
+    def client_address(self, scope):
+        if self.trust_proxy:
+            hops = []
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+            hops = [hop for hop in hops if hop]
+            if hops:
+                return hops[-min(self.trust_proxy, len(hops))]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def client_keys(self, scope):
+        """Buckets a request draws from: its address, and its board from that
+        address if it names one"""
+        address = self.client_address(scope)
+        keys = ["ip:" + address]
+        user_id = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("userId")
+        if user_id:
+            keys.append(f"user:{address}:{user_id[0]}")
+        return keys
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/tasks"):
+            await self.app(scope, receive, send)
+            return
+
+        kind = "read" if scope["method"] in ("GET", "HEAD") else "write"
+        limiter = self.limiters[kind]
+        retry_after = 0
+        if limiter is not None:
+            retry_after = max(limiter.acquire(key) for key in self.client_keys(scope))
+        if not retry_after:
+            await self.app(scope, receive, send)
+            return
+
+        RATE_LIMITED.inc(kind=kind)
+        body = json.dumps({"detail": "Too many requests"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,72 @@
+"""
+Hold storage requests until the backend is ready.
+
+The app binds its port before Firebase is connected (see
+firebase_client.py), so the first requests of a cold start can arrive
+while the backend is still attaching. ``ReadinessMiddleware`` makes
+``/tasks`` requests wait for it, up to ``STARTUP_WAIT_SECONDS`` (default 30);
+after that they get ``503`` with ``Retry-After`` (WebSockets are closed with
+1013, "try again later"). Other routes such as ``/health`` answer at once.
+"""
+
+import asyncio
+import json
+import os
+
+STARTUP_WAIT_SECONDS = float(os.getenv("STARTUP_WAIT_SECONDS", "30"))
+
+
+class Readiness:
+    """Flag requests can wait on; ``reset`` at each startup (asyncio events
+    belong to one event loop)"""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def reset(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def is_set(self):
+        return self._event.is_set()
+
+    async def wait(self):
+        await self._event.wait()
+
+
+class ReadinessMiddleware:
+    """Plain ASGI middleware delaying ``prefix`` requests until ``ready`` is set"""
+
+    def __init__(self, app, ready, prefix="/tasks", timeout=STARTUP_WAIT_SECONDS):
+        self.app = app
+        self.ready = ready
+        self.prefix = prefix
+        self.timeout = timeout
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] not in ("http", "websocket") or self.ready.is_set()
+                or not scope["path"].startswith(self.prefix)):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await asyncio.wait_for(self.ready.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 1013})
+                return
+            body = json.dumps({"detail": "Storage is starting"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", b"1"),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        await self.app(scope, receive, send)
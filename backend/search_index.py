@@ -0,0 +1,180 @@
+"""
+Full-text search over task text (``GET /tasks/search``).
+
+Text is split into words, case-folded and stripped of accents, so
+``"Café Report"`` is found by ``cafe`` or ``REP``. Every query word matches
+the words that start with it, and a task must match all query words.
+Ranking gives each query word the inverse document frequency (within the
+board) of the best word it matched, halved for prefix-only matches; ties go
+to the newest task.
+
+``SearchIndex`` is the in-memory inverted index used by the memory backend.
+A board's postings (word -> task ids, plus a sorted vocabulary for prefix
+lookups) are built the first time the board is searched and then kept up to
+date by the task store on every write; the least recently searched boards
+are dropped beyond ``max_boards``. The SQLite backend keeps the same
+postings in a table and ranks with ``rank`` as well; backends without an
+index rank a freshly loaded board with ``search_tasks``.
+"""
+
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import OrderedDict
+
+_WORD = re.compile(r"\w+")
+# Longer words are truncated (and queries likewise) to bound index size
+MAX_TOKEN_LENGTH = 32
+# Most vocabulary words one prefix may expand to
+MAX_PREFIX_EXPANSIONS = 64
+PREFIX_WEIGHT = 0.5
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text):
+    """Distinct index words of ``text``"""
+    return {word[:MAX_TOKEN_LENGTH] for word in _WORD.findall(normalize(text or ""))}
+
+
+def query_terms(query):
+    """Query words in order, duplicates removed"""
+    return list(dict.fromkeys(word[:MAX_TOKEN_LENGTH] for word in _WORD.findall(normalize(query))))
+
+
+def prefix_range(term):
+    """Half-open ``[low, high)`` string range of the words starting with ``term``"""
+    return term, term + "\U0010ffff"
+
+
+def rank(terms, matches, board_size, limit):
+    """Rank tasks matching every term
+
+    ``matches`` maps each term to ``{word: task_ids}`` for the vocabulary
+    words it matched. Returns up to ``limit`` ``(task_id, score)`` pairs,
+    best first.
+    """
+    scores = None
+    for term in terms:
+        term_scores = {}
+        for word, task_ids in matches.get(term, {}).items():
+            weight = math.log(1 + board_size / len(task_ids))
+            if word != term:
+                weight *= PREFIX_WEIGHT
+            for task_id in task_ids:
+                if weight > term_scores.get(task_id, 0.0):
+                    term_scores[task_id] = weight
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {task_id: score + term_scores[task_id]
+                      for task_id, score in scores.items() if task_id in term_scores}
+        if not scores:
+            return []
+    ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], -item[0]))
+    return [(task_id, round(score, 4)) for task_id, score in ranked]
+
+
+class _BoardIndex:
+    __slots__ = ("postings", "vocabulary", "words")
+
+    def __init__(self):
+        self.postings = {}
+        # Sorted distinct words, for prefix lookups
+        self.vocabulary = []
+        # task id -> words it is indexed under
+        self.words = {}
+
+    def add(self, task_id, text):
+        self.remove(task_id)
+        words = tokenize(text)
+        self.words[task_id] = words
+        for word in words:
+            task_ids = self.postings.get(word)
+            if task_ids is None:
+                task_ids = self.postings[word] = set()
+                bisect.insort(self.vocabulary, word)
+            task_ids.add(task_id)
+
+    def remove(self, task_id):
+        for word in self.words.pop(task_id, ()):
+            task_ids = self.postings[word]
+            task_ids.discard(task_id)
+            if not task_ids:
+                del self.postings[word]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+
+    def matches(self, term):
+        low, high = prefix_range(term)
+        start = bisect.bisect_left(self.vocabulary, low)
+        end = min(bisect.bisect_left(self.vocabulary, high), start + MAX_PREFIX_EXPANSIONS)
+        return {word: self.postings[word] for word in self.vocabulary[start:end]}
+
+
+def search_tasks(tasks, query, limit):
+    """Rank a list of task dicts without a persistent index"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    board = _BoardIndex()
+    by_id = {}
+    for task in tasks:
+        board.add(task["id"], task["text"])
+        by_id[task["id"]] = task
+    results = rank(terms, {term: board.matches(term) for term in terms}, len(tasks), limit)
+    return [(by_id[task_id], score) for task_id, score in results]
+
+
+class SearchIndex:
+    """Per-board inverted indexes, built on first search"""
+
+    def __init__(self, max_boards=1000):
+        self.max_boards = max_boards
+        self._boards = OrderedDict()
+        self.builds = 0
+
+    def __contains__(self, user_id):
+        return user_id in self._boards
+
+    def add(self, user_id, task_id, text):
+        board = self._boards.get(user_id)
+        if board is not None:
+            board.add(task_id, text)
+
+    def remove(self, user_id, task_id):
+        board = self._boards.get(user_id)
+        if board is not None:
+            board.remove(task_id)
+
+    def drop(self, user_id):
+        self._boards.pop(user_id, None)
+
+    def clear(self):
+        self._boards.clear()
+
+    def build(self, user_id, tasks):
+        """Index a board from ``(task_id, text)`` pairs"""
+        board = _BoardIndex()
+        for task_id, text in tasks:
+            board.add(task_id, text)
+        self._boards[user_id] = board
+        self.builds += 1
+        while len(self._boards) > self.max_boards:
+            self._boards.popitem(last=False)
+
+    def search(self, user_id, query, limit, board_size):
+        """``(task_id, score)`` pairs for an indexed board, best first"""
+        board = self._boards[user_id]
+        self._boards.move_to_end(user_id)
+        terms = query_terms(query)
+        if not terms:
+            return []
+        return rank(terms, {term: board.matches(term) for term in terms}, board_size, limit)
+
+    def stats(self):
+        return {"indexed_boards": len(self._boards), "builds": self.builds}
@@ -0,0 +1,37 @@
+"""
+Coalescing of concurrent identical reads.
+
+When many requests ask for the same board at once (a tab stuck in a retry
+loop, a burst of clients reconnecting after a deploy) only the first one
+runs the read; the rest wait for and share its result. Calls are only
+shared while in flight, nothing is cached afterwards. A caller that goes
+away does not cancel the call for the others.
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self.shared = 0
+
+    async def do(self, key, fn):
+        """Result of ``await fn()``, shared with concurrent callers using the same ``key``"""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(fn())
+            call.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.shared += 1
+        return await asyncio.shield(call)
+
+    def _finish(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.cancelled():
+            # Mark the exception retrieved even if every caller went away
+            call.exception()
+
+    def __len__(self):
+        return len(self._calls)
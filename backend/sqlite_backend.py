@@ -0,0 +1,901 @@
+"""
+Embedded SQLite storage backend (``STORAGE_BACKEND=sqlite``).
+
+A single database file (``SQLITE_PATH``, default ``tasks.db``) in WAL mode,
+so readers never block the writer and a single node can hold well over 100k
+tasks with no external service. Boards are served from the
+``(userId, column, id)`` index, ids come from ``AUTOINCREMENT`` (never
+reused) and every write bumps a global version counter, mirrored per board
+in ``boards`` for ETags and delta sync. Deleted tasks leave a row in
+``tombstones`` until they are older than ``TOMBSTONE_TTL_SECONDS``.
+``search_terms`` is the full-text index (see search_index.py), one row per
+(board, word, task), updated in the same transaction as the task. Columns
+are listed from the ``(userId, column, position, id)`` index (see
+positions.py). Archived tasks move to ``archive`` as compressed JSON (see
+task_archive.py) in the same transaction that deletes them from ``tasks``.
+Every change is also appended to ``history``, with periodic board
+checkpoints in ``history_checkpoints`` (see task_history.py).
+
+Connections come from a small pool and all SQL is kept in module constants,
+so each connection's statement cache reuses the prepared statements.
+sqlite3 calls block, so they run in worker threads; writes are serialised
+with ``BEGIN IMMEDIATE``.
+
+Several server processes (``uvicorn --workers N``) can share one database:
+ids and versions are allocated inside the write transaction, so they stay
+unique across processes. Every write also appends to the ``changes`` feed in
+the same transaction; ``watch_changes`` polls it (``PRAGMA data_version``
+makes an idle poll a single pragma) and hands each committed change, from
+any process, to the listeners in commit order.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import io_timer
+from positions import key_between, spaced_keys
+from search_index import MAX_PREFIX_EXPANSIONS, prefix_range, query_terms, rank, tokenize
+from storage import (BatchError, HistoryUnavailable, InvalidMove, TaskBackend, batch_fields, check_version,
+                     validate_batch)
+from task_archive import ARCHIVE_BATCH, pack, unpack
+from task_history import HISTORY_CHECKPOINT_EVERY, history_cutoff, history_event, page_events, replay
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_TTL_SECONDS = int(os.getenv("TOMBSTONE_TTL_SECONDS", str(7 * 24 * 3600)))
+TOMBSTONE_PURGE_INTERVAL = int(os.getenv("TOMBSTONE_PURGE_INTERVAL", "3600"))
+# How often other processes' writes are picked up, and how long the feed keeps them
+CHANGE_POLL_INTERVAL = float(os.getenv("SQLITE_CHANGE_POLL_INTERVAL", "0.05"))
+CHANGE_RETENTION_SECONDS = int(os.getenv("SQLITE_CHANGE_RETENTION", "3600"))
+# count() / column_counts() are served from a snapshot refreshed this often
+COUNTS_REFRESH_INTERVAL = float(os.getenv("SQLITE_COUNTS_INTERVAL", "5"))
+# Most feed rows read per poll
+CHANGE_BATCH = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    "column" TEXT NOT NULL,
+    userId TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updatedAt INTEGER NOT NULL,
+    position TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_user_column ON tasks (userId, "column", id);
+CREATE INDEX IF NOT EXISTS tasks_user_version ON tasks (userId, version);
+CREATE TABLE IF NOT EXISTS tombstones (
+    id INTEGER PRIMARY KEY,
+    userId TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    deletedAt INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tombstones_user_version ON tombstones (userId, version);
+CREATE INDEX IF NOT EXISTS tombstones_deleted_at ON tombstones (deletedAt);
+CREATE TABLE IF NOT EXISTS boards (
+    userId TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    task TEXT NOT NULL,
+    createdAt INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS changes_created_at ON changes (createdAt);
+CREATE TABLE IF NOT EXISTS search_terms (
+    userId TEXT NOT NULL,
+    token TEXT NOT NULL,
+    taskId INTEGER NOT NULL,
+    PRIMARY KEY (userId, token, taskId)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS archive (
+    id INTEGER PRIMARY KEY,
+    userId TEXT NOT NULL,
+    archivedAt INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS archive_user_archived_at ON archive (userId, archivedAt, id);
+CREATE INDEX IF NOT EXISTS tasks_column_updated_at ON tasks ("column", updatedAt);
+CREATE TABLE IF NOT EXISTS history (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    taskId INTEGER NOT NULL,
+    userId TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    at INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_task_version ON history (taskId, version);
+CREATE INDEX IF NOT EXISTS history_user_seq ON history (userId, seq);
+CREATE TABLE IF NOT EXISTS history_checkpoints (
+    userId TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    at INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (userId, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS history_checkpoints_user_at ON history_checkpoints (userId, at);
+CREATE TABLE IF NOT EXISTS history_boards (
+    userId TEXT PRIMARY KEY,
+    pending INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO meta (key, value) VALUES
+    ('version', 0), ('horizon', 0), ('search_indexed', 0), ('history_start', 0), ('history_horizon', 0);
+"""
+
+# Run after SCHEMA; databases created before positions existed get the column first
+POSITION_INDEX = 'CREATE INDEX IF NOT EXISTS tasks_user_column_position ON tasks (userId, "column", position, id)'
+ADD_POSITION = 'ALTER TABLE tasks ADD COLUMN position TEXT'
+
+TASK_COLUMNS = 'id, text, "column", userId, version, updatedAt, position'
+SELECT_TASK = f'SELECT {TASK_COLUMNS} FROM tasks WHERE id = ?'
+SELECT_BOARD = f'SELECT {TASK_COLUMNS} FROM tasks WHERE userId = ? AND id > ? ORDER BY id LIMIT ?'
+SELECT_COLUMN = (
+    f'SELECT {TASK_COLUMNS} FROM tasks WHERE userId = ? AND "column" = ? AND (position, id) > (?, ?) '
+    'ORDER BY position, id LIMIT ?'
+)
+LAST_POSITION = 'SELECT MAX(position) FROM tasks WHERE userId = ? AND "column" = ?'
+NEXT_POSITION = (
+    'SELECT position FROM tasks WHERE userId = ? AND "column" = ? AND (position, id) > (?, ?) AND id != ? '
+    'ORDER BY position, id LIMIT 1'
+)
+PREVIOUS_POSITION = (
+    'SELECT position FROM tasks WHERE userId = ? AND "column" = ? AND (position, id) < (?, ?) AND id != ? '
+    'ORDER BY position DESC, id DESC LIMIT 1'
+)
+SELECT_COLUMN_IDS = 'SELECT id FROM tasks WHERE userId = ? AND "column" = ? ORDER BY position, id'
+SELECT_UNPOSITIONED = 'SELECT id, userId, "column" FROM tasks WHERE position IS NULL ORDER BY userId, "column", id'
+SET_POSITION = 'UPDATE tasks SET position = ? WHERE id = ?'
+REBALANCE_POSITION = 'UPDATE tasks SET position = ?, version = ?, updatedAt = ? WHERE id = ?'
+
+SELECT_CHANGED = f'SELECT {TASK_COLUMNS} FROM tasks WHERE userId = ? AND version > ? ORDER BY version'
+SELECT_DELETED = 'SELECT id FROM tombstones WHERE userId = ? AND version > ? ORDER BY version'
+SELECT_BOARD_VERSION = 'SELECT version FROM boards WHERE userId = ?'
+SELECT_META = 'SELECT value FROM meta WHERE key = ?'
+COUNT_TASKS = 'SELECT COUNT(*) FROM tasks'
+COUNT_COLUMNS = 'SELECT "column", COUNT(*) FROM tasks GROUP BY "column"'
+BUMP_VERSION = "UPDATE meta SET value = value + 1 WHERE key = 'version'"
+SET_BOARD_VERSION = (
+    'INSERT INTO boards (userId, version) VALUES (?, ?) '
+    'ON CONFLICT (userId) DO UPDATE SET version = excluded.version'
+)
+INSERT_TASK = 'INSERT INTO tasks (text, "column", userId, version, updatedAt, position) VALUES (?, ?, ?, ?, ?, ?)'
+UPDATE_TASK = (
+    'UPDATE tasks SET text = COALESCE(?, text), "column" = COALESCE(?, "column"), '
+    'position = COALESCE(?, position), version = ?, updatedAt = ? WHERE id = ?'
+)
+DELETE_TASK = 'DELETE FROM tasks WHERE id = ?'
+INSERT_TOMBSTONE = 'INSERT OR REPLACE INTO tombstones (id, userId, version, deletedAt) VALUES (?, ?, ?, ?)'
+MAX_PURGED_VERSION = 'SELECT MAX(version) FROM tombstones WHERE deletedAt < ?'
+PURGE_TOMBSTONES = 'DELETE FROM tombstones WHERE deletedAt < ?'
+RAISE_HORIZON = "UPDATE meta SET value = MAX(value, ?) WHERE key = 'horizon'"
+INSERT_CHANGE = 'INSERT INTO changes (type, task, createdAt) VALUES (?, ?, ?)'
+SELECT_CHANGES = 'SELECT seq, type, task FROM changes WHERE seq > ? ORDER BY seq LIMIT ?'
+MAX_CHANGE_SEQ = 'SELECT COALESCE(MAX(seq), 0) FROM changes'
+PURGE_CHANGES = 'DELETE FROM changes WHERE createdAt < ?'
+INSERT_TERM = 'INSERT OR IGNORE INTO search_terms (userId, token, taskId) VALUES (?, ?, ?)'
+DELETE_TERM = 'DELETE FROM search_terms WHERE userId = ? AND token = ? AND taskId = ?'
+SELECT_TERMS = 'SELECT token, taskId FROM search_terms WHERE userId = ? AND token >= ? AND token < ?'
+COUNT_BOARD = 'SELECT COUNT(*) FROM tasks WHERE userId = ?'
+SELECT_ALL_TEXT = 'SELECT id, userId, text FROM tasks'
+MARK_SEARCH_INDEXED = "UPDATE meta SET value = 1 WHERE key = 'search_indexed'"
+SELECT_STALE = f'SELECT {TASK_COLUMNS} FROM tasks WHERE "column" = ? AND updatedAt < ? LIMIT ?'
+INSERT_ARCHIVE = 'INSERT OR REPLACE INTO archive (id, userId, archivedAt, data) VALUES (?, ?, ?, ?)'
+SELECT_ARCHIVE = (
+    'SELECT archivedAt, data FROM archive WHERE userId = ? AND (archivedAt, id) < (?, ?) '
+    'ORDER BY archivedAt DESC, id DESC LIMIT ?'
+)
+SELECT_ARCHIVED = 'SELECT data FROM archive WHERE id = ?'
+DELETE_ARCHIVED = 'DELETE FROM archive WHERE id = ?'
+DELETE_TOMBSTONE = 'DELETE FROM tombstones WHERE id = ?'
+INSERT_TASK_WITH_ID = (
+    'INSERT INTO tasks (id, text, "column", userId, version, updatedAt, position) VALUES (?, ?, ?, ?, ?, ?, ?)'
+)
+# Larger than any (archivedAt, id) cursor
+ARCHIVE_START = (2 ** 62, 2 ** 62)
+INSERT_HISTORY = 'INSERT INTO history (taskId, userId, version, at, type, data) VALUES (?, ?, ?, ?, ?, ?)'
+BUMP_HISTORY_PENDING = (
+    'INSERT INTO history_boards (userId, pending) VALUES (?, 1) '
+    'ON CONFLICT (userId) DO UPDATE SET pending = pending + 1'
+)
+SELECT_HISTORY_PENDING = 'SELECT pending FROM history_boards WHERE userId = ?'
+SET_HISTORY_PENDING = 'UPDATE history_boards SET pending = ? WHERE userId = ?'
+INSERT_CHECKPOINT = 'INSERT OR REPLACE INTO history_checkpoints (userId, seq, at, data) VALUES (?, ?, ?, ?)'
+SELECT_CHECKPOINT = (
+    'SELECT seq, data FROM history_checkpoints WHERE userId = ? AND at <= ? ORDER BY at DESC, seq DESC LIMIT 1'
+)
+SELECT_BOARD_HISTORY = 'SELECT type, at, data FROM history WHERE userId = ? AND seq > ? AND at <= ? ORDER BY seq'
+SELECT_TASK_HISTORY = (
+    'SELECT type, at, data FROM history WHERE taskId = ? AND version > ? ORDER BY version LIMIT ?'
+)
+SELECT_ALL_TASKS = f'SELECT {TASK_COLUMNS} FROM tasks ORDER BY userId, id'
+SET_META = 'UPDATE meta SET value = ? WHERE key = ?'
+PURGE_HISTORY = (
+    'DELETE FROM history WHERE at < ? AND seq <= (SELECT MAX(c.seq) FROM history_checkpoints c '
+    'WHERE c.userId = history.userId AND c.at < ?)'
+)
+PURGE_CHECKPOINTS = (
+    'DELETE FROM history_checkpoints WHERE at < ? AND seq < (SELECT MAX(c.seq) FROM history_checkpoints c '
+    'WHERE c.userId = history_checkpoints.userId AND c.at < ?)'
+)
+RAISE_HISTORY_HORIZON = "UPDATE meta SET value = MAX(value, ?) WHERE key = 'history_horizon'"
+
+
+def row_to_task(row):
+    return {
+        "id": row[0],
+        "text": row[1],
+        "column": row[2],
+        "userId": row[3],
+        "version": row[4],
+        "updatedAt": row[5],
+        "position": row[6],
+    }
+
+
+class ConnectionPool:
+    """Fixed set of sqlite3 connections shared by worker threads"""
+
+    def __init__(self, path, size=4, synchronous="NORMAL"):
+        self.path = path
+        self.size = size
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(self._connect(synchronous))
+
+    def _connect(self, synchronous):
+        # Autocommit mode: transactions are opened explicitly
+        conn = sqlite3.connect(
+            self.path,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+        conn.execute("PRAGMA busy_timeout=5000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+class SQLiteBackend(TaskBackend):
+    name = "sqlite"
+
+    def __init__(self, path="tasks.db", pool_size=4):
+        self.path = path
+        self.pool_size = pool_size
+        self.pool = None
+        # One writer at a time inside this process; SQLite serialises
+        # writers across processes with its own lock
+        self._write_lock = threading.Lock()
+        self._purge_task = None
+        # Change feed: listeners, read position and the poller's own connection
+        self._listeners = []
+        self._feed_seq = 0
+        self._feed_conn = None
+        self._feed_version = None
+        self._feed_wakeup = None
+        self._poll_task = None
+        # (live tasks, tasks per column) as of the last refresh
+        self._counts = None
+        self._counts_task = None
+
+    async def start(self):
+        self.pool = ConnectionPool(
+            self.path,
+            size=self.pool_size,
+            synchronous=os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        )
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+            if "position" not in columns:
+                conn.execute(ADD_POSITION)
+            conn.execute(POSITION_INDEX)
+        await asyncio.to_thread(self.assign_positions)
+        await asyncio.to_thread(self.build_search_index)
+        await asyncio.to_thread(self.start_history)
+        self._counts = await asyncio.to_thread(self.read_counts)
+        logger.info("SQLite storage at %s (%d tasks)", self.path, self._counts[0])
+        self._purge_task = asyncio.create_task(self.purge_tombstones_periodically())
+        self._counts_task = asyncio.create_task(self.refresh_counts_periodically())
+
+    async def stop(self):
+        if self._purge_task:
+            self._purge_task.cancel()
+        if self._counts_task:
+            self._counts_task.cancel()
+            self._counts_task = None
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._feed_conn:
+            self._feed_conn.close()
+            self._feed_conn = None
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+
+    @contextmanager
+    def _write(self):
+        """Connection inside a write transaction, rolled back on error"""
+        with self._write_lock, self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            with io_timer("sqlite", "commit"):
+                conn.execute("COMMIT")
+
+    @staticmethod
+    def _next_version(conn, user_id):
+        """Bump the global version and record it as the board's latest change"""
+        conn.execute(BUMP_VERSION)
+        version = conn.execute(SELECT_META, ("version",)).fetchone()[0]
+        conn.execute(SET_BOARD_VERSION, (user_id, version))
+        return version
+
+    @staticmethod
+    def _index_text(conn, task_id, user_id, old_text, new_text):
+        """Move a task's search terms from ``old_text`` to ``new_text``"""
+        old = tokenize(old_text) if old_text is not None else set()
+        new = tokenize(new_text) if new_text is not None else set()
+        conn.executemany(DELETE_TERM, [(user_id, token, task_id) for token in old - new])
+        conn.executemany(INSERT_TERM, [(user_id, token, task_id) for token in new - old])
+
+    def assign_positions(self):
+        """Append tasks stored before positions existed to their columns (blocking)"""
+        with self._write() as conn:
+            rows = conn.execute(SELECT_UNPOSITIONED).fetchall()
+            last = {}
+            for task_id, user_id, column in rows:
+                key = (user_id, column)
+                if key not in last:
+                    last[key] = conn.execute(LAST_POSITION, key).fetchone()[0]
+                last[key] = key_between(last[key], None)
+                conn.execute(SET_POSITION, (last[key], task_id))
+        if rows:
+            logger.info("Assigned positions to %d tasks", len(rows))
+
+    def build_search_index(self):
+        """Index every task once for databases created before search existed (blocking)"""
+        with self._write() as conn:
+            if conn.execute(SELECT_META, ("search_indexed",)).fetchone()[0]:
+                return
+            rows = conn.execute(SELECT_ALL_TEXT).fetchall()
+            conn.executemany(INSERT_TERM, (
+                (user_id, token, task_id) for task_id, user_id, text in rows for token in tokenize(text)
+            ))
+            conn.execute(MARK_SEARCH_INDEXED)
+        if rows:
+            logger.info("Built the search index for %d tasks", len(rows))
+
+    @classmethod
+    def _record_change(cls, conn, event_type, task):
+        """Append a change to the cross-process feed and the task history
+        (same transaction as the write)"""
+        conn.execute(INSERT_CHANGE, (event_type, json.dumps(task), task["updatedAt"]))
+        if event_type != "reset":
+            cls._record_history(conn, event_type, task)
+
+    @staticmethod
+    def _record_history(conn, event_type, task):
+        """Append a history event, and checkpoint the board once enough
+        changes piled up since the last checkpoint (see task_history.py)"""
+        user_id = task["userId"]
+        cursor = conn.execute(INSERT_HISTORY, (
+            task["id"], user_id, task["version"], task["updatedAt"], event_type, pack(task),
+        ))
+        conn.execute(BUMP_HISTORY_PENDING, (user_id,))
+        if conn.execute(SELECT_HISTORY_PENDING, (user_id,)).fetchone()[0] >= HISTORY_CHECKPOINT_EVERY:
+            board = [row_to_task(row) for row in conn.execute(SELECT_BOARD, (user_id, -1, -1))]
+            conn.execute(INSERT_CHECKPOINT, (user_id, cursor.lastrowid, task["updatedAt"], pack(board)))
+            # A board larger than the interval waits for as many changes as it has cards
+            conn.execute(SET_HISTORY_PENDING, (min(0, HISTORY_CHECKPOINT_EVERY - len(board)), user_id))
+
+    def start_history(self):
+        """Checkpoint every board once, when history is first enabled (blocking)"""
+        with self._write() as conn:
+            if conn.execute(SELECT_META, ("history_start",)).fetchone()[0]:
+                return
+            now = int(time.time() * 1000)
+            boards = {}
+            for row in conn.execute(SELECT_ALL_TASKS):
+                boards.setdefault(row[3], []).append(row_to_task(row))
+            conn.executemany(INSERT_CHECKPOINT, [
+                (user_id, 0, now, pack(tasks)) for user_id, tasks in boards.items()
+            ])
+            conn.execute(SET_META, (now, "history_start"))
+
+    # Blocking helpers (run in a thread)
+
+    def _create(self, conn, text, column, user_id):
+        version = self._next_version(conn, user_id)
+        updated_at = int(time.time() * 1000)
+        position = key_between(conn.execute(LAST_POSITION, (user_id, column)).fetchone()[0], None)
+        cursor = conn.execute(INSERT_TASK, (text, column, user_id, version, updated_at, position))
+        task = {
+            "id": cursor.lastrowid,
+            "text": text,
+            "column": column,
+            "userId": user_id,
+            "version": version,
+            "updatedAt": updated_at,
+            "position": position,
+        }
+        self._index_text(conn, task["id"], user_id, None, text)
+        self._record_change(conn, "created", task)
+        return task
+
+    def _place(self, conn, task, column, after, before):
+        """Position between the cards ``after`` and ``before`` of ``column``"""
+        user_id = task["userId"]
+
+        def neighbour(task_id):
+            row = conn.execute(SELECT_TASK, (task_id,)).fetchone()
+            if row is None or row[3] != user_id or row[2] != column or task_id == task["id"]:
+                raise InvalidMove(f"task {task_id} is not a card in column {column!r}")
+            return row[6]
+
+        low = high = None
+        if after is not None:
+            low = neighbour(after)
+            if before is None:
+                row = conn.execute(NEXT_POSITION, (user_id, column, low, after, task["id"])).fetchone()
+                high = row[0] if row else None
+        if before is not None:
+            high = neighbour(before)
+            if after is None:
+                row = conn.execute(PREVIOUS_POSITION, (user_id, column, high, before, task["id"])).fetchone()
+                low = row[0] if row else None
+        if after is None and before is None:
+            low = conn.execute(LAST_POSITION, (user_id, column)).fetchone()[0]
+        try:
+            return key_between(low, high)
+        except ValueError as e:
+            raise InvalidMove(str(e))
+
+    def _update(self, conn, task_id, text, column, after=None, before=None, expected_version=None):
+        row = conn.execute(SELECT_TASK, (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = row_to_task(row)
+        check_version(task, expected_version)
+        position = None
+        if after is not None or before is not None or (column is not None and column != task["column"]):
+            position = self._place(conn, task, column or task["column"], after, before)
+        if text is None and column is None and position is None:
+            return task
+        version = self._next_version(conn, task["userId"])
+        updated_at = int(time.time() * 1000)
+        conn.execute(UPDATE_TASK, (text, column, position, version, updated_at, task_id))
+        if text is not None:
+            self._index_text(conn, task_id, task["userId"], task["text"], text)
+            task["text"] = text
+        if position is not None:
+            task["position"] = position
+        if column is not None:
+            task["column"] = column
+        task["version"] = version
+        task["updatedAt"] = updated_at
+        self._record_change(conn, "updated", task)
+        return task
+
+    def _delete(self, conn, task_id, expected_version=None):
+        row = conn.execute(SELECT_TASK, (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = row_to_task(row)
+        check_version(task, expected_version)
+        version = self._next_version(conn, task["userId"])
+        deleted_at = int(time.time() * 1000)
+        conn.execute(DELETE_TASK, (task_id,))
+        self._index_text(conn, task_id, task["userId"], task["text"], None)
+        conn.execute(INSERT_TOMBSTONE, (task_id, task["userId"], version, deleted_at))
+        task["version"] = version
+        task["updatedAt"] = deleted_at
+        self._record_change(conn, "deleted", task)
+        return task
+
+    def create_sync(self, text, column, user_id):
+        with self._write() as conn:
+            return self._create(conn, text, column, user_id)
+
+    def update_sync(self, task_id, text, column, after=None, before=None, expected_version=None):
+        # The version check reads inside the write transaction, so it holds
+        # across processes too
+        with self._write() as conn:
+            return self._update(conn, task_id, text, column, after, before, expected_version)
+
+    def delete_sync(self, task_id, expected_version=None):
+        with self._write() as conn:
+            return self._delete(conn, task_id, expected_version)
+
+    def batch_sync(self, operations):
+        with self._write() as conn:
+            # Validation runs inside the write transaction, so nothing can
+            # change between the checks and the writes
+            def exists(task_id):
+                return conn.execute(SELECT_TASK, (task_id,)).fetchone() is not None
+
+            error = validate_batch(operations, exists)
+            if error is not None:
+                raise BatchError(*error)
+
+            results = []
+            for operation in operations:
+                if operation.op == "create":
+                    task = self._create(conn, operation.text, operation.column or "Planning", operation.userId)
+                    results.append(("created", task))
+                elif operation.op == "delete":
+                    results.append(("deleted", self._delete(conn, operation.id)))
+                else:
+                    text, column = batch_fields(operation)
+                    results.append(("updated", self._update(conn, operation.id, text, column)))
+            return results
+
+    def get_sync(self, task_id):
+        with self.pool.connection() as conn:
+            row = conn.execute(SELECT_TASK, (task_id,)).fetchone()
+        return row_to_task(row) if row else None
+
+    def list_board_sync(self, user_id, column=None, limit=None, cursor=None):
+        # LIMIT -1 means no limit, so each query shape is a single statement
+        after = cursor if cursor is not None else -1
+        with self.pool.connection() as conn:
+            if column is None:
+                rows = conn.execute(SELECT_BOARD, (user_id, after, limit or -1)).fetchall()
+            else:
+                position, after = cursor if cursor is not None else ("", -1)
+                rows = conn.execute(SELECT_COLUMN, (user_id, column, position, after, limit or -1)).fetchall()
+        tasks = [row_to_task(row) for row in rows]
+        next_cursor = None
+        if limit is not None and len(tasks) == limit:
+            last = tasks[-1]
+            next_cursor = last["id"] if column is None else (last["position"], last["id"])
+        return tasks, next_cursor
+
+    def changes_since_sync(self, user_id, since):
+        with self.pool.connection() as conn:
+            # Read the board in one snapshot so the version matches the rows
+            conn.execute("BEGIN")
+            try:
+                version = self._board_version(conn, user_id)
+                horizon = conn.execute(SELECT_META, ("horizon",)).fetchone()[0]
+                if since < horizon:
+                    # Tombstones this old are already purged
+                    rows = conn.execute(SELECT_BOARD, (user_id, -1, -1)).fetchall()
+                    return [row_to_task(row) for row in rows], [], version, True
+                changed = [row_to_task(row) for row in conn.execute(SELECT_CHANGED, (user_id, since))]
+                deleted = [row[0] for row in conn.execute(SELECT_DELETED, (user_id, since))]
+                return changed, deleted, version, False
+            finally:
+                conn.execute("COMMIT")
+
+    def search_sync(self, user_id, query, limit):
+        terms = query_terms(query)
+        if not terms:
+            return []
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                matches = {}
+                for term in terms:
+                    words = matches[term] = {}
+                    for token, task_id in conn.execute(SELECT_TERMS, (user_id, *prefix_range(term))):
+                        task_ids = words.get(token)
+                        if task_ids is None:
+                            if len(words) == MAX_PREFIX_EXPANSIONS:
+                                break
+                            task_ids = words[token] = []
+                        task_ids.append(task_id)
+                board_size = conn.execute(COUNT_BOARD, (user_id,)).fetchone()[0]
+                results = rank(terms, matches, board_size, limit)
+                return [
+                    (row_to_task(conn.execute(SELECT_TASK, (task_id,)).fetchone()), score)
+                    for task_id, score in results
+                ]
+            finally:
+                conn.execute("COMMIT")
+
+    @staticmethod
+    def _board_version(conn, user_id):
+        row = conn.execute(SELECT_BOARD_VERSION, (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def board_version_sync(self, user_id):
+        with self.pool.connection() as conn:
+            return self._board_version(conn, user_id)
+
+    def purge_tombstones(self):
+        """Delete tombstones older than TOMBSTONE_TTL_SECONDS (blocking)"""
+        now = int(time.time() * 1000)
+        cutoff = now - TOMBSTONE_TTL_SECONDS * 1000
+        with self._write() as conn:
+            conn.execute(PURGE_CHANGES, (now - CHANGE_RETENTION_SECONDS * 1000,))
+            history_before = history_cutoff()
+            if history_before is not None:
+                # Keep each board's newest checkpoint before the cutoff and
+                # everything after it, so later as-of reads still replay
+                conn.execute(PURGE_HISTORY, (history_before, history_before))
+                conn.execute(PURGE_CHECKPOINTS, (history_before, history_before))
+                conn.execute(RAISE_HISTORY_HORIZON, (history_before,))
+            newest = conn.execute(MAX_PURGED_VERSION, (cutoff,)).fetchone()[0]
+            if newest is None:
+                return 0
+            # Clients behind the newest purged tombstone need a full resync
+            conn.execute(RAISE_HORIZON, (newest,))
+            return conn.execute(PURGE_TOMBSTONES, (cutoff,)).rowcount
+
+    def rebalance_sync(self, user_id, column):
+        """Rewrite a column with short, evenly spaced positions (blocking)
+
+        All cards get the same new version, and a ``reset`` goes through the
+        change feed so stream clients refetch the board.
+        """
+        with self._write() as conn:
+            ids = [row[0] for row in conn.execute(SELECT_COLUMN_IDS, (user_id, column))]
+            version = self._next_version(conn, user_id)
+            updated_at = int(time.time() * 1000)
+            conn.executemany(REBALANCE_POSITION, [
+                (position, version, updated_at, task_id) for task_id, position in zip(ids, spaced_keys(len(ids)))
+            ])
+            for row in conn.execute(SELECT_COLUMN, (user_id, column, "", -1, -1)).fetchall():
+                self._record_history(conn, "updated", row_to_task(row))
+            self._record_change(conn, "reset", {"userId": user_id, "column": column, "updatedAt": updated_at})
+        return len(ids)
+
+    async def rebalance(self, user_id, column):
+        count = await asyncio.to_thread(self.rebalance_sync, user_id, column)
+        self._wake_feed()
+        return count
+
+    def archive_sync(self, column, updated_before):
+        """Move stale cards of ``column`` to ``archive`` in one transaction (blocking)"""
+        with self._write() as conn:
+            rows = conn.execute(SELECT_STALE, (column, updated_before, ARCHIVE_BATCH)).fetchall()
+            archived_at = int(time.time() * 1000)
+            archived = []
+            for row in rows:
+                task = row_to_task(row)
+                conn.execute(INSERT_ARCHIVE, (task["id"], task["userId"], archived_at, pack(task)))
+                archived.append(self._delete(conn, task["id"]))
+            return archived
+
+    def list_archive_sync(self, user_id, limit=None, cursor=None):
+        archived_at, after = cursor if cursor is not None else ARCHIVE_START
+        with self.pool.connection() as conn:
+            rows = conn.execute(SELECT_ARCHIVE, (user_id, archived_at, after, limit or -1)).fetchall()
+        entries = [(row[0], unpack(row[1])) for row in rows]
+        next_cursor = None
+        if limit is not None and len(entries) == limit:
+            next_cursor = (entries[-1][0], entries[-1][1]["id"])
+        return entries, next_cursor
+
+    def restore_sync(self, task_id):
+        """Move an archived task back to the end of its column (blocking)"""
+        with self._write() as conn:
+            row = conn.execute(SELECT_ARCHIVED, (task_id,)).fetchone()
+            if row is None:
+                return None
+            task = unpack(row[0])
+            user_id, column = task["userId"], task["column"]
+            task["version"] = self._next_version(conn, user_id)
+            task["updatedAt"] = int(time.time() * 1000)
+            task["position"] = key_between(conn.execute(LAST_POSITION, (user_id, column)).fetchone()[0], None)
+            conn.execute(INSERT_TASK_WITH_ID, (
+                task_id, task["text"], column, user_id, task["version"], task["updatedAt"], task["position"],
+            ))
+            conn.execute(DELETE_ARCHIVED, (task_id,))
+            conn.execute(DELETE_TOMBSTONE, (task_id,))
+            self._index_text(conn, task_id, user_id, None, task["text"])
+            self._record_change(conn, "created", task)
+            return task
+
+    def task_history_sync(self, task_id, limit=None, cursor=None):
+        with self.pool.connection() as conn:
+            # One row more than asked for tells whether there is a next page
+            rows = conn.execute(SELECT_TASK_HISTORY, (
+                task_id, cursor if cursor is not None else -1, limit + 1 if limit is not None else -1,
+            )).fetchall()
+        events = [history_event(event_type, unpack(data), at) for event_type, at, data in rows]
+        return page_events(events, limit)
+
+    def board_as_of_sync(self, user_id, at):
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN")
+            try:
+                start = conn.execute(SELECT_META, ("history_start",)).fetchone()[0]
+                horizon = conn.execute(SELECT_META, ("history_horizon",)).fetchone()[0]
+                if at < max(start, horizon):
+                    return None
+                checkpoint = conn.execute(SELECT_CHECKPOINT, (user_id, at)).fetchone()
+                after, tasks = (checkpoint[0], unpack(checkpoint[1])) if checkpoint else (0, [])
+                events = [
+                    history_event(event_type, unpack(data), event_at)
+                    for event_type, event_at, data in conn.execute(SELECT_BOARD_HISTORY, (user_id, after, at))
+                ]
+            finally:
+                conn.execute("COMMIT")
+        return replay(tasks, events, at)
+
+    async def task_history(self, task_id, limit=None, cursor=None):
+        return await asyncio.to_thread(self.task_history_sync, task_id, limit, cursor)
+
+    async def board_as_of(self, user_id, at):
+        tasks = await asyncio.to_thread(self.board_as_of_sync, user_id, at)
+        if tasks is None:
+            raise HistoryUnavailable("as_of predates the task history")
+        return tasks
+
+    async def archive_done(self, column, updated_before):
+        archived = await asyncio.to_thread(self.archive_sync, column, updated_before)
+        self._wake_feed()
+        return archived
+
+    async def list_archive(self, user_id, limit=None, cursor=None):
+        return await asyncio.to_thread(self.list_archive_sync, user_id, limit, cursor)
+
+    async def restore(self, task_id):
+        task = await asyncio.to_thread(self.restore_sync, task_id)
+        self._wake_feed()
+        return task
+
+    async def purge_tombstones_periodically(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.purge_tombstones)
+                if purged:
+                    logger.info("Purged %d task tombstones", purged)
+            except Exception as e:
+                logger.error("Tombstone purge failed: %s", e)
+            await asyncio.sleep(TOMBSTONE_PURGE_INTERVAL)
+
+    # Cross-process change feed
+
+    def _read_changes(self):
+        """New feed rows after ``_feed_seq``, or [] if nothing was committed (blocking)"""
+        data_version = self._feed_conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._feed_version:
+            return []
+        rows = self._feed_conn.execute(SELECT_CHANGES, (self._feed_seq, CHANGE_BATCH)).fetchall()
+        if len(rows) < CHANGE_BATCH:
+            # Only mark the version seen once the backlog is drained
+            self._feed_version = data_version
+        return rows
+
+    async def _poll_changes(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._feed_wakeup.wait(), CHANGE_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._feed_wakeup.clear()
+            try:
+                rows = await asyncio.to_thread(self._read_changes)
+            except Exception as e:
+                logger.error("Reading the change feed failed: %s", e)
+                continue
+            for seq, event_type, task in rows:
+                self._feed_seq = seq
+                task = json.loads(task)
+                for listener in self._listeners:
+                    try:
+                        listener(seq, event_type, task)
+                    except Exception:
+                        logger.exception("Change listener failed")
+            if len(rows) == CHANGE_BATCH:
+                self._feed_wakeup.set()
+
+    def _wake_feed(self):
+        # Deliver this process's own writes without waiting for the next poll
+        if self._feed_wakeup is not None:
+            self._feed_wakeup.set()
+
+    def watch_changes(self, callback):
+        if self._poll_task is None:
+            self._feed_conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            self._feed_seq = self._feed_conn.execute(MAX_CHANGE_SEQ).fetchone()[0]
+            self._feed_wakeup = asyncio.Event()
+            self._poll_task = asyncio.create_task(self._poll_changes())
+        self._listeners.append(callback)
+        return self._feed_seq
+
+    # TaskBackend
+
+    async def create(self, text, column, user_id):
+        task = await asyncio.to_thread(self.create_sync, text, column, user_id)
+        self._wake_feed()
+        self.maybe_rebalance(task)
+        return task
+
+    async def get(self, task_id):
+        return await asyncio.to_thread(self.get_sync, task_id)
+
+    async def list_board(self, user_id, column=None, limit=None, cursor=None):
+        return await asyncio.to_thread(self.list_board_sync, user_id, column, limit, cursor)
+
+    async def update(self, task_id, text=None, column=None, after=None, before=None, expected_version=None):
+        task = await asyncio.to_thread(self.update_sync, task_id, text, column, after, before, expected_version)
+        self._wake_feed()
+        self.maybe_rebalance(task)
+        return task
+
+    async def delete(self, task_id, expected_version=None):
+        task = await asyncio.to_thread(self.delete_sync, task_id, expected_version)
+        self._wake_feed()
+        return task
+
+    async def batch(self, operations):
+        results = await asyncio.to_thread(self.batch_sync, operations)
+        self._wake_feed()
+        for event_type, task in results:
+            if event_type != "deleted":
+                self.maybe_rebalance(task)
+        return results
+
+    async def changes_since(self, user_id, since):
+        return await asyncio.to_thread(self.changes_since_sync, user_id, since)
+
+    async def search(self, user_id, query, limit):
+        return await asyncio.to_thread(self.search_sync, user_id, query, limit)
+
+    async def board_tag(self, user_id):
+        return str(await asyncio.to_thread(self.board_version_sync, user_id))
+
+    def read_counts(self):
+        """Live tasks in total and per column (blocking: two table scans)"""
+        with self.pool.connection() as conn:
+            return conn.execute(COUNT_TASKS).fetchone()[0], dict(conn.execute(COUNT_COLUMNS).fetchall())
+
+    async def refresh_counts_periodically(self):
+        while True:
+            await asyncio.sleep(COUNTS_REFRESH_INTERVAL)
+            try:
+                self._counts = await asyncio.to_thread(self.read_counts)
+            except Exception as e:
+                logger.error("Counting tasks failed: %s", e)
+
+    # count() and column_counts() run on the event loop (/, /health,
+    # /metrics), so they answer from the snapshot instead of scanning
+
+    def count(self):
+        return self._counts[0] if self._counts is not None else None
+
+    def column_counts(self):
+        return dict(self._counts[1]) if self._counts is not None else None
+
+    def stats(self):
+        return {
+            "storage": "sqlite",
+            "path": self.path,
+            "pool_size": self.pool_size,
+            "change_feed_seq": self._feed_seq,
+            "pid": os.getpid(),
+        }
@@ -0,0 +1,312 @@
+"""
+Storage backends behind the Kanban API.
+
+The routes in main.py only talk to a ``TaskBackend``. ``STORAGE_BACKEND``
+picks the engine:
+
+* ``memory`` (default) - indexed in-memory store with a snapshot + mutation
+  log, optionally mirrored to Firestore (memory_backend.py); single process
+* ``firestore`` - Firestore is the source of truth (firestore_backend.py)
+* ``sqlite`` - embedded SQLite database in WAL mode, no external service
+  (sqlite_backend.py)
+
+Every method is a coroutine and works with plain task dicts
+(``id, text, column, userId, version, updatedAt``).
+
+With several worker processes (``WEB_CONCURRENCY`` > 1, which is also what
+``uvicorn --workers`` reads) the default is ``sqlite``, the engine that can
+be shared between processes.
+"""
+
+import asyncio
+import logging
+import os
+
+from fast_json import encode_tasks
+from positions import needs_rebalance
+from search_index import search_tasks
+
+logger = logging.getLogger(__name__)
+
+
+class StorageUnavailable(Exception):
+    """The backend cannot serve requests (e.g. Firestore is not connected)"""
+
+
+class BatchError(Exception):
+    """A batch operation failed validation; nothing was applied"""
+
+    def __init__(self, index, status, message):
+        super().__init__(message)
+        self.index = index
+        self.status = status
+        self.message = message
+
+
+class InvalidMove(Exception):
+    """A move names neighbours that are not cards of the target column"""
+
+
+class HistoryUnavailable(Exception):
+    """An as-of read asks for a time before the retained history"""
+
+
+class VersionConflict(Exception):
+    """A conditional write names a version the task is no longer at"""
+
+    def __init__(self, task):
+        super().__init__(f"task {task['id']} is at version {task['version']}")
+        self.task = task
+
+
+class TaskBackend:
+    """Interface shared by all storage engines"""
+
+    name = "base"
+    # Whether the backend takes a Firestore client through ``attach_firebase``
+    uses_firebase = False
+    # Most operations ``batch`` can apply atomically, or None for no limit
+    max_batch_operations = None
+    _reset_listeners = ()
+
+    async def start(self):
+        pass
+
+    async def attach_firebase(self, db):
+        """Start using the Firestore client once it is connected (after ``start``)"""
+        pass
+
+    async def stop(self):
+        pass
+
+    async def create(self, text, column, user_id):
+        """Store a new task and return it"""
+        raise NotImplementedError
+
+    async def get(self, task_id):
+        """Return a task or None"""
+        raise NotImplementedError
+
+    async def list_board(self, user_id, column=None, limit=None, cursor=None):
+        """Return ``(tasks, next_cursor)`` for one board
+
+        A whole board comes in id order and its cursors are task ids; a
+        single column comes in position order and its cursors are
+        ``(position, id)`` tuples.
+        """
+        raise NotImplementedError
+
+    async def list_board_json(self, user_id, column=None, limit=None, cursor=None):
+        """Like ``list_board`` but the tasks come back as an encoded JSON array"""
+        tasks, next_cursor = await self.list_board(user_id, column=column, limit=limit, cursor=cursor)
+        return encode_tasks(tasks), next_cursor
+
+    async def update(self, task_id, text=None, column=None, after=None, before=None, expected_version=None):
+        """Apply the given fields and return the task, or None if it doesn't exist
+
+        ``after`` / ``before`` are ids of the cards the task should sit
+        between in its (new) column; either may be omitted. Without them a
+        card moved to another column goes to the end of it. Raises
+        ``InvalidMove`` if a neighbour is not a card of that column.
+
+        With ``expected_version`` the update only applies if the task is
+        still at that version, checked atomically with the write; otherwise
+        ``VersionConflict`` is raised with the current task.
+        """
+        raise NotImplementedError
+
+    async def delete(self, task_id, expected_version=None):
+        """Delete a task and return its last state (with the delete's version) or None
+
+        ``expected_version`` works as for ``update``.
+        """
+        raise NotImplementedError
+
+    async def batch(self, operations):
+        """Apply create/update/move/delete operations all-or-nothing
+
+        Returns one ``(event_type, task)`` per operation; raises ``BatchError``
+        without applying anything if any operation is invalid or there are
+        more than ``max_batch_operations``.
+        """
+        raise NotImplementedError
+
+    async def export_board(self, user_id, column=None, page_size=1000):
+        """Yield a board's tasks in ``list_board`` order, a page (list) at a time"""
+        cursor = None
+        while True:
+            tasks, cursor = await self.list_board(user_id, column=column, limit=page_size, cursor=cursor)
+            if tasks:
+                yield tasks
+            if cursor is None:
+                return
+
+    async def search(self, user_id, query, limit):
+        """Return ``(task, score)`` pairs on one board matching ``query``, best first
+
+        Without an index of its own a backend ranks the whole board per query.
+        """
+        tasks, _ = await self.list_board(user_id)
+        return search_tasks(tasks, query, limit)
+
+    async def changes_since(self, user_id, since):
+        """Return ``(changed, deleted_ids, version, full)`` for a board"""
+        raise NotImplementedError
+
+    def watch_changes(self, callback):
+        """Call ``callback(seq, event_type, task)`` for every committed change
+
+        Only backends shared between processes implement this: they deliver
+        writes made by any process, in commit order, with a feed-wide ``seq``.
+        Returns the feed position watching starts from, or None if the
+        backend has no feed (changes are then only known to the process that
+        made them).
+        """
+        return None
+
+    async def rebalance(self, user_id, column):
+        """Give every card of a column a short position, keeping the order
+
+        Returns how many cards were rewritten. Scheduled by
+        ``maybe_rebalance``; backends without positions never need it.
+        """
+        raise NotImplementedError
+
+    def maybe_rebalance(self, task):
+        """Rebalance the task's column in the background once its position is too long"""
+        if task is None or not needs_rebalance(task.get("position")):
+            return
+        pending = self.__dict__.setdefault("_rebalancing", {})
+        key = (task["userId"], task["column"])
+        if key not in pending:
+            pending[key] = asyncio.get_running_loop().create_task(self._run_rebalance(*key))
+
+    async def _run_rebalance(self, user_id, column):
+        try:
+            count = await self.rebalance(user_id, column)
+            logger.info("Rebalanced %d positions", count, extra={"user_id": user_id, "column": column})
+        except Exception as e:
+            logger.error("Position rebalance failed: %s", e)
+        finally:
+            self._rebalancing.pop((user_id, column), None)
+
+    async def archive_done(self, column, updated_before):
+        """Move cards of ``column`` unchanged since ``updated_before`` (ms) to the archive
+
+        Returns the archived tasks in their deleted form (tombstone version),
+        at most ``ARCHIVE_BATCH`` per call (fewer on Firestore, where one call
+        must fit a single WriteBatch).
+        """
+        raise NotImplementedError
+
+    async def list_archive(self, user_id, limit=None, cursor=None):
+        """Return ``([(archivedAt, task)], next_cursor)`` newest archived first
+
+        Cursors are ``(archivedAt, id)`` tuples.
+        """
+        raise NotImplementedError
+
+    async def restore(self, task_id):
+        """Put an archived task back at the end of its column and return it, or None"""
+        raise NotImplementedError
+
+    async def task_history(self, task_id, limit=None, cursor=None):
+        """Return ``(events, next_cursor)``: one task's history, oldest first
+
+        Events are ``{"at", "type", "task"}`` (see task_history.py); cursors
+        are task versions.
+        """
+        raise NotImplementedError
+
+    async def board_as_of(self, user_id, at):
+        """A board's tasks as they were at ``at`` (ms), in id order
+
+        Raises ``HistoryUnavailable`` if ``at`` predates the history.
+        """
+        raise NotImplementedError
+
+    def on_board_reset(self, callback):
+        """Call ``callback(user_id)`` after many cards of a board changed at
+        once (a position rebalance), so clients should refetch it"""
+        self._reset_listeners = [*self._reset_listeners, callback]
+
+    def _board_reset(self, user_id):
+        for callback in self._reset_listeners:
+            callback(user_id)
+
+    async def board_tag(self, user_id):
+        """Cheap validator that changes whenever the board changes, or None if unknown"""
+        return None
+
+    def count(self):
+        """Number of live tasks, or None if the backend can't tell cheaply"""
+        return None
+
+    def column_counts(self):
+        """Live tasks per column across all boards, or None if unknown"""
+        return None
+
+    def stats(self):
+        return {"storage": self.name}
+
+
+def validate_batch(operations, exists):
+    """Check a whole batch before anything is applied
+
+    ``exists(task_id)`` says whether a task is present before the batch.
+    Returns ``(index, status, message)`` for the first bad operation or None.
+    """
+    deleted = set()
+    for index, operation in enumerate(operations):
+        if operation.op == "create":
+            if operation.text is None or operation.userId is None:
+                return index, 400, "create requires text and userId"
+            continue
+        if operation.id is None:
+            return index, 400, f"{operation.op} requires id"
+        if not exists(operation.id) or operation.id in deleted:
+            return index, 404, "Task not found"
+        if operation.op == "move" and operation.column is None:
+            return index, 400, "move requires column"
+        if operation.op == "delete":
+            deleted.add(operation.id)
+    return None
+
+
+def check_version(task, expected_version):
+    """Raise ``VersionConflict`` unless ``task`` is at ``expected_version`` (None: any)"""
+    if expected_version is not None and task["version"] != expected_version:
+        raise VersionConflict(task)
+
+
+def batch_fields(operation):
+    """(text, column) an update/move operation changes
+
+    Batch moves go to the end of the target column.
+    """
+    text = operation.text if operation.op == "update" else None
+    return text, operation.column
+
+
+def default_backend_kind():
+    """``sqlite`` when running several worker processes, else ``memory``"""
+    workers = int(os.getenv("WEB_CONCURRENCY", "1") or "1")
+    return "sqlite" if workers > 1 else "memory"
+
+
+def make_backend(kind=None, firebase_db=None):
+    """Build the backend named by ``kind`` or ``STORAGE_BACKEND``"""
+    kind = kind or os.getenv("STORAGE_BACKEND") or default_backend_kind()
+    if kind == "sqlite":
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(
+            os.getenv("SQLITE_PATH", "tasks.db"),
+            pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4")),
+        )
+    if kind == "firestore":
+        from firestore_backend import FirestoreBackend
+        return FirestoreBackend(firebase_db)
+    if kind == "memory":
+        from memory_backend import MemoryBackend
+        return MemoryBackend(firebase_db)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {kind}")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for conditional task updates.
+
+Creates one board of ``--cards`` cards whose text is a counter, then has
+``--concurrency`` clients make ``--moves`` read-modify-write moves between
+them: each takes the last state any client saw of a random card, moves it to
+another column and increments its counter with ``PUT /tasks/{id}`` and
+``If-Match`` set to the version it read. A 412 carries the current task, so
+the client reapplies its change to that and tries again. With few cards and
+many clients most moves race each other.
+
+Afterwards the board must hold every card exactly once, no two cards of a
+column may share a position and the counters must add up to the number of
+successful moves, i.e. no update was lost. The process exits non-zero if
+any check fails. ``--no-if-match`` drops the header to show the lost
+updates it prevents (expect that run to fail).
+
+Requests go straight to the ASGI app; each backend runs in its own process
+and Firestore uses the in-memory fake client, so the test runs offline.
+
+    python stress_moves.py [--backends memory,sqlite,firestore] [--cards 20]
+                           [--moves 5000] [--concurrency 200] [--no-if-match]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_api import COLUMNS, AsgiClient
+
+BOARD = 'stress'
+
+
+async def create_board(client, cards):
+    ids = []
+    for index in range(cards):
+        status, body = await client.request('POST', '/tasks', {
+            'text': '0', 'column': COLUMNS[index % len(COLUMNS)], 'userId': BOARD,
+        })
+        if status != 200:
+            raise RuntimeError(f'creating a card failed: {status} {body[:200]!r}')
+        ids.append(json.loads(body)['id'])
+    return ids
+
+
+async def move_cards(client, ids, args):
+    """Make ``args.moves`` conditional moves from ``args.concurrency`` clients"""
+    rng = random.Random(args.seed)
+    seen = {}
+    counts = {'moves': 0, 'conflicts': 0, 'errors': 0}
+    remaining = args.moves
+
+    def observe(task):
+        if task['version'] > seen[task['id']]['version']:
+            seen[task['id']] = task
+
+    status, body = await client.request('GET', f'/tasks?userId={BOARD}')
+    for task in json.loads(body):
+        seen[task['id']] = task
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            task = seen[rng.choice(ids)]
+            while True:
+                # Let other clients run between the read and the write, as a
+                # round trip would (in-process requests may never yield)
+                await asyncio.sleep(0)
+                column = rng.choice([c for c in COLUMNS if c != task['column']])
+                headers = [('If-Match', f'"{task["version"]}"')] if args.if_match else []
+                status, body = await client.request('PUT', f'/tasks/{task["id"]}', {
+                    'text': str(int(task['text']) + 1), 'column': column,
+                }, headers)
+                if status == 200:
+                    counts['moves'] += 1
+                    observe(json.loads(body))
+                    break
+                if status == 412:
+                    counts['conflicts'] += 1
+                    task = json.loads(body)['detail']['task']
+                    observe(task)
+                    continue
+                counts['errors'] += 1
+                print(f'PUT /tasks/{task["id"]}: {status} {body[:200]!r}', file=sys.stderr)
+                break
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return counts
+
+
+def check_board(tasks, ids, moves):
+    """Problems with the final board, as messages"""
+    problems = []
+    found = sorted(task['id'] for task in tasks)
+    if found != sorted(ids):
+        problems.append(f'board has {len(found)} cards ({len(set(found))} distinct), expected {len(ids)}')
+    total = sum(int(task['text']) for task in tasks)
+    if total != moves:
+        problems.append(f'{moves - total} of {moves} updates lost')
+    for column in COLUMNS:
+        positions = [task.get('position') for task in tasks if task['column'] == column]
+        if len(set(positions)) != len(positions):
+            problems.append(f'duplicate positions in {column!r}')
+    return problems
+
+
+def run_child(backend_kind, args):
+    """One stress run; executed in its own process"""
+    os.chdir(tempfile.mkdtemp(prefix='stress-moves-'))
+    os.environ['STORAGE_BACKEND'] = backend_kind
+    os.environ['SQLITE_PATH'] = 'stress.db'
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Every client shares one address; don't let the rate limiter step in
+    os.environ.setdefault('RATE_LIMIT_READ_RATE', '0')
+    os.environ.setdefault('RATE_LIMIT_WRITE_RATE', '0')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import main as app_main
+    if backend_kind == 'firestore':
+        from fake_firestore import FakeFirestore, transactional
+        from firestore_backend import FirestoreBackend
+        from id_allocator import CounterBlockAllocator
+        db = FakeFirestore()
+        app_main.backend = FirestoreBackend(db, allocator=CounterBlockAllocator(db, transactional=transactional))
+
+    async def run():
+        client = AsgiClient(app_main.app)
+        await app_main.app.router.startup()
+        try:
+            ids = await create_board(client, args.cards)
+            started = time.perf_counter()
+            counts = await move_cards(client, ids, args)
+            elapsed = time.perf_counter() - started
+            status, body = await client.request('GET', f'/tasks?userId={BOARD}')
+            problems = check_board(json.loads(body), ids, counts['moves'])
+        finally:
+            await app_main.app.router.shutdown()
+        return {
+            'backend': backend_kind,
+            **counts,
+            'moves_per_s': round(counts['moves'] / elapsed) if elapsed else None,
+            'problems': problems,
+        }
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--backends', default='memory,sqlite,firestore')
+    parser.add_argument('--cards', type=int, default=20)
+    parser.add_argument('--moves', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--no-if-match', dest='if_match', action='store_false',
+                        help='send unconditional PUTs')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_child(args.child, args)
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return
+
+    failed = False
+    print(f"{'backend':>9} {'moves':>7} {'412s':>7} {'errors':>6} {'moves/s':>8}  result")
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, 'result.json')
+        for backend in args.backends.split(','):
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), *sys.argv[1:], '--child', backend, '--output', output],
+                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            )
+            if proc.returncode != 0:
+                print(f'{backend:>9} failed:\n{proc.stderr}')
+                failed = True
+                continue
+            with open(output) as f:
+                result = json.load(f)
+            problems = result['problems']
+            if result['errors']:
+                problems.append(f"{result['errors']} requests failed")
+            failed = failed or bool(problems)
+            print(f"{backend:>9} {result['moves']:>7} {result['conflicts']:>7} {result['errors']:>6} "
+                  f"{result['moves_per_s'] or 0:>8}  {'; '.join(problems) or 'ok'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Cold storage for finished work.
+
+Cards that have sat in ``ARCHIVE_COLUMN`` (default ``Done``) for longer than
+``ARCHIVE_AFTER_SECONDS`` (default 30 days; 0 turns archiving off) are moved
+out of the live task set by a background job every ``ARCHIVE_INTERVAL``
+seconds. To clients an archived card looks deleted, so boards, delta sync,
+search, snapshots and startup sync only ever handle active work. Archived
+cards stay readable through ``GET /tasks/archive`` (newest archived first,
+paged with an ``archivedAt:id`` cursor) and can be restored to the end of
+their column.
+
+Each backend keeps its own cold tier: the memory backend appends to
+segmented, gzip-compressed files (``SegmentArchive``, mirrored to the
+``kanban-archive`` collection when Firestore is connected), SQLite to an
+``archive`` table and Firestore to the ``kanban-archive`` collection; the
+latter two store each task as zlib-compressed JSON (``pack``).
+"""
+
+import bisect
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import zlib
+
+ARCHIVE_COLUMN = os.getenv("ARCHIVE_COLUMN", "Done")
+ARCHIVE_AFTER_SECONDS = int(os.getenv("ARCHIVE_AFTER_SECONDS", str(30 * 24 * 3600)))
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+# Most tasks moved per archive transaction / file append
+ARCHIVE_BATCH = 500
+ARCHIVE_COLLECTION = "kanban-archive"
+
+_SEGMENT = re.compile(r"segment-(\d+)\.jsonl\.gz$")
+
+
+def archive_cutoff(now=None):
+    """``updatedAt`` before which a card in the archive column is archived, or None if disabled"""
+    if ARCHIVE_AFTER_SECONDS <= 0:
+        return None
+    now = time.time() if now is None else now
+    return int((now - ARCHIVE_AFTER_SECONDS) * 1000)
+
+
+def pack(task):
+    """Compressed JSON of a task, for archive rows and documents"""
+    return zlib.compress(json.dumps(task, separators=(",", ":")).encode("utf-8"))
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def format_archive_cursor(archived_at, task_id):
+    return f"{archived_at}:{task_id}"
+
+
+def parse_archive_cursor(cursor):
+    """``(archivedAt, id)`` from ``format_archive_cursor`` output; ValueError if malformed"""
+    archived_at, _, task_id = cursor.partition(":")
+    return int(archived_at), int(task_id)
+
+
+def page_entries(entries, limit=None, cursor=None):
+    """Page ``(archivedAt, task)`` pairs newest first, after a ``(archivedAt, id)`` cursor"""
+    entries = sorted(entries, key=lambda entry: (entry[0], entry[1]["id"]), reverse=True)
+    if cursor is not None:
+        entries = [entry for entry in entries if (entry[0], entry[1]["id"]) < cursor]
+    page = entries[:limit] if limit is not None else entries
+    next_cursor = None
+    if limit is not None and len(page) == limit and len(entries) > limit:
+        next_cursor = (page[-1][0], page[-1][1]["id"])
+    return page, next_cursor
+
+
+class SegmentArchive:
+    """Append-only archive files for the memory backend
+
+    ``<directory>/segment-000001.jsonl.gz`` and so on. Every ``append`` adds
+    one gzip member of JSON lines (``{"archivedAt", "task"}``, or
+    ``{"restoredAt", "id"}`` once a task is restored) and is fsynced; a new
+    segment is started once the current one reaches ``segment_bytes``.
+    Nothing is rewritten. The id -> segment index, and each user's archived
+    keys in order, are built by reading the segments on the first lookup, so
+    startup never touches the archive. Every method blocks (file I/O); the
+    backend calls them through ``asyncio.to_thread``.
+    """
+
+    def __init__(self, directory="tasks_archive", segment_bytes=4 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        # task id -> (archivedAt, userId, segment number); None until loaded
+        self._index = None
+        # userId -> sorted [(archivedAt, id)] of that user's archived tasks
+        self._by_user = {}
+        self._lock = threading.RLock()
+
+    def _path(self, number):
+        return os.path.join(self.directory, f"segment-{number:06d}.jsonl.gz")
+
+    def segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(match.group(1)) for match in map(_SEGMENT.match, os.listdir(self.directory)) if match)
+
+    def _current_segment(self):
+        segments = self.segments()
+        if not segments:
+            return 1
+        last = segments[-1]
+        if os.path.getsize(self._path(last)) >= self.segment_bytes:
+            return last + 1
+        return last
+
+    def append(self, entries):
+        """Durably append archive entries (one compressed member)"""
+        if not entries:
+            return
+        lines = "".join(json.dumps(entry, separators=(",", ":")) + "\n" for entry in entries)
+        member = gzip.compress(lines.encode("utf-8"), mtime=0)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            number = self._current_segment()
+            with open(self._path(number), "ab") as f:
+                f.write(member)
+                f.flush()
+                os.fsync(f.fileno())
+            if self._index is not None:
+                self._apply(entries, number)
+
+    def _read(self, number):
+        with gzip.open(self._path(number), "rt", encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+    def _apply(self, entries, number):
+        for entry in entries:
+            if "task" in entry:
+                task = entry["task"]
+                self._forget(task["id"])
+                key = (entry["archivedAt"], task["id"])
+                self._index[task["id"]] = (entry["archivedAt"], task["userId"], number)
+                bisect.insort(self._by_user.setdefault(task["userId"], []), key)
+            else:
+                self._forget(entry["id"])
+
+    def _forget(self, task_id):
+        known = self._index.pop(task_id, None)
+        if known is None:
+            return
+        archived_at, user_id, _ = known
+        keys = self._by_user[user_id]
+        del keys[bisect.bisect_left(keys, (archived_at, task_id))]
+        if not keys:
+            del self._by_user[user_id]
+
+    def _ensure_index(self):
+        if self._index is None:
+            self._index = {}
+            for number in self.segments():
+                self._apply(self._read(number), number)
+        return self._index
+
+    def _tasks(self, wanted):
+        """``{id: (archivedAt, task)}`` for ``{id: segment}``, reading each segment once"""
+        found = {}
+        by_segment = {}
+        for task_id, number in wanted.items():
+            by_segment.setdefault(number, set()).add(task_id)
+        for number, ids in by_segment.items():
+            for entry in self._read(number):
+                task = entry.get("task")
+                if task is not None and task["id"] in ids:
+                    # A task archived twice in one segment: the later entry wins
+                    found[task["id"]] = (entry["archivedAt"], task)
+        return found
+
+    def page(self, user_id, limit=None, cursor=None):
+        with self._lock:
+            index = self._ensure_index()
+            keys = self._by_user.get(user_id, [])
+            end = bisect.bisect_left(keys, cursor) if cursor is not None else len(keys)
+            start = max(0, end - limit) if limit is not None else 0
+            page = keys[start:end][::-1]
+            found = self._tasks({task_id: index[task_id][2] for _, task_id in page})
+        entries = [found[task_id] for _, task_id in page]
+        next_cursor = page[-1] if limit is not None and len(page) == limit and start > 0 else None
+        return entries, next_cursor
+
+    def get(self, task_id):
+        """An archived task, or None; the archive is left as it is"""
+        with self._lock:
+            known = self._ensure_index().get(task_id)
+            if known is None:
+                return None
+            found = self._tasks({task_id: known[2]}).get(task_id)
+        return found[1] if found is not None else None
+
+    def mark_restored(self, task_id):
+        """Drop a task from the archive once it is back in the store"""
+        self.append([{"restoredAt": int(time.time() * 1000), "id": task_id}])
+
+    def stats(self):
+        return {
+            "segments": len(self.segments()),
+            "archived": len(self._index) if self._index is not None else None,
+        }
@@ -0,0 +1,141 @@
+"""
+Per-board read-through cache for the Firestore backend.
+
+``BoardCache`` keeps recently read boards (``task id -> task dict``) in an
+LRU bounded by board count and entry age. The app's own create/update/delete
+handlers patch cached boards in place, and ``watch_collection`` can attach a
+Firestore snapshot listener so writes from other processes are applied too.
+``NullCache`` has the same interface and caches nothing.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class BoardCache:
+    """LRU + TTL cache of boards keyed by board id"""
+
+    def __init__(self, max_boards=1024, ttl=60.0):
+        self.max_boards = max_boards
+        self.ttl = ttl
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, board):
+        """Return a copy of the cached tasks for ``board`` or None on a miss"""
+        with self._lock:
+            entry = self._boards.get(board)
+            if entry is None:
+                self.misses += 1
+                return None
+            loaded_at, tasks = entry
+            if self.ttl and time.monotonic() - loaded_at > self.ttl:
+                del self._boards[board]
+                self.misses += 1
+                return None
+            self._boards.move_to_end(board)
+            self.hits += 1
+            return list(tasks.values())
+
+    def peek(self, board):
+        """Like ``get`` but without touching the LRU order or counters"""
+        with self._lock:
+            entry = self._boards.get(board)
+            if entry is None or (self.ttl and time.monotonic() - entry[0] > self.ttl):
+                return None
+            return list(entry[1].values())
+
+    def put(self, board, tasks):
+        with self._lock:
+            self._boards[board] = (time.monotonic(), {task["id"]: dict(task) for task in tasks})
+            self._boards.move_to_end(board)
+            while len(self._boards) > self.max_boards:
+                self._boards.popitem(last=False)
+                self.evictions += 1
+
+    def upsert(self, board, task):
+        """Apply a created or updated task to ``board`` if it is cached"""
+        with self._lock:
+            entry = self._boards.get(board)
+            if entry is not None:
+                entry[1][task["id"]] = dict(task)
+
+    def remove(self, board, task_id):
+        with self._lock:
+            entry = self._boards.get(board)
+            if entry is not None:
+                entry[1].pop(task_id, None)
+
+    def invalidate(self, board=None):
+        with self._lock:
+            if board is None:
+                self._boards.clear()
+            else:
+                self._boards.pop(board, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "boards": len(self._boards),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class NullCache:
+    """Cache that never stores anything (every lookup is a miss)"""
+
+    def __init__(self):
+        self.misses = 0
+
+    def get(self, board):
+        self.misses += 1
+        return None
+
+    def peek(self, board):
+        return None
+
+    def put(self, board, tasks):
+        pass
+
+    def upsert(self, board, task):
+        pass
+
+    def remove(self, board, task_id):
+        pass
+
+    def invalidate(self, board=None):
+        pass
+
+    def stats(self):
+        return {"boards": 0, "hits": 0, "misses": self.misses, "evictions": 0, "hit_ratio": 0.0}
+
+
+def watch_collection(cache, collection_ref, board_of):
+    """Keep ``cache`` fresh from a Firestore snapshot listener
+
+    ``board_of`` maps a task dict to its board key. Returns the watch
+    handle; call ``unsubscribe()`` on it to stop listening.
+    """
+    def on_snapshot(collection_snapshot, changes, read_time):
+        for change in changes:
+            task = change.document.to_dict() or {}
+            task["id"] = int(change.document.id)
+            if change.type.name == "REMOVED" or task.get("deleted"):
+                cache.remove(board_of(task), task["id"])
+            else:
+                cache.upsert(board_of(task), task)
+
+    return collection_ref.on_snapshot(on_snapshot)
+
+
+def make_cache(kind="lru", max_boards=1024, ttl=60.0):
+    if kind == "none":
+        return NullCache()
+    return BoardCache(max_boards=max_boards, ttl=ttl)
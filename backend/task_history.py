@@ -0,0 +1,472 @@
+"""
+Task history: every committed mutation kept as an event.
+
+An event is ``{"at", "type", "task"}``: the time of the change (the task's
+``updatedAt``), ``created`` / ``updated`` / ``deleted`` and the task as it
+was after the change (its last state for a delete). ``GET
+/tasks/{id}/history`` lists one task's events and ``GET /tasks?as_of=``
+rebuilds a board at a point in time by replaying events on top of the
+nearest earlier checkpoint (a full copy of the board), so an as-of read
+only replays what happened since that checkpoint, however long the history.
+
+Each backend keeps its own history:
+
+* ``memory`` - ``HistoryLog`` below: gzip-compressed, append-only segment
+  files under ``HISTORY_DIR``, a checkpoint of the store whenever a new
+  segment starts and per-segment task and board indexes
+* ``sqlite`` - ``history`` / ``history_checkpoints`` tables written in the
+  same transaction as the change, with a board checkpoint every
+  ``HISTORY_CHECKPOINT_EVERY`` changes
+* ``firestore`` - ``kanban-history`` documents written in the same batch as
+  the change, board checkpoints in ``kanban-history-checkpoints``
+
+A checkpoint reads the whole board, so a board with more cards than
+``HISTORY_CHECKPOINT_EVERY`` waits for as many changes as it has cards
+before the next one. Checkpoints then cost O(1) per change, and an as-of
+read replays at most about one board's worth of events on top of one.
+
+Tasks, events and checkpoints are stored as compressed JSON. With
+``HISTORY_RETENTION_DAYS`` set, events older than that which a later
+checkpoint covers are dropped (memory and sqlite), and as-of reads before
+the retained history answer 400.
+"""
+
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Board changes between two checkpoints, at least (sqlite, firestore)
+HISTORY_CHECKPOINT_EVERY = int(os.getenv("HISTORY_CHECKPOINT_EVERY", "500"))
+# 0 keeps history forever
+HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+HISTORY_COLLECTION = "kanban-history"
+HISTORY_CHECKPOINT_COLLECTION = "kanban-history-checkpoints"
+
+_CHECKPOINT = re.compile(r"checkpoint-(\d+)-(\d+)\.json\.gz$")
+_SEGMENT = re.compile(r"segment-(\d+)\.jsonl\.gz$")
+
+
+def history_cutoff(now=None):
+    """Events before this time (ms) may be dropped, or None to keep everything"""
+    if HISTORY_RETENTION_DAYS <= 0:
+        return None
+    now = time.time() if now is None else now
+    return int((now - HISTORY_RETENTION_DAYS * 86400) * 1000)
+
+
+def history_event(event_type, task, at=None):
+    return {"at": task.get("updatedAt") if at is None else at, "type": event_type, "task": task}
+
+
+def replay(tasks, events, at):
+    """Board as of ``at``: checkpoint ``tasks`` with ``events`` (oldest first) applied, by id"""
+    board = {task["id"]: task for task in tasks}
+    for event in events:
+        if event["at"] > at:
+            break
+        task = event["task"]
+        if event["type"] == "deleted":
+            board.pop(task["id"], None)
+        else:
+            board[task["id"]] = task
+    return [board[task_id] for task_id in sorted(board)]
+
+
+def board_key(task):
+    """Key of a task's board in history indexes (JSON object keys are strings)"""
+    return task.get("userId") or ""
+
+
+def gzip_members(data, chunk_size=64 * 1024):
+    """``(offset, length, payload)`` of each gzip member in ``data``; a torn last member is skipped"""
+    view = memoryview(data)
+    offset = 0
+    while offset < len(view):
+        decompressor = zlib.decompressobj(wbits=31)
+        parts = []
+        position = offset
+        while not decompressor.eof:
+            chunk = view[position:position + chunk_size]
+            if not chunk:
+                return
+            parts.append(decompressor.decompress(chunk))
+            position += len(chunk)
+        length = position - len(decompressor.unused_data) - offset
+        yield offset, length, b"".join(parts)
+        offset += length
+
+
+def page_events(events, limit=None, cursor=None):
+    """Events after the ``cursor`` version, oldest first, and the next cursor"""
+    if cursor is not None:
+        events = [event for event in events if event["task"].get("version", 0) > cursor]
+    page = events[:limit] if limit is not None else events
+    next_cursor = None
+    if limit is not None and len(events) > limit:
+        next_cursor = page[-1]["task"].get("version", 0)
+    return page, next_cursor
+
+
+class HistoryLog:
+    """Segmented, compressed event log for the memory backend
+
+    ``<directory>/segment-000001.jsonl.gz`` holds events as gzip members of
+    JSON lines, appended by a background thread every ``flush_interval``
+    seconds. Once the open segment reaches ``segment_bytes`` the backend
+    calls ``rotate``, which seals it (writing ``segment-N.idx.json``, the
+    ids of the tasks it mentions and, per board, the gzip members holding
+    its events) and starts the next one. The next segment's
+    ``checkpoint-<N>-<at>.json.gz`` is the previous checkpoint with the
+    sealed segment replayed on top, so it covers boards that are not
+    resident in memory too; it holds one gzip member per board, located by
+    ``checkpoint-<N>-<at>.idx.json``.
+
+    An as-of read seeks to the board's member of the newest checkpoint at or
+    before the time and replays only the board's members of the segments
+    since, so it costs about the board's size and activity, not the store's.
+    A task's history only opens the segments its index lists.
+    """
+
+    def __init__(self, directory="tasks_history", segment_bytes=4 * 1024 * 1024, flush_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        # Guards the pending events and in-memory indexes
+        self._lock = threading.Lock()
+        # Held while segment files are written or read
+        self._io_lock = threading.Lock()
+        self._pending = []
+        self._active = None
+        self._active_ids = set()
+        # segment number -> checkpoint time (the newest change it includes)
+        self._checkpoints = {}
+        # sealed segment number -> its last events, until written
+        self._sealing = {}
+        # segment number -> task ids, loaded from the index files on demand
+        self._sealed_ids = {}
+        # segment number -> {board: [(offset, length) of its gzip members]};
+        # the open segment's is kept up to date by ``_append``
+        self._segment_boards = {}
+        # checkpoint number -> {board: (offset, length)}, a few recent ones
+        self._checkpoint_boards = OrderedDict()
+        self._rotating = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.events = 0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segment_path(self, number):
+        return self._path(f"segment-{number:06d}.jsonl.gz")
+
+    def _index_path(self, number):
+        return self._path(f"segment-{number:06d}.idx.json")
+
+    def _checkpoint_path(self, number, at):
+        return self._path(f"checkpoint-{number:06d}-{at}.json.gz")
+
+    def _checkpoint_index_path(self, number, at):
+        return self._path(f"checkpoint-{number:06d}-{at}.idx.json")
+
+    # --- lifecycle -----------------------------------------------------
+
+    def open(self, tasks):
+        """Load the segment layout; a new history starts with a checkpoint of ``tasks``"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = []
+        for name in os.listdir(self.directory):
+            match = _CHECKPOINT.match(name)
+            if match:
+                self._checkpoints[int(match.group(1))] = int(match.group(2))
+            match = _SEGMENT.match(name)
+            if match:
+                segments.append(int(match.group(1)))
+        if not self._checkpoints:
+            at = int(time.time() * 1000)
+            self._write_checkpoint(1, at, tasks)
+            self._checkpoints[1] = at
+        self._active = max([*self._checkpoints, *segments])
+        boards = self._segment_boards[self._active] = {}
+        if os.path.exists(self._segment_path(self._active)):
+            with open(self._segment_path(self._active), "rb") as f:
+                members = list(gzip_members(f.read()))
+            for offset, length, payload in members:
+                events = [json.loads(line) for line in payload.decode("utf-8").splitlines()]
+                self._active_ids.update(event["task"]["id"] for event in events)
+                for key in {board_key(event["task"]) for event in events}:
+                    boards.setdefault(key, []).append((offset, length))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._flush_loop, name="task-history-flush", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._rotating is not None:
+            self._rotating.join()
+        self.flush()
+
+    # --- writes --------------------------------------------------------
+
+    def record(self, event_type, task):
+        with self._lock:
+            self._pending.append(history_event(event_type, task))
+            self._active_ids.add(task["id"])
+            self.events += 1
+
+    def flush(self):
+        """Append pending events to the open segment (blocking)"""
+        with self._io_lock:
+            with self._lock:
+                events, self._pending = self._pending, []
+                number = self._active
+            self._append(number, events)
+
+    def _append(self, number, events):
+        """Write ``events`` to a segment as one gzip member (hold ``_io_lock``)"""
+        if not events:
+            return
+        lines = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in events)
+        member = gzip.compress(lines.encode("utf-8"), mtime=0)
+        with open(self._segment_path(number), "ab") as f:
+            offset = f.tell()
+            f.write(member)
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            boards = self._segment_boards.setdefault(number, {})
+            for key in {board_key(event["task"]) for event in events}:
+                boards.setdefault(key, []).append((offset, len(member)))
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Writing task history failed: %s", e)
+
+    def should_rotate(self):
+        if self._rotating is not None and self._rotating.is_alive():
+            return False
+        path = self._segment_path(self._active)
+        return os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes
+
+    def rotate(self):
+        """Seal the open segment and start the next one
+
+        The new segment's checkpoint is the previous checkpoint with the
+        sealed segment replayed on top, built in the background; until it
+        exists, reads replay through both segments.
+        """
+        with self._lock:
+            sealed, events, ids = self._active, self._pending, self._active_ids
+            self._pending, self._active_ids = [], set()
+            self._active += 1
+            self._sealing[sealed] = events
+            self._segment_boards[self._active] = {}
+        self._rotating = threading.Thread(
+            target=self._finish_rotation, args=(sealed, ids), name="task-history-checkpoint", daemon=True)
+        self._rotating.start()
+
+    def _finish_rotation(self, sealed, ids):
+        try:
+            with self._io_lock:
+                self._append(sealed, self._sealing[sealed])
+                with open(self._index_path(sealed), "w") as f:
+                    json.dump({"tasks": sorted(ids), "boards": self._segment_boards.get(sealed, {})}, f)
+                with self._lock:
+                    self._sealed_ids[sealed] = frozenset(ids)
+                    del self._sealing[sealed]
+                start = max(number for number in self._checkpoints if number <= sealed)
+                tasks = self._load_checkpoint(start)
+                events = []
+                for number in range(start, sealed + 1):
+                    events += self._read_segment(number)
+            at = max((event["at"] for event in events), default=self._checkpoints[start])
+            self._write_checkpoint(sealed + 1, at, replay(tasks, events, at))
+            with self._lock:
+                self._checkpoints[sealed + 1] = at
+            self.purge(history_cutoff())
+        except Exception as e:
+            logger.error("Writing a task history checkpoint failed: %s", e)
+
+    def _write_checkpoint(self, number, at, tasks):
+        """Write ``tasks`` as one gzip member per board, plus the members' index"""
+        boards = {}
+        for task in tasks:
+            boards.setdefault(board_key(task), []).append(task)
+        index = {}
+        path = self._checkpoint_path(number, at)
+        with open(path + ".tmp", "wb") as f:
+            for key, board in boards.items():
+                member = gzip.compress(json.dumps(board, separators=(",", ":")).encode("utf-8"), mtime=0)
+                index[key] = (f.tell(), len(member))
+                f.write(member)
+        os.replace(path + ".tmp", path)
+        # Without its index (a crash right here) a checkpoint is read whole
+        index_path = self._checkpoint_index_path(number, at)
+        with open(index_path + ".tmp", "w") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(index_path + ".tmp", index_path)
+
+    def purge(self, cutoff):
+        """Drop segments whose every event is older than ``cutoff`` and covered by a later checkpoint"""
+        if cutoff is None:
+            return 0
+        dropped = 0
+        with self._io_lock:
+            while True:
+                with self._lock:
+                    numbers = sorted(self._checkpoints)
+                    if len(numbers) < 2 or self._checkpoints[numbers[1]] >= cutoff:
+                        break
+                    oldest = numbers[0]
+                    at = self._checkpoints.pop(oldest)
+                    self._sealed_ids.pop(oldest, None)
+                    self._segment_boards.pop(oldest, None)
+                    self._checkpoint_boards.pop(oldest, None)
+                for path in (self._segment_path(oldest), self._index_path(oldest), self._checkpoint_path(oldest, at),
+                             self._checkpoint_index_path(oldest, at)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                dropped += 1
+        return dropped
+
+    # --- reads (blocking) ----------------------------------------------
+
+    def _read_segment(self, number):
+        """A segment's events, including any still being written (hold ``_io_lock``)"""
+        events = []
+        path = self._segment_path(number)
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                events = [json.loads(line) for line in f]
+        with self._lock:
+            return events + self._sealing.get(number, [])
+
+    def _load_segment_index(self, number):
+        """Task ids and board members of a sealed segment, from its index file"""
+        path = self._index_path(number)
+        if not os.path.exists(path):
+            return None, None
+        with open(path) as f:
+            index = json.load(f)
+        if isinstance(index, list):
+            # Written before board indexes existed
+            return frozenset(index), None
+        return frozenset(index["tasks"]), index["boards"]
+
+    def _segment_ids(self, number):
+        ids = self._sealed_ids.get(number)
+        if ids is None:
+            ids, _ = self._load_segment_index(number)
+            if ids is None:
+                ids = frozenset(event["task"]["id"] for event in self._read_segment(number))
+            self._sealed_ids[number] = ids
+        return ids
+
+    def _read_board_segment(self, number, key):
+        """One board's events in a segment (hold ``_io_lock``)"""
+        with self._lock:
+            boards = self._segment_boards.get(number)
+        if boards is None:
+            _, boards = self._load_segment_index(number)
+            if boards is None:
+                # No board index (older history or a crash while sealing)
+                return [event for event in self._read_segment(number) if board_key(event["task"]) == key]
+            with self._lock:
+                self._segment_boards.setdefault(number, boards)
+        events = []
+        if boards.get(key):
+            with open(self._segment_path(number), "rb") as f:
+                for offset, length in boards[key]:
+                    f.seek(offset)
+                    payload = zlib.decompress(f.read(length), wbits=31).decode("utf-8")
+                    events += [json.loads(line) for line in payload.splitlines()]
+            events = [event for event in events if board_key(event["task"]) == key]
+        with self._lock:
+            return events + [event for event in self._sealing.get(number, []) if board_key(event["task"]) == key]
+
+    def _load_checkpoint(self, number):
+        with self._lock:
+            at = self._checkpoints[number]
+        with open(self._checkpoint_path(number, at), "rb") as f:
+            data = f.read()
+        tasks = []
+        for _, _, payload in gzip_members(data):
+            tasks += json.loads(payload)
+        return tasks
+
+    def _load_board_checkpoint(self, number, key):
+        """One board's tasks in a checkpoint, read from its own gzip member"""
+        with self._lock:
+            at = self._checkpoints[number]
+            index = self._checkpoint_boards.get(number)
+        if index is None:
+            index_path = self._checkpoint_index_path(number, at)
+            if not os.path.exists(index_path):
+                return [task for task in self._load_checkpoint(number) if board_key(task) == key]
+            with open(index_path) as f:
+                index = json.load(f)
+            with self._lock:
+                self._checkpoint_boards[number] = index
+                while len(self._checkpoint_boards) > 4:
+                    self._checkpoint_boards.popitem(last=False)
+        if key not in index:
+            return []
+        offset, length = index[key]
+        with open(self._checkpoint_path(number, at), "rb") as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length), wbits=31))
+
+    def task_history(self, task_id):
+        """Every event of one task, oldest first"""
+        with self._io_lock:
+            with self._lock:
+                active = self._active
+                pending = [event for event in self._pending if event["task"]["id"] == task_id]
+                numbers = sorted(self._checkpoints)
+            events = []
+            first = numbers[0] if numbers else active
+            for number in range(first, active + 1):
+                if number == active or task_id in self._segment_ids(number):
+                    events += [event for event in self._read_segment(number) if event["task"]["id"] == task_id]
+        return events + pending
+
+    def board_as_of(self, user_id, at):
+        """A board's tasks as of ``at`` (ms), or None if that predates the history"""
+        with self._io_lock:
+            with self._lock:
+                numbers = sorted(number for number, checkpoint_at in self._checkpoints.items() if checkpoint_at <= at)
+                active = self._active
+                pending = list(self._pending)
+            if not numbers:
+                return None
+            key = user_id or ""
+            start = numbers[-1]
+            tasks = self._load_board_checkpoint(start, key)
+            events = []
+            for number in range(start, active + 1):
+                if number > start and number in self._checkpoints:
+                    # Starts after ``at``; segments without a checkpoint
+                    # (a crash during rotation) are replayed through
+                    break
+                events += self._read_board_segment(number, key)
+            else:
+                events += [event for event in pending if board_key(event["task"]) == key]
+        return replay(tasks, events, at)
+
+    def stats(self):
+        with self._lock:
+            return {"segments": len(self._checkpoints), "active_segment": self._active, "events": self.events}
@@ -0,0 +1,290 @@
+"""
+Append-only write-ahead log with periodic snapshots for the task store.
+
+Every mutation appends one compact JSON line to the log instead of rewriting
+the whole backup file. A background thread fsyncs the log in groups, and
+every ``compact_every`` records the store is written out as a new snapshot
+(temp file + fsync + atomic rename) off the event loop, after which the log
+is truncated. On startup the snapshot is loaded and the log replayed on top.
+
+The files belong to one process: ``acquire()`` takes an exclusive lock on
+``<log>.lock`` so a second server (e.g. another ``uvicorn --workers``
+process) fails at startup instead of interleaving writes with the first.
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single process assumed
+    fcntl = None
+
+from metrics import io_timer
+
+logger = logging.getLogger(__name__)
+
+
+class TaskLog:
+    """Durability engine: snapshot file plus an append-only mutation log"""
+
+    def __init__(self, snapshot_path, log_path=None, fsync_interval=0.05, compact_every=1000):
+        self.snapshot_path = snapshot_path
+        self.log_path = log_path or os.path.splitext(snapshot_path)[0] + ".log"
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+        self.seq = 0
+        # Highest task version seen on load, so versions never go backwards
+        self.version = 0
+        self._since_compact = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._dirty = False
+        self._stop = threading.Event()
+        self._sync_thread = None
+        self._compact_thread = None
+        self._lock_file = None
+        # Length of the log's intact records, found by ``load``
+        self._valid_length = None
+
+    def acquire(self):
+        """Take the process lock on the log, or raise if another process holds it"""
+        if self._lock_file is not None or fcntl is None:
+            return
+        lock_file = open(self.log_path + ".lock", "a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"{self.log_path} is in use by another process; the memory backend "
+                "runs in a single process (use STORAGE_BACKEND=sqlite for multiple workers)"
+            ) from None
+        self._lock_file = lock_file
+
+    # --- startup -------------------------------------------------------
+
+    def load(self):
+        """Return (tasks, next_id) rebuilt from the snapshot and the log"""
+        tasks = {}
+        next_id = 1
+        snapshot_seq = 0
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                data = json.load(f)
+            for task in data.get("tasks", []):
+                tasks[int(task["id"])] = task
+            next_id = data.get("next_id", 1)
+            snapshot_seq = data.get("seq", 0)
+            version = data.get("version", 0)
+        else:
+            version = 0
+
+        self.seq = snapshot_seq
+        replayed = 0
+        valid_length = None
+        if os.path.exists(self.log_path):
+            valid_length = 0
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("unterminated record")
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn final write from a crash; everything before it
+                        # is intact and ``open`` cuts the rest off
+                        break
+                    valid_length += len(line)
+                    if entry["seq"] <= snapshot_seq:
+                        continue
+                    if entry["op"] == "put":
+                        tasks[int(entry["task"]["id"])] = entry["task"]
+                        version = max(version, entry["task"].get("version", 0))
+                    elif entry["op"] == "delete":
+                        tasks.pop(int(entry["id"]), None)
+                        version = max(version, entry.get("version", 0))
+                    next_id = max(next_id, entry.get("next_id", next_id))
+                    self.seq = entry["seq"]
+                    replayed += 1
+
+        self._since_compact = replayed
+        self.version = version
+        self._valid_length = valid_length
+        return list(tasks.values()), next_id
+
+    def open(self):
+        """Open the log for appending and start the group-fsync thread"""
+        if self._file is not None:
+            return
+        self._drop_torn_tail()
+        self._file = open(self.log_path, "a")
+        self._stop.clear()
+        self._sync_thread = threading.Thread(target=self._sync_loop, name="task-log-fsync", daemon=True)
+        self._sync_thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._sync_thread is not None:
+            self._sync_thread.join()
+            self._sync_thread = None
+        compact_thread = self._compact_thread
+        if compact_thread is not None:
+            compact_thread.join()
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    # --- mutations -----------------------------------------------------
+
+    def append_put(self, task, next_id):
+        self._append({"op": "put", "task": task, "next_id": next_id})
+
+    def append_delete(self, task_id, version=0):
+        self._append({"op": "delete", "id": task_id, "version": version})
+
+    def append_batch(self, entries, next_id):
+        """Append several mutations with one write
+
+        ``entries`` are ``("put", task)`` or ``("delete", task)`` tuples.
+        """
+        records = []
+        for op, task in entries:
+            if op == "put":
+                records.append({"op": "put", "task": task, "next_id": next_id})
+            else:
+                records.append({"op": "delete", "id": task["id"], "version": task.get("version", 0)})
+        self._append_many(records)
+
+    def should_compact(self):
+        return self._since_compact >= self.compact_every and self._compact_thread is None
+
+    def compact(self, tasks, next_id, version=0, background=True):
+        """Write a snapshot of ``tasks`` and truncate the log up to this point
+
+        ``tasks`` is a list of task dicts, or a function returning one that
+        is called in the background thread, so the store is not serialized
+        on the caller's thread. Either must hold every task as of now or
+        later: records appended from here on are kept in the log and
+        replayed on top of the snapshot, which repairs any newer state it
+        caught.
+        """
+        with self._lock:
+            seq = self.seq
+            self._since_compact = 0
+        if not background:
+            self._write_snapshot(tasks, next_id, version, seq)
+            return
+        if self._compact_thread is not None and self._compact_thread.is_alive():
+            return
+        self._compact_thread = threading.Thread(
+            target=self._write_snapshot,
+            args=(tasks, next_id, version, seq),
+            name="task-log-compact",
+            daemon=True,
+        )
+        self._compact_thread.start()
+
+    # --- internals -----------------------------------------------------
+
+    def _drop_torn_tail(self):
+        """Truncate the log after its last intact record
+
+        Otherwise new records would be appended to the torn fragment and
+        replay would stop there on every later start, losing them all.
+        """
+        if self._valid_length is None or not os.path.exists(self.log_path):
+            return
+        size = os.path.getsize(self.log_path)
+        if size <= self._valid_length:
+            return
+        logger.warning("Dropping %d bytes of torn records from %s", size - self._valid_length, self.log_path)
+        with open(self.log_path, "r+b") as f:
+            f.truncate(self._valid_length)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _append(self, entry):
+        self._append_many([entry])
+
+    def _append_many(self, entries):
+        with self._lock:
+            lines = []
+            for entry in entries:
+                self.seq += 1
+                entry["seq"] = self.seq
+                lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file.write("".join(lines))
+            self._dirty = True
+            self._since_compact += len(entries)
+
+    def _sync(self):
+        if self._dirty and self._file is not None:
+            with io_timer("file", "fsync"):
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                with self._lock:
+                    self._sync()
+            except Exception as e:
+                logger.error("Error syncing task log: %s", e)
+
+    def _write_snapshot(self, tasks, next_id, version, seq):
+        try:
+            with io_timer("file", "snapshot"):
+                if callable(tasks):
+                    tasks = tasks()
+                tmp_path = self.snapshot_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    json.dump({
+                        "tasks": tasks,
+                        "next_id": next_id,
+                        "version": version,
+                        "seq": seq,
+                        "last_updated": datetime.now().isoformat()
+                    }, f, separators=(",", ":"))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+                self._truncate_log(seq)
+        except Exception as e:
+            logger.error("Error writing task snapshot: %s", e)
+        finally:
+            self._compact_thread = None
+
+    def _truncate_log(self, seq):
+        """Drop log records already covered by the snapshot at ``seq``"""
+        with self._lock:
+            if self._file is None:
+                return
+            self._sync()
+            with open(self.log_path, "r") as f:
+                tail = [line for line in f if _entry_seq(line) > seq]
+            tmp_path = self.log_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.writelines(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.log_path)
+            self._file = open(self.log_path, "a")
+
+
+def _entry_seq(line):
+    try:
+        return json.loads(line)["seq"]
+    except (ValueError, KeyError):
+        return 0
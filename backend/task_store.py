@@ -0,0 +1,395 @@
+"""
+Indexed in-memory task storage used by the FastAPI backend.
+
+Tasks are kept in a primary ``id -> TaskRecord`` map with secondary indexes
+by ``userId`` and by ``(userId, column)``, so lookups, updates and deletes are
+O(1) and listing a board only touches that user's tasks.
+
+Every mutation is stamped with a store-wide, monotonically increasing
+version. Each board keeps a change log (task id -> version of its latest
+change, deletes included as tombstones) so ``changes_since`` costs
+O(changes) rather than O(board). The log is capped per board; versions that
+fall off it raise the board's horizon, and clients older than the horizon
+must refetch the full board.
+
+A per-board full-text index (search_index.py) is built on a board's first
+search and maintained by the same mutations afterwards.
+
+Each ``(userId, column)`` also keeps its cards sorted by ``position`` (see
+positions.py), so a column is listed in board order without sorting and a
+move only re-files the one card.
+"""
+
+import heapq
+import time
+from collections import OrderedDict
+
+from fast_json import dumps
+from positions import ColumnOrder, key_between, place, spaced_keys
+from search_index import SearchIndex
+
+
+class TaskRecord:
+    """Compact task record (replaces the raw dicts previously kept in tasks_db)"""
+
+    __slots__ = ("id", "text", "column", "userId", "version", "updatedAt", "position", "_json")
+
+    def __init__(self, id, text, column, userId=None, version=0, updatedAt=None, position=None):
+        self.id = id
+        self.text = text
+        self.column = column
+        self.userId = userId
+        self.version = version
+        self.updatedAt = updatedAt
+        self.position = position
+        self._json = None
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            id=int(data["id"]),
+            text=data.get("text", ""),
+            column=data.get("column", "Planning"),
+            userId=data.get("userId"),
+            version=data.get("version", 0),
+            updatedAt=data.get("updatedAt"),
+            position=data.get("position"),
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "text": self.text,
+            "column": self.column,
+            "userId": self.userId,
+            "version": self.version,
+            "updatedAt": self.updatedAt,
+            "position": self.position,
+        }
+
+    def to_json(self):
+        """``to_dict()`` encoded as JSON bytes, cached until the record changes"""
+        if self._json is None:
+            self._json = dumps(self.to_dict())
+        return self._json
+
+    def __repr__(self):
+        return f"TaskRecord({self.to_dict()!r})"
+
+
+class TaskStore:
+    """Task store with a primary id map and per-user / per-column indexes"""
+
+    def __init__(self, change_log_limit=1000, search_boards=1000):
+        self._tasks = {}
+        self._by_user = {}
+        # userId -> column -> {id: TaskRecord}
+        self._by_board = {}
+        # userId -> column -> ColumnOrder (cards by position)
+        self._order = {}
+        # column -> live tasks in that column across all boards
+        self._column_totals = {}
+        # userId -> OrderedDict(task id -> version), oldest change first
+        self._changes = {}
+        # userId -> newest version no longer covered by the change log
+        self._horizon = {}
+        self.change_log_limit = change_log_limit
+        self.search_index = SearchIndex(max_boards=search_boards)
+        self.version = 0
+        self._base_version = 0
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def __iter__(self):
+        return iter(list(self._tasks.values()))
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def add(self, record, track=True):
+        """Insert a task; ``track=False`` keeps the record's own version
+
+        (used when loading tasks that already exist elsewhere).
+        """
+        if record.id in self._tasks:
+            self._unindex(self._tasks[record.id])
+        self._index(record)
+        if track:
+            self._record_change(record)
+        else:
+            self.version = max(self.version, record.version)
+        return record
+
+    def update(self, task_id, text=None, column=None, position=None):
+        """Apply the given fields; a card moved to another column without a
+        ``position`` goes to the end of it"""
+        record = self._tasks.get(task_id)
+        if record is None or (text is None and column is None and position is None):
+            return record
+        if text is not None:
+            record.text = text
+            self.search_index.add(record.userId, record.id, text)
+        moved = column is not None and column != record.column
+        if moved or (position is not None and position != record.position):
+            self._unindex_board(record)
+            if moved:
+                record.column = column
+            record.position = position
+            self._index_board(record)
+        self._record_change(record)
+        return record
+
+    def place(self, user_id, column, after=None, before=None, moving=None):
+        """Position for ``moving`` between the cards ``after`` and ``before``
+        of a column (see ``positions.place``); raises ValueError for bad neighbours"""
+        def position_of(task_id):
+            record = self._tasks.get(task_id)
+            if record is None or record.userId != user_id or record.column != column or task_id == moving:
+                raise ValueError(f"task {task_id} is not a card in column {column!r}")
+            return record.position
+
+        order = self._order.get(user_id, {}).get(column, ColumnOrder())
+        return place(order, position_of, after, before, moving)
+
+    def rebalance(self, user_id, column):
+        """Give every card of a column a short, evenly spaced position
+
+        Order is preserved; each card is a change (new version). Returns the
+        rewritten records.
+        """
+        order = self._order.get(user_id, {}).get(column)
+        if order is None:
+            return []
+        records = [self._tasks[task_id] for task_id in order.ids()]
+        for record, position in zip(records, spaced_keys(len(records))):
+            record.position = position
+            self._record_change(record)
+        order.keys = [(record.position, record.id) for record in records]
+        return records
+
+    def remove(self, task_id):
+        """Delete a task; the returned record carries the tombstone version"""
+        record = self._tasks.get(task_id)
+        if record is None:
+            return None
+        self._unindex(record)
+        self._record_change(record)
+        return record
+
+    def remove_user(self, user_id):
+        """Drop every task of ``user_id`` from memory; returns how many"""
+        self._horizon[user_id] = self.board_version(user_id)
+        self._changes.pop(user_id, None)
+        user_tasks = self._by_user.pop(user_id, {})
+        for task_id in user_tasks:
+            del self._tasks[task_id]
+        for column, tasks in self._by_board.pop(user_id, {}).items():
+            self._count_column(column, -len(tasks))
+        self._order.pop(user_id, None)
+        self.search_index.drop(user_id)
+        return len(user_tasks)
+
+    def board_version(self, user_id):
+        """Version of the latest change to a board (usable as an ETag)"""
+        changes = self._changes.get(user_id)
+        if changes:
+            return next(reversed(changes.values()))
+        return max(self._horizon.get(user_id, 0), self._base_version)
+
+    def changes_since(self, user_id, since):
+        """Return (changed records, deleted ids) after ``since``
+
+        Returns None when ``since`` predates what the change log still
+        covers, in which case the caller must send the full board.
+        """
+        floor = max(self._horizon.get(user_id, 0), self._base_version)
+        if since < floor:
+            return None
+        changed = []
+        deleted = []
+        for task_id, version in reversed(self._changes.get(user_id, {}).items()):
+            if version <= since:
+                break
+            record = self._tasks.get(task_id)
+            if record is None:
+                deleted.append(task_id)
+            else:
+                changed.append(record)
+        return changed, deleted
+
+    def list_user(self, user_id):
+        return list(self._by_user.get(user_id, {}).values())
+
+    def list_column(self, user_id, column):
+        return list(self._by_board.get(user_id, {}).get(column, {}).values())
+
+    def page(self, user_id, column=None, limit=None, cursor=None):
+        """Return up to ``limit`` of a user's tasks after ``cursor``
+
+        A board is listed in id order (``cursor`` is the last id seen), a
+        single column in position order (``cursor`` is the last
+        ``(position, id)`` seen). Only the user's (or the user's column's)
+        index is touched.
+        """
+        if column is not None:
+            order = self._order.get(user_id, {}).get(column)
+            if order is None:
+                return []
+            return [self._tasks[task_id] for task_id in order.ids(cursor, limit)]
+        tasks = self._by_user.get(user_id, {}).values()
+        if cursor is not None:
+            tasks = (record for record in tasks if record.id > cursor)
+        if limit is None:
+            return sorted(tasks, key=_record_id)
+        return heapq.nsmallest(limit, tasks, key=_record_id)
+
+    def stale(self, column, updated_before, limit=None):
+        """Tasks in ``column`` on any board last changed before ``updated_before`` (ms)
+
+        Records without an ``updatedAt`` (older backups) are never stale.
+        """
+        found = []
+        for board in self._by_board.values():
+            for record in board.get(column, {}).values():
+                if record.updatedAt is not None and record.updatedAt < updated_before:
+                    found.append(record)
+                    if limit is not None and len(found) >= limit:
+                        return found
+        return found
+
+    def search(self, user_id, query, limit):
+        """Return ``(record, score)`` pairs matching ``query``, best first"""
+        if user_id not in self.search_index:
+            tasks = self._by_user.get(user_id, {})
+            self.search_index.build(user_id, ((task_id, record.text) for task_id, record in tasks.items()))
+        board_size = len(self._by_user.get(user_id, ()))
+        results = self.search_index.search(user_id, query, limit, board_size)
+        return [(self._tasks[task_id], score) for task_id, score in results]
+
+    def column_counts(self, user_id):
+        return {
+            column: len(tasks)
+            for column, tasks in self._by_board.get(user_id, {}).items()
+        }
+
+    def column_totals(self):
+        """Live tasks per column across every board"""
+        return dict(self._column_totals)
+
+    def users(self):
+        return list(self._by_user.keys())
+
+    def clear(self):
+        self._tasks.clear()
+        self._by_user.clear()
+        self._by_board.clear()
+        self._order.clear()
+        self._column_totals.clear()
+        self._changes.clear()
+        self._horizon.clear()
+        self.search_index.clear()
+
+    def load(self, tasks, version=0):
+        """Replace the store contents with the given task dicts
+
+        Changes made before the load are not in the change log, so every
+        board's horizon moves up to the loaded version.
+        """
+        self.clear()
+        self.version = version
+        for data in tasks:
+            self.add(TaskRecord.from_dict(data), track=False)
+        self._base_version = self.version
+
+    def to_dicts(self):
+        return [record.to_dict() for record in self._tasks.values()]
+
+    def records(self):
+        """Shallow copy of the current records (O(n) pointer copy, no serializing)
+
+        Records keep changing in place afterwards; a snapshot built from
+        them later is still correct as long as every such change is logged
+        after the point the copy was taken (``TaskLog.compact``).
+        """
+        return list(self._tasks.values())
+
+    def _index(self, record):
+        self._tasks[record.id] = record
+        self._by_user.setdefault(record.userId, {})[record.id] = record
+        self._index_board(record)
+        self.search_index.add(record.userId, record.id, record.text)
+
+    def _index_board(self, record):
+        """File a record under its column; without a position it goes last"""
+        order = self._order.setdefault(record.userId, {}).get(record.column)
+        if order is None:
+            order = self._order[record.userId][record.column] = ColumnOrder()
+        if record.position is None:
+            record.position = key_between(order.last_position(), None)
+        order.add(record.position, record.id)
+        self._board_column(record.userId, record.column)[record.id] = record
+        self._count_column(record.column, 1)
+
+    def _unindex(self, record):
+        self._tasks.pop(record.id, None)
+        self.search_index.remove(record.userId, record.id)
+        user_tasks = self._by_user.get(record.userId)
+        if user_tasks is not None:
+            user_tasks.pop(record.id, None)
+            if not user_tasks:
+                del self._by_user[record.userId]
+        self._unindex_board(record)
+
+    def _record_change(self, record):
+        self.version += 1
+        record.version = self.version
+        record.updatedAt = int(time.time() * 1000)
+        record._json = None
+        changes = self._changes.get(record.userId)
+        if changes is None:
+            changes = self._changes[record.userId] = OrderedDict()
+        changes.pop(record.id, None)
+        changes[record.id] = record.version
+        if len(changes) > self.change_log_limit:
+            # Compact: forget the oldest change (live task or tombstone)
+            _, version = changes.popitem(last=False)
+            self._horizon[record.userId] = version
+
+    def _board_column(self, user_id, column):
+        return self._by_board.setdefault(user_id, {}).setdefault(column, {})
+
+    def _unindex_board(self, record):
+        board = self._by_board.get(record.userId)
+        if board is None:
+            return
+        tasks = board.get(record.column)
+        if tasks is not None:
+            if tasks.pop(record.id, None) is not None:
+                self._count_column(record.column, -1)
+            if not tasks:
+                del board[record.column]
+        if not board:
+            del self._by_board[record.userId]
+        columns = self._order.get(record.userId)
+        order = columns.get(record.column) if columns else None
+        if order is not None:
+            order.remove(record.position, record.id)
+            if not order:
+                del columns[record.column]
+                if not columns:
+                    del self._order[record.userId]
+
+    def _count_column(self, column, delta):
+        total = self._column_totals.get(column, 0) + delta
+        if total:
+            self._column_totals[column] = total
+        else:
+            self._column_totals.pop(column, None)
+
+
+def _record_id(record):
+    return record.id
@@ -0,0 +1,161 @@
+"""
+Bulk import and export of a board as NDJSON or CSV.
+
+``GET /tasks/export`` streams a board page by page (``EXPORT_PAGE_SIZE``
+tasks per backend read, default 1000), so memory stays flat whatever the
+board size. ``POST /tasks/import`` parses the request body as it arrives,
+validates rows and creates them through ``TaskBackend.batch`` in chunks of
+``IMPORT_BATCH`` (default 500, at most the backend's
+``max_batch_operations``): one log write, SQLite transaction or Firestore
+batch per chunk instead of one per card. Imported cards get new
+ids and are appended to their columns in file order.
+
+The import answers with NDJSON progress lines as it goes (a
+``{"imported", "rejected"}`` line every ``IMPORT_PROGRESS_EVERY`` rows), a
+line per rejected row (the first ``MAX_IMPORT_ERRORS``) and a final line
+with ``"done": true``. Chunks already committed stay if the import fails
+part way; the final line then has ``"done": false`` and the error.
+
+Rows need a non-empty ``text``; ``column`` defaults to ``Planning``. Other
+fields (such as the ids, versions and positions of an export) are ignored,
+so an export can be imported into another board as is. A CSV needs a
+header row naming its columns.
+"""
+
+import codecs
+import csv
+import io
+import json
+import os
+
+from starlette.responses import StreamingResponse
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH", "500"))
+IMPORT_PROGRESS_EVERY = int(os.getenv("IMPORT_PROGRESS_EVERY", "10000"))
+MAX_IMPORT_ERRORS = 100
+EXPORT_FIELDS = ("id", "text", "column", "userId", "position", "version", "updatedAt")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def transfer_format(requested, content_type=None):
+    """``ndjson`` or ``csv``: the ``format`` parameter, else the body's content type"""
+    if requested is not None:
+        return requested
+    if content_type and content_type.split(";")[0].strip().lower() in ("text/csv", "application/csv"):
+        return "csv"
+    return "ndjson"
+
+
+# --- export --------------------------------------------------------------
+
+async def export_ndjson(pages):
+    async for tasks in pages:
+        yield "".join(json.dumps(task, separators=(",", ":")) + "\n" for task in tasks).encode("utf-8")
+
+
+async def export_csv(pages):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, EXPORT_FIELDS, extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    async for tasks in pages:
+        writer.writerows(tasks)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def export_stream(pages, fmt):
+    return export_csv(pages) if fmt == "csv" else export_ndjson(pages)
+
+
+# --- import --------------------------------------------------------------
+
+async def iter_lines(chunks):
+    """Text lines (with their newline) of a byte stream; UTF-8, BOM dropped"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        # Only "\n" ends a line: JSON strings may hold other line separators
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def ndjson_rows(lines):
+    """``(row number, row or ValueError)`` per non-blank line"""
+    number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, ValueError(f"invalid JSON: {e}")
+            continue
+        yield number, row if isinstance(row, dict) else ValueError("row must be a JSON object")
+
+
+async def csv_rows(lines):
+    """``(row number, row dict)`` per record after the header; quoted fields may span lines"""
+    header = None
+    number = 0
+    record = []
+    quotes = 0
+    async for line in lines:
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            # Inside a quoted field that continues on the next line
+            continue
+        values = next(csv.reader(record), [])
+        record, quotes = [], 0
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            if "text" not in header:
+                raise ValueError("the CSV header has no text column")
+            continue
+        number += 1
+        yield number, dict(zip(header, values))
+    if record:
+        yield number + 1, ValueError("unterminated quoted field")
+
+
+def import_rows(lines, fmt):
+    return csv_rows(lines) if fmt == "csv" else ndjson_rows(lines)
+
+
+def progress_line(values):
+    return (json.dumps(values, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class ProgressResponse(StreamingResponse):
+    """Streamed response that may be sent while the request body is still
+    being read: it doesn't listen for a disconnect, which would consume the
+    body's messages"""
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def import_row(row):
+    """``(text, column)`` of a row, or ValueError"""
+    text = row.get("text")
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text is required")
+    column = row.get("column")
+    if column is None or column == "":
+        column = "Planning"
+    if not isinstance(column, str):
+        raise ValueError("column must be a string")
+    return text, column
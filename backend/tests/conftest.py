@@ -0,0 +1,42 @@
+"""Shared fixtures: fresh backends on temporary files and an API client per backend"""
+
+import os
+
+import pytest
+
+# main reads these on import: every test client shares one address, so
+# rate limits would only get in the way
+os.environ.setdefault("RATE_LIMIT_READ_RATE", "0")
+os.environ.setdefault("RATE_LIMIT_WRITE_RATE", "0")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+
+BACKENDS = ("memory", "sqlite", "firestore")
+
+
+def make_test_backend(kind):
+    """A backend on the current directory; Firestore gets the in-memory fake"""
+    if kind == "firestore":
+        from fake_firestore import FakeFirestore, transactional
+        from firestore_backend import FirestoreBackend
+        from id_allocator import CounterBlockAllocator
+        db = FakeFirestore()
+        return FirestoreBackend(db, allocator=CounterBlockAllocator(db, transactional=transactional))
+    from storage import make_backend
+    return make_backend(kind)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend_kind(request):
+    return request.param
+
+
+@pytest.fixture
+def api(backend_kind, tmp_path, monkeypatch):
+    """TestClient for the app running on a fresh ``backend_kind`` backend"""
+    monkeypatch.chdir(tmp_path)
+    from fastapi.testclient import TestClient
+    import main
+    monkeypatch.setattr(main, "backend", make_test_backend(backend_kind))
+    with TestClient(main.app) as client:
+        yield client
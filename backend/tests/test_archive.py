@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from conftest import make_test_backend
+from firestore_backend import FIREBASE_COLLECTION
+
+
+def test_firestore_archives_more_cards_than_one_write_batch_holds():
+    backend = make_test_backend("firestore")
+    docs = backend.db._docs(FIREBASE_COLLECTION)
+    for task_id in range(1, 401):
+        docs[str(task_id)] = {"id": task_id, "text": f"card {task_id}", "column": "Done", "userId": "u",
+                              "position": None, "version": task_id, "updatedAt": task_id}
+
+    async def archive_all():
+        archived = 0
+        while True:
+            tasks = await backend.archive_done("Done", updated_before=1000)
+            if not tasks:
+                return archived
+            archived += len(tasks)
+
+    assert asyncio.run(archive_all()) == 400
+    tasks, _ = asyncio.run(backend.list_board("u"))
+    assert tasks == []
+    archived, _ = asyncio.run(backend.list_archive("u"))
+    assert len(archived) == 400
+
+
+def archived_memory_backend(boards):
+    """A started memory backend with ``{user: cards}`` archived from Done"""
+    backend = make_test_backend("memory")
+
+    async def setup():
+        await backend.start()
+        for user_id, cards in boards.items():
+            for i in range(cards):
+                await backend.create(f"{user_id} {i}", "Done", user_id)
+        while await backend.archive_done("Done", updated_before=2 ** 62):
+            pass
+
+    asyncio.run(setup())
+    return backend
+
+
+def test_memory_archive_pages_one_user(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = archived_memory_backend({"a": 7, "b": 5})
+    seen, cursor = [], None
+    while True:
+        page, cursor = asyncio.run(backend.list_archive("a", limit=3, cursor=cursor))
+        seen += [task["text"] for _, task in page]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(f"a {i}" for i in range(7))
+    assert len(set(seen)) == 7
+
+
+def test_memory_restore_keeps_card_archived_if_the_board_fails_to_load(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = archived_memory_backend({"a": 1})
+    (_, task), = asyncio.run(backend.list_archive("a"))[0]
+
+    async def unavailable(user_id):
+        raise RuntimeError("Firestore unavailable")
+
+    backend.ensure_board = unavailable
+    with pytest.raises(RuntimeError):
+        asyncio.run(backend.restore(task["id"]))
+    assert [t["id"] for _, t in asyncio.run(backend.list_archive("a"))[0]] == [task["id"]]
+
+    del backend.ensure_board
+    assert asyncio.run(backend.restore(task["id"]))["id"] == task["id"]
+    assert asyncio.run(backend.list_archive("a"))[0] == []
+
+
+def test_memory_card_changed_while_archiving_stays_active(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    backend = archived_memory_backend({})
+    task = asyncio.run(backend.create("card", "Done", "a"))
+    append = backend.archive.append
+
+    def edited_meanwhile(entries):
+        append(entries)
+        backend.archive.append = append
+        backend.store.update(task["id"], text="edited")
+
+    backend.archive.append = edited_meanwhile
+    assert asyncio.run(backend.archive_done("Done", updated_before=2 ** 62)) == []
+    assert backend.store.get(task["id"]).text == "edited"
+    assert asyncio.run(backend.list_archive("a"))[0] == []
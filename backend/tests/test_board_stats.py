@@ -0,0 +1,37 @@
+import asyncio
+
+from board_stats import STATS_DONE_COLUMN, STATS_START_COLUMN, BoardStatsRegistry
+
+
+def card(column, version):
+    return {"id": 1, "userId": "team", "text": "card", "column": column, "version": version}
+
+
+def test_update_after_restart_seeds_the_board():
+    board = {1: card(STATS_START_COLUMN, 1)}
+
+    async def run():
+        listed = asyncio.Event()
+
+        async def load_board(user_id):
+            listing = list(board.values())
+            listed.set()
+            await asyncio.sleep(0)
+            return listing
+
+        registry = BoardStatsRegistry(load_board=load_board)
+        # A text edit of a card from before the restart starts the seed
+        board[1] = card(STATS_START_COLUMN, 2)
+        registry.observe("updated", board[1])
+        await listed.wait()
+        # The move arrives while the listing is in flight
+        board[1] = card(STATS_DONE_COLUMN, 3)
+        registry.observe("updated", board[1])
+        await asyncio.gather(*registry._seeding)
+        return registry.board("team")
+
+    stats = asyncio.run(run())
+    assert stats.seeded
+    assert stats.counts == {STATS_DONE_COLUMN: 1}
+    (_, bucket), = stats.days.items()
+    assert (bucket.moved, bucket.completed) == (1, 1)
@@ -0,0 +1,26 @@
+"""Cold-start budget, measured the way bench_coldstart.py reports it"""
+
+import os
+
+import pytest
+
+import bench_coldstart
+
+# Generous: this guards against blocking work creeping back into import or
+# startup (a Firebase connection alone takes seconds), not against jitter
+BUDGET_SECONDS = float(os.getenv("COLD_START_BUDGET", "10"))
+
+
+@pytest.mark.parametrize("backend_kind", ["memory", "sqlite", "firestore"])
+def test_import_fits_the_budget(backend_kind):
+    seconds, modules = bench_coldstart.import_times(backend_kind)
+    assert seconds < BUDGET_SECONDS
+    assert any(name == "main" for _, name in modules)
+
+
+@pytest.mark.parametrize("backend_kind", ["memory", "sqlite", "firestore"])
+def test_first_response_fits_the_budget(backend_kind):
+    bound, healthy, answered, status = bench_coldstart.serve_times(backend_kind)
+    assert bound <= healthy <= answered < BUDGET_SECONDS
+    # Without credentials Firestore stays unavailable, but /health still answers
+    assert status == 200 or (backend_kind == "firestore" and status == 503)
@@ -0,0 +1,56 @@
+import argparse
+import asyncio
+import json
+
+import main
+import stress_moves
+from bench_api import AsgiClient
+from conftest import make_test_backend
+
+
+def test_stale_if_match_is_rejected_with_the_current_task(api):
+    task = api.post("/tasks", json={"text": "card", "userId": "u"}).json()
+    stale = f'"{task["version"]}"'
+
+    moved = api.put(f"/tasks/{task['id']}", json={"column": "Done"}, headers={"If-Match": stale})
+    assert moved.status_code == 200
+    assert moved.headers["ETag"] == f'"{moved.json()["version"]}"' != stale
+
+    conflict = api.put(f"/tasks/{task['id']}", json={"text": "lost"}, headers={"If-Match": stale})
+    assert conflict.status_code == 412
+    assert conflict.json()["detail"]["task"] == moved.json()
+    assert conflict.headers["ETag"] == moved.headers["ETag"]
+
+    assert api.delete(f"/tasks/{task['id']}", headers={"If-Match": stale}).status_code == 412
+    assert api.delete(f"/tasks/{task['id']}", headers={"If-Match": moved.headers["ETag"]}).status_code == 200
+
+
+def test_unconditional_update_still_applies(api):
+    task = api.post("/tasks", json={"text": "card", "userId": "u"}).json()
+    assert api.put(f"/tasks/{task['id']}", json={"text": "edited"}).json()["text"] == "edited"
+    assert api.put(f"/tasks/{task['id']}", json={"text": "x"}, headers={"If-Match": "v1"}).status_code == 400
+
+
+def test_concurrent_moves_lose_no_updates(backend_kind, tmp_path, monkeypatch):
+    """stress_moves.py on a smaller scale: racing conditional moves of few cards"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "backend", make_test_backend(backend_kind))
+    args = argparse.Namespace(cards=5, moves=400, concurrency=40, seed=1, if_match=True)
+
+    async def run():
+        client = AsgiClient(main.app)
+        await main.app.router.startup()
+        try:
+            ids = await stress_moves.create_board(client, args.cards)
+            counts = await stress_moves.move_cards(client, ids, args)
+            status, body = await client.request("GET", f"/tasks?userId={stress_moves.BOARD}")
+            return counts, stress_moves.check_board(json.loads(body), ids, counts["moves"])
+        finally:
+            await main.app.router.shutdown()
+
+    counts, problems = asyncio.run(run())
+    assert problems == []
+    assert counts["errors"] == 0
+    assert counts["moves"] == args.moves
+    # Few cards, many clients: the races did happen
+    assert counts["conflicts"] > 0
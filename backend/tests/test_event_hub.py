@@ -0,0 +1,40 @@
+import event_hub
+from event_hub import BoardEventHub
+
+
+def test_boards_nobody_watches_are_capped():
+    hub = BoardEventHub(history_size=4, idle_boards=3)
+    for i in range(10):
+        hub.publish(f"board-{i}", "created", {})
+    assert hub.stats()["boards"] == 3
+
+
+def test_watched_boards_are_kept():
+    hub = BoardEventHub(history_size=4, idle_boards=1)
+    subscription = hub.subscribe("watched")
+    for i in range(5):
+        hub.publish(f"board-{i}", "created", {})
+    hub.publish("watched", "created", {})
+    assert subscription.queue.qsize() == 1
+    assert "watched" in hub._boards
+
+
+def test_idle_board_expires_and_resume_resets(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(event_hub.time, "monotonic", lambda: now[0])
+    hub = BoardEventHub(history_size=4, idle_ttl=60)
+    subscription = hub.subscribe("team")
+    hub.publish("team", "created", {})
+    hub.unsubscribe(subscription)
+
+    # A quick reconnect resumes from the buffer
+    now[0] += 30
+    resumed = hub.subscribe("team", since=0)
+    assert resumed.queue.get_nowait()["type"] == "created"
+    hub.unsubscribe(resumed)
+
+    now[0] += 61
+    hub.publish("other", "created", {})
+    assert "team" not in hub._boards
+    late = hub.subscribe("team", since=1)
+    assert late.queue.get_nowait()["type"] == "reset"
@@ -0,0 +1,50 @@
+import asyncio
+import json
+
+import pytest
+
+from conftest import make_test_backend
+from firestore_backend import MAX_BATCH_WRITES
+from storage import BatchError
+
+
+def creates(count, user_id="u"):
+    from main import BatchOperation
+    return [BatchOperation(op="create", text=f"card {i}", userId=user_id) for i in range(count)]
+
+
+def test_largest_batch_fits_one_write_batch():
+    backend = make_test_backend("firestore")
+    size = backend.max_batch_operations
+    assert size * 2 <= MAX_BATCH_WRITES
+    results = asyncio.run(backend.batch(creates(size)))
+    assert len(results) == size
+    tasks, _ = asyncio.run(backend.list_board("u"))
+    assert len(tasks) == size
+
+
+def test_oversized_batch_is_rejected_before_writing():
+    backend = make_test_backend("firestore")
+    with pytest.raises(BatchError) as error:
+        asyncio.run(backend.batch(creates(backend.max_batch_operations + 1)))
+    assert error.value.status == 400
+    tasks, _ = asyncio.run(backend.list_board("u"))
+    assert tasks == []
+
+
+@pytest.mark.parametrize("backend_kind", ["firestore"])
+def test_batch_endpoint_reports_the_limit(api):
+    operations = [{"op": "create", "text": f"card {i}", "userId": "u"} for i in range(300)]
+    response = api.post("/tasks/batch", json={"operations": operations})
+    assert response.status_code == 400
+    response = api.post("/tasks/batch", json={"operations": operations[:250]})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("backend_kind", ["firestore"])
+def test_import_chunks_fit_firestore_batches(api):
+    body = "".join(json.dumps({"text": f"card {i}"}) + "\n" for i in range(1200))
+    response = api.post("/tasks/import?userId=u&format=ndjson", content=body)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1] == {"done": True, "imported": 1200, "rejected": 0}
+    assert len(api.get("/tasks?userId=u").json()) == 1200
@@ -0,0 +1,24 @@
+import pytest
+
+from firestore_backend import FirestoreBackend
+from id_allocator import make_allocator
+
+
+def test_snowflake_requires_worker_id(monkeypatch):
+    monkeypatch.setenv("ID_ALLOCATOR", "snowflake")
+    monkeypatch.delenv("WORKER_ID", raising=False)
+    with pytest.raises(ValueError, match="WORKER_ID"):
+        make_allocator(None)
+    # Before Firebase connects, i.e. at startup
+    with pytest.raises(ValueError, match="WORKER_ID"):
+        FirestoreBackend(None)
+
+
+def test_snowflake_uses_worker_id(monkeypatch):
+    monkeypatch.setenv("ID_ALLOCATOR", "snowflake")
+    monkeypatch.setenv("WORKER_ID", "7")
+    allocator = make_allocator(None)
+    assert allocator.worker_id == 7
+    monkeypatch.setenv("WORKER_ID", "64")
+    with pytest.raises(ValueError):
+        make_allocator(None)
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+import pytest
+
+import main
+from idempotency import ResponseCache, StoredResponse
+
+
+def stored():
+    return StoredResponse("fingerprint", 200, [], b"{}", time.time() + 60)
+
+
+def create(api, key):
+    return api.post("/tasks", json={"text": "card", "userId": "u"}, headers={"Idempotency-Key": key})
+
+
+def test_retry_is_replayed(api, backend_kind):
+    # The app's response cache outlives each test's backend
+    first = create(api, f"replayed-{backend_kind}")
+    retry = create(api, f"replayed-{backend_kind}")
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert len(api.get("/tasks?userId=u").json()) == 1
+
+
+@pytest.mark.parametrize("backend_kind", ["memory"])
+def test_key_is_durable_before_the_response(api):
+    first = create(api, "durable-create")
+    # What a process that crashed right after answering would load
+    restarted = ResponseCache(main.response_cache.path)
+    restarted.load()
+    stored = restarted._entries["durable-create"]
+    assert stored.status == 200 and stored.body == first.content
+
+
+def test_torn_log_record_is_dropped(tmp_path):
+    path = str(tmp_path / "keys.json")
+    cache = ResponseCache(path)
+    asyncio.run(cache.put("a", stored()))
+    with open(cache.journal_path, "ab") as f:
+        f.write(b'["b", [')
+    restarted = ResponseCache(path)
+    restarted.load()
+    asyncio.run(restarted.put("c", stored()))
+    again = ResponseCache(path)
+    again.load()
+    assert list(again._entries) == ["a", "c"]
+
+
+def test_save_drops_covered_log_records(tmp_path):
+    path = str(tmp_path / "keys.json")
+    cache = ResponseCache(path)
+    asyncio.run(cache.put("a", stored()))
+    snapshot = cache.snapshot()
+    asyncio.run(cache.put("b", stored()))
+    cache.save(snapshot)
+    with open(cache.journal_path, "rb") as f:
+        assert f.read().startswith(b'["b"')
+    restarted = ResponseCache(path)
+    restarted.load()
+    assert list(restarted._entries) == ["a", "b"]
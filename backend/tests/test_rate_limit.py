@@ -0,0 +1,59 @@
+import asyncio
+
+from rate_limit import RateLimiter, RateLimitMiddleware
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def call(middleware, method="POST", path="/tasks", query=b"", client="10.0.0.1", forwarded=None):
+    scope = {"type": "http", "method": method, "path": path, "query_string": query,
+             "client": (client, 1234), "headers": []}
+    if forwarded is not None:
+        scope["headers"].append((b"x-forwarded-for", forwarded.encode()))
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    asyncio.run(middleware(scope, None, send))
+    return statuses[0]
+
+
+def limited(trust_proxy=0):
+    return RateLimitMiddleware(ok_app, read=RateLimiter(1, 2), write=RateLimiter(1, 2), trust_proxy=trust_proxy)
+
+
+def test_switching_boards_does_not_reset_the_client_limit():
+    middleware = limited()
+    statuses = [call(middleware, method="GET", query=f"userId=board-{i}".encode()) for i in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_one_address_cannot_exhaust_another_clients_board():
+    middleware = limited()
+    statuses = [call(middleware, query=b"userId=victim", client="6.6.6.6") for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert call(middleware, query=b"userId=victim", client="10.0.0.1") == 200
+
+
+def test_clients_behind_a_trusted_proxy_get_their_own_buckets():
+    middleware = limited(trust_proxy=1)
+    for client in ("1.1.1.1", "2.2.2.2"):
+        assert [call(middleware, client="10.9.9.9", forwarded=client) for _ in range(2)] == [200, 200]
+    assert call(middleware, client="10.9.9.9", forwarded="1.1.1.1") == 429
+
+
+def test_forged_forwarded_entries_are_ignored():
+    middleware = limited(trust_proxy=1)
+    statuses = [call(middleware, client="10.9.9.9", forwarded=f"6.6.6.{i}, 1.1.1.1") for i in range(3)]
+    assert statuses == [200, 200, 429]
+
+
+def test_forwarded_header_is_not_trusted_by_default():
+    middleware = limited()
+    statuses = [call(middleware, forwarded=f"6.6.6.{i}") for i in range(3)]
+    assert statuses == [200, 200, 429]
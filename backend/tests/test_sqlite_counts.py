@@ -0,0 +1,27 @@
+import asyncio
+
+import sqlite_backend
+from sqlite_backend import SQLiteBackend
+
+
+def test_counts_do_not_touch_the_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_backend, "COUNTS_REFRESH_INTERVAL", 0.01)
+
+    async def run():
+        backend = SQLiteBackend(str(tmp_path / "tasks.db"))
+        await backend.start()
+        try:
+            await backend.create("a", "Planning", "u")
+            await backend.create("b", "Done", "u")
+            await asyncio.sleep(0.1)
+
+            def busy():
+                raise AssertionError("count() waited for a pooled connection")
+            monkeypatch.setattr(backend.pool, "connection", busy)
+            return backend.count(), backend.column_counts()
+        finally:
+            monkeypatch.undo()
+            await backend.stop()
+
+    assert asyncio.run(run()) == (2, {"Planning": 1, "Done": 1})
+
@@ -0,0 +1,91 @@
+import gzip
+import json
+
+from task_history import HistoryLog
+
+
+def card(task_id, user_id, text, at):
+    return {"id": task_id, "text": text, "column": "Planning", "userId": user_id, "version": at, "updatedAt": at}
+
+
+def seed_store(boards=200, cards=10):
+    return [card(board * cards + i, f"board-{board}", "start", 1) for board in range(boards) for i in range(cards)]
+
+
+def open_history(path, tasks):
+    history = HistoryLog(str(path), segment_bytes=1, flush_interval=3600)
+    history.open(tasks)
+    return history
+
+
+def rotate(history):
+    history.flush()
+    history.rotate()
+    history._rotating.join()
+
+
+def whole_checkpoint_reads_fail(monkeypatch):
+    def fail(self, number):
+        raise AssertionError("as-of read loaded a whole-store checkpoint")
+    monkeypatch.setattr(HistoryLog, "_load_checkpoint", fail)
+
+
+def test_board_as_of_reads_only_the_board(tmp_path, monkeypatch):
+    history = open_history(tmp_path, seed_store())
+    history.record("updated", card(0, "board-0", "first", 10))
+    history.record("updated", card(15, "board-1", "other board", 11))
+    rotate(history)
+    history.record("updated", card(0, "board-0", "second", 20))
+    history.record("deleted", card(1, "board-0", "start", 21))
+    history.flush()
+    history.record("created", card(5000, "board-0", "new", 30))
+
+    whole_checkpoint_reads_fail(monkeypatch)
+    at_15 = history.board_as_of("board-0", 15)
+    assert len(at_15) == 10
+    assert at_15[0]["text"] == "first"
+    at_25 = history.board_as_of("board-0", 25)
+    assert [task["id"] for task in at_25] == [0, *range(2, 10)]
+    assert at_25[0]["text"] == "second"
+    assert history.board_as_of("board-0", 35)[-1]["id"] == 5000
+    assert all(task["text"] == "start" for task in history.board_as_of("board-2", 35))
+    assert history.board_as_of("nobody", 35) == []
+    history.close()
+
+
+def test_board_indexes_survive_restart(tmp_path, monkeypatch):
+    history = open_history(tmp_path, seed_store(boards=3))
+    history.record("updated", card(0, "board-0", "first", 10))
+    rotate(history)
+    history.record("updated", card(0, "board-0", "second", 20))
+    history.close()
+
+    history = open_history(tmp_path, [])
+    whole_checkpoint_reads_fail(monkeypatch)
+    assert history.board_as_of("board-0", 15)[0]["text"] == "first"
+    assert history.board_as_of("board-0", 25)[0]["text"] == "second"
+    history.close()
+
+
+def test_reads_history_written_before_board_indexes(tmp_path):
+    tasks = seed_store(boards=3)
+    with gzip.open(tmp_path / "checkpoint-000001-1.json.gz", "wt") as f:
+        json.dump(tasks, f)
+    events = [{"at": 10, "type": "updated", "task": card(0, "board-0", "old", 10)}]
+    with open(tmp_path / "segment-000001.jsonl.gz", "wb") as f:
+        f.write(gzip.compress("".join(json.dumps(e) + "\n" for e in events).encode()))
+    with open(tmp_path / "segment-000001.idx.json", "w") as f:
+        json.dump([0], f)
+    with gzip.open(tmp_path / "checkpoint-000002-10.json.gz", "wt") as f:
+        json.dump(tasks, f)
+
+    history = open_history(tmp_path, [])
+    assert history.board_as_of("board-0", 5)[0]["text"] == "start"
+    assert history.board_as_of("board-1", 5)[0]["userId"] == "board-1"
+    history.close()
+
+
+def test_before_history_is_unavailable(tmp_path):
+    history = open_history(tmp_path, seed_store(boards=1))
+    assert history.board_as_of("board-0", 0) is None
+    history.close()
@@ -0,0 +1,104 @@
+import json
+
+from task_log import TaskLog
+
+
+def task(task_id, text):
+    return {"id": task_id, "text": text, "column": "Planning", "userId": "u", "version": task_id}
+
+
+def make_log(tmp_path):
+    return TaskLog(str(tmp_path / "tasks.json"), fsync_interval=0.01)
+
+
+def test_replays_log_on_top_of_nothing(tmp_path):
+    log = make_log(tmp_path)
+    log.load()
+    log.open()
+    log.append_put(task(1, "a"), next_id=2)
+    log.append_put(task(2, "b"), next_id=3)
+    log.append_delete(1, version=3)
+    log.close()
+
+    tasks, next_id = make_log(tmp_path).load()
+    assert [t["id"] for t in tasks] == [2]
+    assert next_id == 3
+
+
+def test_write_after_torn_record_survives_restart(tmp_path):
+    log = make_log(tmp_path)
+    log.load()
+    log.open()
+    log.append_put(task(1, "a"), next_id=2)
+    log.close()
+    # Crash in the middle of appending the next record
+    with open(log.log_path, "a") as f:
+        f.write('{"op":"put","task":{"id":2,"te')
+
+    log = make_log(tmp_path)
+    tasks, next_id = log.load()
+    assert [t["id"] for t in tasks] == [1]
+    log.open()
+    log.append_put(task(3, "c"), next_id=4)
+    log.close()
+
+    with open(log.log_path) as f:
+        lines = f.read().splitlines()
+    assert all(json.loads(line) for line in lines)
+    tasks, next_id = make_log(tmp_path).load()
+    assert sorted(t["id"] for t in tasks) == [1, 3]
+    assert next_id == 4
+
+
+def test_record_without_newline_counts_as_torn(tmp_path):
+    log = make_log(tmp_path)
+    log.load()
+    log.open()
+    log.append_put(task(1, "a"), next_id=2)
+    log.close()
+    with open(log.log_path, "a") as f:
+        f.write(json.dumps({"op": "put", "task": task(2, "b"), "next_id": 3, "seq": 2}))
+
+    log = make_log(tmp_path)
+    log.load()
+    log.open()
+    log.append_put(task(3, "c"), next_id=4)
+    log.close()
+    tasks, _ = make_log(tmp_path).load()
+    assert sorted(t["id"] for t in tasks) == [1, 3]
+
+
+def test_compaction_serializes_off_the_calling_thread(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+
+    from conftest import make_test_backend
+    from task_store import TaskRecord
+
+    monkeypatch.chdir(tmp_path)
+    backend = make_test_backend("memory")
+    backend.task_log.compact_every = 5
+    serialized_on = set()
+    to_dict = TaskRecord.to_dict
+
+    def tracking_to_dict(record):
+        serialized_on.add(threading.current_thread().name)
+        return to_dict(record)
+
+    async def run():
+        await backend.start()
+        tasks = [await backend.create(f"card {i}", "Planning", "u") for i in range(4)]
+        monkeypatch.setattr(TaskRecord, "to_dict", tracking_to_dict)
+        # The fifth write triggers compaction
+        await backend.update(tasks[0]["id"], text="edited")
+        compacting = backend.task_log._compact_thread
+        if compacting is not None:
+            compacting.join()
+        await backend.stop()
+
+    asyncio.run(run())
+    assert "task-log-compact" in serialized_on
+    snapshot = json.loads((tmp_path / "tasks_backup.json").read_text())
+    assert len(snapshot["tasks"]) == 4
+    tasks, _ = TaskLog(str(tmp_path / "tasks_backup.json"), str(tmp_path / "tasks_backup.log")).load()
+    assert sorted(t["text"] for t in tasks) == ["card 1", "card 2", "card 3", "edited"]
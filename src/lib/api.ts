@@ -4,6 +4,37 @@ const API_BASE_URL = import.meta.env.PROD
 
 const API_VERSION = '2.0';
 
+// Boards are fetched in pages of this many tasks
+const TASK_PAGE_SIZE = 500;
+
+// Failed requests (network errors, 429, 502-504) are retried this many
+// times, waiting RETRY_BASE_DELAY_MS * 2^attempt (or Retry-After) between
+const MAX_RETRIES = 4;
+const RETRY_BASE_DELAY_MS = 300;
+const RETRY_STATUSES = new Set([429, 502, 503, 504]);
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Mutations carry an Idempotency-Key, reused by every retry, so the server
+// applies each one once however often it is sent
+function idempotencyKey(): string {
+  if (typeof crypto !== 'undefined' && 'randomUUID' in crypto) {
+    return crypto.randomUUID();
+  }
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+}
+
+function retryDelay(attempt: number, response?: Response): number {
+  const retryAfter = Number(response?.headers.get('Retry-After'));
+  if (retryAfter > 0) return retryAfter * 1000;
+  // Jitter keeps clients that failed together from retrying together
+  return RETRY_BASE_DELAY_MS * 2 ** attempt * (0.5 + Math.random());
+}
+
+function ifMatch(version?: number): Record<string, string> {
+  return version === undefined ? {} : { 'If-Match': `"${version}"` };
+}
+
 if (typeof window !== 'undefined') {
   console.log('API Version:', API_VERSION);
   console.log('Environment:', import.meta.env.MODE);
@@ -16,6 +47,16 @@ export interface Task {
   text: string;
   column: string;
   userId?: string;
+  position?: string;
+  version?: number;
+  updatedAt?: number;
+}
+
+export interface TaskDelta {
+  version: number;
+  full: boolean;
+  tasks: Task[];
+  deleted: number[];
 }
 
 export interface TaskCreate {
@@ -27,41 +68,120 @@ export interface TaskCreate {
 export interface TaskUpdate {
   text?: string;
   column?: string;
+  // Ids of the cards the task is dropped between in its column
+  after?: number;
+  before?: number;
+}
+
+export interface BatchOperation {
+  op: 'create' | 'update' | 'move' | 'delete';
+  id?: number;
+  text?: string;
+  column?: string;
+  userId?: string;
+}
+
+export interface BatchResult {
+  index: number;
+  op: BatchOperation['op'];
+  id: number;
+  task: Task | null;
+}
+
+export type TaskEvent =
+  | { seq: number; type: 'created' | 'updated'; task: Task }
+  | { seq: number; type: 'deleted'; id: number }
+  | { seq: number; type: 'reset' };
+
+export class ApiError extends Error {
+  status: number;
+  body: unknown;
+
+  constructor(status: number, body: unknown) {
+    super(`HTTP error! status: ${status}`);
+    this.status = status;
+    this.body = body;
+  }
+}
+
+// The task as the server has it, when a write sent with its version was
+// answered 412 because someone else changed it first; otherwise null
+export function conflictingTask(error: unknown): Task | null {
+  if (!(error instanceof ApiError) || error.status !== 412) return null;
+  return (error.body as { detail?: { task?: Task } } | null)?.detail?.task ?? null;
 }
 
 class ApiService {
   private async request<T>(endpoint: string, options: RequestInit = {}): Promise<T> {
+    const { data } = await this.requestWithHeaders<T>(endpoint, options);
+    return data;
+  }
+
+  private async requestWithHeaders<T>(
+    endpoint: string,
+    options: RequestInit = {}
+  ): Promise<{ data: T; headers: Headers }> {
     const url = `${API_BASE_URL}${endpoint}`;
-    console.log(`API Request: ${options.method || 'GET'} ${url}`);
+    const method = options.method || 'GET';
+    console.log(`API Request: ${method} ${url}`);
     
     const config: RequestInit = {
+      mode: 'cors',
+      ...options,
       headers: {
         'Content-Type': 'application/json',
+        ...(method === 'GET' ? {} : { 'Idempotency-Key': idempotencyKey() }),
         ...options.headers,
       },
-      mode: 'cors',
-      ...options,
     };
 
-    try {
-      const response = await fetch(url, config);
-      console.log(`API Response: ${response.status} ${response.statusText}`);
-      
+    for (let attempt = 0; ; attempt++) {
+      let response: Response | undefined;
+      try {
+        response = await fetch(url, config);
+        console.log(`API Response: ${response.status} ${response.statusText}`);
+      } catch (error) {
+        // Network failure: the request may or may not have reached the server
+        if (attempt < MAX_RETRIES) {
+          await sleep(retryDelay(attempt));
+          continue;
+        }
+        console.error(`API request failed: ${endpoint}`, error);
+        throw error;
+      }
+
+      if (RETRY_STATUSES.has(response.status) && attempt < MAX_RETRIES) {
+        await sleep(retryDelay(attempt, response));
+        continue;
+      }
       if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
+        const error = new ApiError(response.status, await response.json().catch(() => null));
+        console.error(`API request failed: ${endpoint}`, error);
+        throw error;
       }
       
       const data = await response.json();
       console.log(`API Data:`, data);
-      return data;
-    } catch (error) {
-      console.error(`API request failed: ${endpoint}`, error);
-      throw error;
+      return { data, headers: response.headers };
     }
   }
 
   async getTasks(userId: string): Promise<Task[]> {
-    return this.request<Task[]>(`/tasks?userId=${userId}`);
+    const tasks: Task[] = [];
+    let cursor: string | null = null;
+    do {
+      const params = new URLSearchParams({ userId, limit: String(TASK_PAGE_SIZE) });
+      if (cursor) params.set('cursor', cursor);
+      const { data, headers } = await this.requestWithHeaders<Task[]>(`/tasks?${params}`);
+      tasks.push(...data);
+      cursor = headers.get('X-Next-Cursor');
+    } while (cursor);
+    return tasks;
+  }
+
+  async getTaskChanges(userId: string, since: number): Promise<TaskDelta> {
+    const params = new URLSearchParams({ userId, since: String(since) });
+    return this.request<TaskDelta>(`/tasks?${params}`);
   }
 
   async createTask(task: TaskCreate): Promise<Task> {
@@ -71,19 +191,41 @@ class ApiService {
     });
   }
 
-  async updateTask(taskId: number, updates: TaskUpdate): Promise<Task> {
+  // With a version the write only applies if the task is still at it;
+  // otherwise it throws an ApiError whose conflictingTask() is the current task
+  async updateTask(taskId: number, updates: TaskUpdate, version?: number): Promise<Task> {
     return this.request<Task>(`/tasks/${taskId}`, {
       method: 'PUT',
       body: JSON.stringify(updates),
+      headers: ifMatch(version),
     });
   }
 
-  async deleteTask(taskId: number): Promise<void> {
+  async deleteTask(taskId: number, version?: number): Promise<void> {
     await this.request(`/tasks/${taskId}`, {
       method: 'DELETE',
+      headers: ifMatch(version),
     });
   }
 
+  async batchTasks(operations: BatchOperation[]): Promise<BatchResult[]> {
+    const { results } = await this.request<{ results: BatchResult[] }>('/tasks/batch', {
+      method: 'POST',
+      body: JSON.stringify({ operations }),
+    });
+    return results;
+  }
+
+  subscribeToTasks(userId: string, onEvent: (event: TaskEvent) => void): () => void {
+    // EventSource reconnects on its own and resumes via Last-Event-ID
+    const source = new EventSource(`${API_BASE_URL}/tasks/stream?${new URLSearchParams({ userId })}`);
+    const handle = (message: MessageEvent) => onEvent(JSON.parse(message.data) as TaskEvent);
+    for (const type of ['created', 'updated', 'deleted', 'reset']) {
+      source.addEventListener(type, handle as EventListener);
+    }
+    return () => source.close();
+  }
+
   async healthCheck(): Promise<{ status: string; firebase_connected: boolean }> {
     return this.request('/health');
   }